@@ -0,0 +1,39 @@
+"""Authentication for operational endpoints.
+
+Admin routes are disabled unless ``ADMIN_TOKEN`` is set. When it is, requests
+must present the token either as ``Authorization: Bearer <token>`` or in the
+``X-Admin-Token`` header.
+"""
+
+from __future__ import annotations
+
+import os
+import secrets
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+__all__ = ["ADMIN_TOKEN", "is_admin", "require_admin"]
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def is_admin(authorization: Optional[str], x_admin_token: Optional[str]) -> bool:
+    """Return whether the given header values carry the admin token."""
+    if not ADMIN_TOKEN:
+        return False
+    supplied = x_admin_token
+    if not supplied and authorization and authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    return bool(supplied) and secrets.compare_digest(supplied, ADMIN_TOKEN)
+
+
+def require_admin(
+    authorization: Optional[str] = Header(None),
+    x_admin_token: Optional[str] = Header(None),
+) -> None:
+    """FastAPI dependency rejecting requests without the admin token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin(authorization, x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
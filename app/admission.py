@@ -0,0 +1,107 @@
+"""Admission control shared by the audio pipelines.
+
+Submissions are rejected once too many jobs are waiting, and media that is too
+long or too large is refused before it is downloaded. ``app.audio_pipeline``
+and ``backend.jobs`` each keep a :class:`Backlog` for their worker pool: wait
+estimates and ``Retry-After`` hints are derived from the pool's size and an
+exponentially weighted average of the time a worker spends on one job.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+from typing import Any, Callable, Dict
+
+from . import metrics
+
+__all__ = [
+    "ACTIVE_STATUSES",
+    "MAX_DURATION",
+    "MAX_FILESIZE",
+    "QUEUE_MAX_DEPTH",
+    "Backlog",
+    "MediaTooLargeError",
+    "QueueFullError",
+    "check_media_limits",
+]
+
+# Jobs beyond QUEUE_MAX_DEPTH are rejected, as is media longer than MAX_DURATION
+# seconds or larger than MAX_FILESIZE bytes (0 disables a limit).
+QUEUE_MAX_DEPTH = max(1, int(os.getenv("QUEUE_MAX_DEPTH", "50")))
+MAX_DURATION = max(0, int(os.getenv("MAX_DURATION", str(3 * 60 * 60))))
+MAX_FILESIZE = max(0, int(os.getenv("MAX_FILESIZE_MB", "500"))) * 1024 * 1024
+
+ACTIVE_STATUSES = ("queued", "downloading", "converting")
+
+_SERVICE_TIME_DEFAULT = 60.0
+_SERVICE_TIME_ALPHA = 0.2
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the pipeline is at capacity."""
+
+    def __init__(self, retry_after: int, message: str) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MediaTooLargeError(Exception):
+    """Raised when media exceeds the configured duration or size limits.
+
+    ``limit`` is the exceeded limit, ``"duration"`` or ``"filesize"``, so that
+    callers can word the error in their own language.
+    """
+
+    def __init__(self, limit: str, message: str) -> None:
+        super().__init__(message)
+        self.limit = limit
+
+
+class Backlog:
+    """Queue limit and drain-rate model of one worker pool.
+
+    ``workers`` returns the current size of the pool, which may change at
+    runtime.
+    """
+
+    def __init__(self, workers: Callable[[], int]) -> None:
+        self._workers = workers
+        self._lock = threading.Lock()
+        self._service_time = _SERVICE_TIME_DEFAULT
+
+    def record_completion(self, elapsed: float) -> None:
+        """Record that a worker spent ``elapsed`` seconds on a job, whatever its outcome."""
+        with self._lock:
+            self._service_time += _SERVICE_TIME_ALPHA * (elapsed - self._service_time)
+
+    def drain_rate(self) -> float:
+        """Return the estimated number of jobs leaving the queue per second."""
+        with self._lock:
+            service_time = self._service_time
+        return max(self._workers(), 1) / max(service_time, 1.0)
+
+    def estimated_wait(self, depth: int) -> float:
+        """Return the expected seconds before ``depth`` queued jobs have drained."""
+        return depth / self.drain_rate()
+
+    def ensure_capacity(self, depth: int, message: str = "Queue is full, retry later") -> None:
+        """Raise :class:`QueueFullError` if a job cannot join a queue of ``depth`` jobs."""
+        if depth >= QUEUE_MAX_DEPTH:
+            metrics.REJECTIONS.inc(reason="queue_full")
+            excess = depth - QUEUE_MAX_DEPTH + 1
+            retry_after = max(1, math.ceil(excess / self.drain_rate()))
+            raise QueueFullError(retry_after, message)
+
+
+def check_media_limits(info: Dict[str, Any]) -> None:
+    """Raise :class:`MediaTooLargeError` if probed media exceeds the limits."""
+    duration = info.get("duration")
+    if MAX_DURATION and duration and duration > MAX_DURATION:
+        metrics.REJECTIONS.inc(reason="media_too_large")
+        raise MediaTooLargeError("duration", f"Media too long (maximum {MAX_DURATION // 60} minutes)")
+    filesize = info.get("filesize") or info.get("filesize_approx")
+    if MAX_FILESIZE and filesize and filesize > MAX_FILESIZE:
+        metrics.REJECTIONS.inc(reason="media_too_large")
+        raise MediaTooLargeError("filesize", f"Media too large (maximum {MAX_FILESIZE // (1024 * 1024)} MB)")
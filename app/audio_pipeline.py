@@ -1,4 +1,4 @@
-"""Audio processing pipeline used by background tasks.
+"""Audio processing pipeline run by the audio worker pool.
 
 This module downloads the best available audio stream from a video URL using
 ``yt-dlp`` and converts it to an MP3 file via ``ffmpeg``. Progress and status
@@ -8,21 +8,184 @@ information to clients.
 
 # INSERT START: imports
 import glob
+import json
 import math
 import os
-import random
 import subprocess
 import tempfile
+import threading
 import time
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
 
-import imageio_ffmpeg
-import yt_dlp
-
-from .db import AUDIO_DIR, get_audio_job, update_audio_job
+from . import hls, metrics, parallel_download, throttle, waveform, ydl_pool
+from .admission import ACTIVE_STATUSES, MAX_FILESIZE, QUEUE_MAX_DEPTH, Backlog, check_media_limits
+from .db import AUDIO_DIR, create_audio_job, get_audio_job, update_audio_job
+from .worker_pool import WorkerPool
 
 # INSERT END: imports
 
+# INSERT START: cancellation
+
+AUDIO_WORKERS = max(1, int(os.getenv("AUDIO_WORKERS", "2")))
+IDLE_CANCEL_MINUTES = max(0, int(os.getenv("IDLE_CANCEL_MINUTES", "10")))
+
+
+class JobCancelled(Exception):
+    """Raised inside the pipeline once its job has been cancelled."""
+
+
+_registry_lock = threading.Lock()
+_cancelled: Dict[str, str] = {}
+_processes: Dict[str, subprocess.Popen] = {}
+_last_polled: Dict[str, float] = {}
+_stages: Dict[str, str] = {}
+_reaper_started = False
+
+
+def touch(audio_id: str) -> None:
+    """Record that a client is still interested in ``audio_id``."""
+    with _registry_lock:
+        _last_polled[audio_id] = time.monotonic()
+
+
+def start_idle_reaper() -> None:
+    """Start cancelling jobs whose status is no longer polled, once per process."""
+    global _reaper_started
+    with _registry_lock:
+        if not IDLE_CANCEL_MINUTES or _reaper_started:
+            return
+        _reaper_started = True
+    threading.Thread(target=_idle_loop, name="audio-idle-reaper", daemon=True).start()
+
+
+def cancel_audio_job(audio_id: str, message: str = "Cancelled") -> Optional[str]:
+    """Cancel ``audio_id`` and return its resulting status, or ``None`` if unknown.
+
+    Queued jobs are removed from the worker pool queue. Running jobs raise
+    :class:`JobCancelled` from their next progress hook or status update, and
+    their ffmpeg process, if any, is terminated. The worker writes the
+    cancelled status again once it has stopped.
+    """
+    job = get_audio_job(audio_id)
+    if not job:
+        return None
+    if job["status"] not in ACTIVE_STATUSES:
+        return job["status"]
+    dequeued = _pool.remove(audio_id)
+    with _registry_lock:
+        if not dequeued:
+            _cancelled[audio_id] = message
+        _last_polled.pop(audio_id, None)
+        process = _processes.get(audio_id)
+        if process is not None and process.poll() is None:
+            process.terminate()
+    update_audio_job(audio_id, status="cancelled", message=message)
+    return "cancelled"
+
+
+def _raise_if_cancelled(audio_id: str) -> None:
+    with _registry_lock:
+        message = _cancelled.get(audio_id)
+    if message is not None:
+        raise JobCancelled(message)
+
+
+def _set_status(audio_id: str, **fields: Any) -> None:
+    """Update a running job unless it has been cancelled.
+
+    The check and the write happen under the registry lock, so a cancel
+    cannot be overwritten by an update that was about to be written.
+    """
+    with _registry_lock:
+        message = _cancelled.get(audio_id)
+        if message is None:
+            update_audio_job(audio_id, **fields)
+    if message is not None:
+        raise JobCancelled(message)
+
+
+def _run_ffmpeg(audio_id: str, cmd: list, peaks: Optional[waveform.Peaks] = None) -> None:
+    """Run ``cmd``; with ``peaks``, feed it the PCM ``cmd`` writes to stdout."""
+    stdout = subprocess.PIPE if peaks is not None else subprocess.DEVNULL
+    process = subprocess.Popen(cmd, stdout=stdout, stderr=subprocess.PIPE)
+    with _registry_lock:
+        _processes[audio_id] = process
+        if audio_id in _cancelled:
+            process.terminate()
+    try:
+        if peaks is not None:
+            stderr = waveform.drain(process, peaks)
+        else:
+            _, stderr = process.communicate()
+    finally:
+        with _registry_lock:
+            _processes.pop(audio_id, None)
+    _raise_if_cancelled(audio_id)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr)
+
+
+def _reap_idle(now: float) -> None:
+    """Cancel the jobs whose status has not been polled for ``IDLE_CANCEL_MINUTES``."""
+    timeout = IDLE_CANCEL_MINUTES * 60
+    with _registry_lock:
+        abandoned = [audio_id for audio_id, seen in _last_polled.items() if now - seen > timeout]
+        for audio_id in abandoned:
+            del _last_polled[audio_id]
+    for audio_id in abandoned:
+        cancel_audio_job(audio_id, "Cancelled: abandoned by client")
+
+
+def _idle_loop() -> None:
+    while True:
+        time.sleep(30)
+        _reap_idle(time.monotonic())
+
+
+@contextmanager
+def _stage(audio_id: str, name: str, timings: Dict[str, Dict[str, Any]]) -> Iterator[None]:
+    """Track ``audio_id`` as being in stage ``name`` and record how long it took.
+
+    The timings are saved as soon as the stage ends, so a job that never
+    finishes still has the durations of the stages it went through.
+    """
+    with _registry_lock:
+        _stages[audio_id] = name
+    timings[name] = {"started_at": datetime.utcnow().isoformat()}
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        timings[name]["duration_s"] = round(elapsed, 3)
+        metrics.STAGE_DURATION.observe(elapsed, pool="app", stage=name)
+        with _registry_lock:
+            _stages.pop(audio_id, None)
+        _save_timings(audio_id, timings)
+
+
+def _save_timings(audio_id: str, timings: Dict[str, Dict[str, Any]]) -> None:
+    update_audio_job(
+        audio_id,
+        stage_timings=json.dumps(timings),
+        probe_s=timings.get("probe", {}).get("duration_s"),
+        download_s=timings.get("download", {}).get("duration_s"),
+        convert_s=timings.get("convert", {}).get("duration_s"),
+    )
+
+
+def _jobs_by_stage() -> Dict[tuple, float]:
+    counts = {("app", "queued"): float(queue_depth())}
+    with _registry_lock:
+        for name in _stages.values():
+            counts[("app", name)] = counts.get(("app", name), 0.0) + 1
+    return counts
+
+# INSERT END: cancellation
+
 # INSERT START: pipeline
 
 def process_audio_job(audio_id: str) -> None:
@@ -33,22 +196,32 @@ def process_audio_job(audio_id: str) -> None:
     audio_id: Identifier of the audio job in the database.
     """
 
-    try:
-        job = get_audio_job(audio_id)
-        if not job:
-            return
+    job = get_audio_job(audio_id)
+    if not job or job["status"] != "queued":
+        with _registry_lock:
+            _cancelled.pop(audio_id, None)
+        return
+
+    # Imported here rather than at module level to keep it out of app startup.
+    import imageio_ffmpeg
 
+    started = time.monotonic()
+    output_file: Optional[Path] = None
+    timings: Dict[str, Dict[str, Any]] = {}
+    source: Dict[str, Any] = {}
+    try:
         source_url = job["source_url"]
-        update_audio_job(audio_id, status="downloading", progress=0, message="")
+        _set_status(audio_id, status="downloading", progress=0, message="")
 
         ffmpeg_exe = imageio_ffmpeg.get_ffmpeg_exe()
 
         def progress_hook(d: dict) -> None:
+            _raise_if_cancelled(audio_id)
             if d.get("status") == "downloading":
                 total = d.get("total_bytes") or d.get("total_bytes_estimate")
                 if total:
                     pct = math.ceil(d["downloaded_bytes"] * 80 / total)
-                    update_audio_job(audio_id, status="downloading", progress=pct)
+                    _set_status(audio_id, status="downloading", progress=pct)
 
         headers = {
             "User-Agent": (
@@ -64,17 +237,18 @@ def process_audio_job(audio_id: str) -> None:
             "noplaylist": True,
             "quiet": True,
             "no_warnings": True,
-            "retries": 20,
-            "fragment_retries": 20,
-            "concurrent_fragment_downloads": 1,
+            "retries": 5,
+            "fragment_retries": 5,
+            "retry_sleep_functions": {"http": throttle.retry_sleep, "fragment": throttle.retry_sleep},
             "socket_timeout": 30,
             "prefer_free_formats": True,
             "geo_bypass": True,
             "http_headers": headers,
             "extractor_args": {"youtube": {"player_client": ["android", "web"]}},
             "ffmpeg_location": ffmpeg_exe,
-            "progress_hooks": [progress_hook],
         }
+        if MAX_FILESIZE:
+            ydl_opts["max_filesize"] = MAX_FILESIZE
 
         cookiefile = os.getenv("COOKIES_TXT")
         if cookiefile and Path(cookiefile).is_file():
@@ -82,25 +256,39 @@ def process_audio_job(audio_id: str) -> None:
 
         with tempfile.TemporaryDirectory() as tmpdir:
             tmp_path = Path(tmpdir)
-            ydl_opts["outtmpl"] = str(tmp_path / "source.%(ext)s")
+            outtmpl = str(tmp_path / "source.%(ext)s")
+
+            def fetch() -> Dict[str, Any]:
+                with ydl_pool.session(ydl_opts, outtmpl=outtmpl, progress_hook=progress_hook) as ydl:
+                    with _stage(audio_id, "probe", timings):
+                        info = ydl.extract_info(source_url, download=False)
+                    check_media_limits(info)
+                    _raise_if_cancelled(audio_id)
+                    with _stage(audio_id, "download", timings):
+                        return parallel_download.download(ydl, info, progress_hook)
 
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(source_url, download=True)
+            # Throttled attempts are retried once the source's domain allows it.
+            info = throttle.call(source_url, fetch, check=lambda: _raise_if_cancelled(audio_id))
+            source.update(
+                extractor=info.get("extractor_key"),
+                source_format=info.get("format_id"),
+                source_codec=info.get("acodec") or info.get("ext"),
+            )
 
-            update_audio_job(
+            _set_status(
                 audio_id,
                 title=info.get("title"),
                 duration_s=info.get("duration"),
             )
 
-            time.sleep(random.uniform(0.2, 0.6))
-
             downloaded = list(tmp_path.glob("source.*"))
             if not downloaded:
                 raise RuntimeError("Download failed")
             source_file = downloaded[0]
+            source["bytes_downloaded"] = source_file.stat().st_size
+            metrics.BYTES_DOWNLOADED.inc(source["bytes_downloaded"], pool="app")
 
-            update_audio_job(audio_id, status="converting", progress=90)
+            _set_status(audio_id, status="converting", progress=90)
             output_file = AUDIO_DIR / f"{audio_id}.mp3"
 
             ff_cmd = [
@@ -119,17 +307,107 @@ def process_audio_job(audio_id: str) -> None:
             if info.get("title"):
                 ff_cmd += ["-metadata", f"title={info['title']}"]
             ff_cmd.append(str(output_file))
+            # Second output of the same decode, for the waveform.
+            ff_cmd += waveform.PCM_OUTPUT_ARGS
+            peaks = waveform.Peaks()
+            if hls.ENABLED:
+                playlist = hls.prepare(output_file)
+                if not hls.COPY_FROM_MP3:
+                    ff_cmd += hls.output_args(playlist)
 
-            subprocess.run(ff_cmd, check=True)
+            convert_started = time.monotonic()
+            with _stage(audio_id, "convert", timings):
+                _run_ffmpeg(audio_id, ff_cmd, peaks)
+                waveform.write(waveform.path_for(output_file), peaks)
+                if hls.COPY_FROM_MP3:
+                    _run_ffmpeg(audio_id, [ffmpeg_exe, "-y", "-i", str(output_file)] + hls.output_args(playlist))
+                if hls.ENABLED:
+                    hls.publish(output_file)
+            elapsed = time.monotonic() - convert_started
+            if info.get("duration") and elapsed > 0:
+                metrics.ENCODE_REALTIME_FACTOR.observe(info["duration"] / elapsed, pool="app")
+            metrics.BYTES_WRITTEN.inc(output_file.stat().st_size, pool="app")
 
-        update_audio_job(
+        _set_status(
             audio_id,
             status="done",
             progress=100,
             filepath_mp3=str(output_file),
         )
+    except JobCancelled as exc:
+        if output_file is not None:
+            output_file.unlink(missing_ok=True)
+            waveform.path_for(output_file).unlink(missing_ok=True)
+            hls.discard(output_file)
+        update_audio_job(audio_id, status="cancelled", message=str(exc))
     except Exception as exc:  # pragma: no cover - safety net
-        update_audio_job(audio_id, status="error", message=str(exc))
+        with _registry_lock:
+            cancelled = _cancelled.get(audio_id)
+        if output_file is not None:
+            output_file.unlink(missing_ok=True)
+            waveform.path_for(output_file).unlink(missing_ok=True)
+            hls.discard(output_file)
+        if cancelled is not None:
+            update_audio_job(audio_id, status="cancelled", message=cancelled)
+        else:
+            update_audio_job(audio_id, status="error", message=str(exc))
+    finally:
+        if source:
+            update_audio_job(audio_id, **source)
+        with _registry_lock:
+            _cancelled.pop(audio_id, None)
+            _last_polled.pop(audio_id, None)
+        _backlog.record_completion(time.monotonic() - started)
 
-# INSERT END: pipeline
 
+_pool = WorkerPool(process_audio_job, AUDIO_WORKERS, max_depth=QUEUE_MAX_DEPTH)
+_backlog = Backlog(lambda: _pool.size)
+_submit_lock = threading.Lock()
+
+
+def submit(source_url: str) -> Tuple[str, int]:
+    """Create a job for ``source_url``, queue it and return its id and position.
+
+    The capacity check, the insert and the enqueue happen under one lock, so
+    concurrent submissions cannot push the queue past ``QUEUE_MAX_DEPTH``.
+    Raises :class:`~app.admission.QueueFullError` when the queue is full. If
+    the job cannot be queued anyway, its row is marked as failed.
+    """
+    with _submit_lock:
+        _backlog.ensure_capacity(_pool.depth())
+        audio_id = create_audio_job(source_url)
+        try:
+            return audio_id, enqueue(audio_id)
+        except BaseException:
+            update_audio_job(audio_id, status="error", message="Could not be queued")
+            with _registry_lock:
+                _last_polled.pop(audio_id, None)
+            raise
+
+
+def estimated_wait(position: int) -> float:
+    """Return the expected seconds before the job at ``position`` is picked up."""
+    return _backlog.estimated_wait(position)
+
+
+def enqueue(audio_id: str) -> int:
+    """Queue ``audio_id`` for processing and return the number of jobs ahead of it."""
+    touch(audio_id)
+    return _pool.submit(audio_id)
+
+
+def queue_depth() -> int:
+    return _pool.depth()
+
+
+def shutdown() -> None:
+    """Stop taking jobs; queued jobs are marked cancelled, running ones finish."""
+    for audio_id in _pool.shutdown(wait=False):
+        update_audio_job(audio_id, status="cancelled", message="Cancelled: server shutting down")
+
+
+metrics.JOBS.add_callback(_jobs_by_stage)
+metrics.WORKERS.add_callback(lambda: {("app",): _pool.size})
+metrics.WORKERS_BUSY.add_callback(lambda: {("app",): _pool.busy})
+
+# INSERT END: pipeline
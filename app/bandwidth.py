@@ -0,0 +1,194 @@
+"""Shared bandwidth budget for media downloads.
+
+Left alone, every worker downloads as fast as the origin allows and together
+they saturate the link that also serves finished MP3s to users. The budget is
+``BANDWIDTH_LIMIT_MBIT`` (``BANDWIDTH_OFFPEAK_LIMIT_MBIT`` outside
+``BANDWIDTH_PEAK_HOURS``) minus the ``BANDWIDTH_SERVE_RESERVE`` fraction kept
+free for file serving. It is split evenly between active downloads: each takes
+a :func:`share` for its lifetime and is throttled by a token bucket refilled
+at ``budget / active downloads``.
+
+When ``BANDWIDTH_STATE_FILE`` names a file on a disk shared by several
+processes, each process records its active downloads there (under ``flock``)
+and the budget is split across all of them. Otherwise it is per process. With
+no limit configured, shares never wait.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from . import metrics
+
+__all__ = [
+    "BANDWIDTH_LIMIT_MBIT",
+    "BANDWIDTH_OFFPEAK_LIMIT_MBIT",
+    "BANDWIDTH_PEAK_HOURS",
+    "BANDWIDTH_SERVE_RESERVE",
+    "BANDWIDTH_STATE_FILE",
+    "Share",
+    "download_budget",
+    "share",
+]
+
+
+def _peak_hours(value: str) -> Tuple[int, int]:
+    start, _, end = value.partition("-")
+    return int(start) % 24, int(end or start) % 24
+
+
+BANDWIDTH_LIMIT_MBIT = float(os.getenv("BANDWIDTH_LIMIT_MBIT", "0"))
+BANDWIDTH_OFFPEAK_LIMIT_MBIT = float(os.getenv("BANDWIDTH_OFFPEAK_LIMIT_MBIT", str(BANDWIDTH_LIMIT_MBIT)))
+BANDWIDTH_PEAK_HOURS = _peak_hours(os.getenv("BANDWIDTH_PEAK_HOURS", "8-23"))
+BANDWIDTH_SERVE_RESERVE = min(0.9, max(0.0, float(os.getenv("BANDWIDTH_SERVE_RESERVE", "0.2"))))
+BANDWIDTH_STATE_FILE = os.getenv("BANDWIDTH_STATE_FILE")
+
+# Seconds of budget a share may bank while idle, and between state file updates.
+_BURST_S = 0.5
+_HEARTBEAT_S = 2.0
+
+
+def _is_peak(hour: int) -> bool:
+    start, end = BANDWIDTH_PEAK_HOURS
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def download_budget(now: Optional[datetime] = None) -> Optional[float]:
+    """Bytes per second all downloads may use together, or ``None`` if unlimited."""
+    hour = (now or datetime.now()).hour
+    mbit = BANDWIDTH_LIMIT_MBIT if _is_peak(hour) else BANDWIDTH_OFFPEAK_LIMIT_MBIT
+    if mbit <= 0:
+        return None
+    return mbit * 125_000 * (1 - BANDWIDTH_SERVE_RESERVE)
+
+
+class _SharedCounts:
+    """Active downloads per process, kept in ``BANDWIDTH_STATE_FILE``."""
+
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._total = 0
+        self._published_at = 0.0
+
+    def publish(self, active: int) -> int:
+        """Record this process's ``active`` downloads and return the total of all processes."""
+        import fcntl
+
+        pid = str(os.getpid())
+        now = time.time()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._path, "a+") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            handle.seek(0)
+            try:
+                counts: Dict[str, Any] = json.loads(handle.read() or "{}")
+            except ValueError:
+                counts = {}
+            counts = {
+                other: entry
+                for other, entry in counts.items()
+                if other != pid and now - entry[1] < 5 * _HEARTBEAT_S
+            }
+            if active:
+                counts[pid] = [active, now]
+            handle.seek(0)
+            handle.truncate()
+            handle.write(json.dumps(counts))
+        self._total = sum(entry[0] for entry in counts.values())
+        self._published_at = now
+        return self._total
+
+    def total(self, active: int) -> int:
+        if time.time() - self._published_at >= _HEARTBEAT_S:
+            return self.publish(active)
+        return self._total
+
+
+class _Scheduler:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._active = 0
+        self._shared = _SharedCounts(Path(BANDWIDTH_STATE_FILE)) if BANDWIDTH_STATE_FILE else None
+
+    def register(self, delta: int) -> None:
+        with self._lock:
+            self._active += delta
+            if self._shared is not None:
+                self._shared.publish(self._active)
+
+    def share_rate(self) -> Optional[float]:
+        budget = download_budget()
+        if budget is None:
+            return None
+        with self._lock:
+            active = self._active
+            if self._shared is not None:
+                active = max(active, self._shared.total(active))
+        return budget / max(1, active)
+
+
+_scheduler = _Scheduler()
+
+
+class Share:
+    """One download's slice of the budget."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+        self._seen: Dict[str, int] = {}
+
+    def consume(self, amount: int) -> None:
+        """Account for ``amount`` bytes received, sleeping if the share is overdrawn."""
+        rate = _scheduler.share_rate()
+        if rate is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(rate * _BURST_S, self._tokens + (now - self._refilled) * rate) - amount
+            self._refilled = now
+            delay = -self._tokens / rate
+        if delay > 0:
+            time.sleep(delay)
+
+    def progress_hook(self, status: Dict[str, Any]) -> None:
+        """yt-dlp progress hook throttling the download it reports on."""
+        if status.get("status") != "downloading":
+            return
+        filename = status.get("filename") or ""
+        downloaded = status.get("downloaded_bytes") or 0
+        with self._lock:
+            previous = self._seen.get(filename, 0)
+            self._seen[filename] = downloaded
+        if downloaded > previous:
+            self.consume(downloaded - previous)
+
+
+@contextmanager
+def share() -> Iterator[Share]:
+    """Count a download as active for the duration of the block."""
+    _scheduler.register(1)
+    try:
+        yield Share()
+    finally:
+        _scheduler.register(-1)
+
+
+def _budget_gauges() -> Dict[Tuple[str, ...], float]:
+    budget = download_budget()
+    if budget is None:
+        return {}
+    return {("total",): budget, ("per_download",): _scheduler.share_rate() or budget}
+
+
+metrics.DOWNLOAD_BANDWIDTH.add_callback(_budget_gauges)
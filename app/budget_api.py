@@ -1,15 +1,22 @@
 from __future__ import annotations
 
-import re
+import json
+from datetime import date
 from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, HTTPException
+import anyio
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, validator
 
-from . import budget_store
+from . import budget_export, budget_import, budget_store
 
 __all__ = ["create_budget_router"]
 
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+_KINDS = ("income", "expense")
+
 
 class BudgetItemPayload(BaseModel):
     """Schema accepting flexible payloads for budget item creation."""
@@ -38,73 +45,57 @@ class BudgetItemPayload(BaseModel):
 
     @validator("amount", pre=True, allow_reuse=True)
     def _parse_amount(cls, value: Any) -> Optional[float]:
-        if value is None:
-            return None
-        if isinstance(value, (int, float)):
-            return float(value)
-        if isinstance(value, str):
-            stripped = value.strip()
-            if not stripped:
-                return None
-
-            # Normalise the string by removing currency symbols, thin spaces and
-            # other non numeric characters while keeping decimal separators.
-            # Common inputs such as "1 234,56 €" or "1.234,56" should be
-            # accepted.
-            normalised = stripped
-            for whitespace in (" ", "\u00a0", "\u202f"):
-                normalised = normalised.replace(whitespace, "")
-            normalised = re.sub(r"[^0-9,\.\-]", "", normalised)
-
-            if normalised.count("-") > 1 or (
-                "-" in normalised and not normalised.startswith("-")
-            ):
-                raise ValueError("Le montant doit être un nombre.")
-
-            if not normalised or normalised in {"-", ",", "."}:
-                raise ValueError("Le montant doit être un nombre.")
-
-            if normalised.count(",") and normalised.count("."):
-                # Determine the decimal separator based on the last occurrence
-                # and strip the other symbol which we treat as thousands
-                # separator.
-                last_comma = normalised.rfind(",")
-                last_dot = normalised.rfind(".")
-                if last_comma > last_dot:
-                    thousands_sep = "."
-                    normalised = normalised.replace(thousands_sep, "")
-                    decimal_sep = ","
-                else:
-                    thousands_sep = ","
-                    normalised = normalised.replace(thousands_sep, "")
-                    decimal_sep = "."
-            else:
-                if "," in normalised:
-                    decimal_candidate = normalised.split(",")[-1]
-                    if 0 < len(decimal_candidate) <= 2:
-                        decimal_sep = ","
-                        thousands_sep = "."
-                    else:
-                        decimal_sep = "."
-                        thousands_sep = ","
-                else:
-                    decimal_sep = "."
-                    thousands_sep = ","
-                normalised = normalised.replace(thousands_sep, "")
-
-            if decimal_sep == ",":
-                normalised = normalised.replace(",", ".")
-
-            try:
-                return float(normalised)
-            except ValueError as exc:  # pragma: no cover - defensive
-                raise ValueError("Le montant doit être un nombre.") from exc
-        raise ValueError("Le montant doit être un nombre.")
+        # Accepts localised inputs such as "1 234,56 €" or "1.234,56".
+        return budget_import.parse_amount(value)
 
     def to_payload(self) -> Dict[str, Any]:
         return self.dict(exclude_none=True)
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _cached_response(snapshot: budget_store.Snapshot, if_none_match: Optional[str], render) -> Response:
+    headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(if_none_match, snapshot.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(render(), media_type="application/json", headers=headers)
+
+
+def _json(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def _filters(category: Optional[str], kind: Optional[str], start: Optional[date],
+             end: Optional[date]) -> Dict[str, Any]:
+    """Validate the listing filters into :meth:`budget_store.Snapshot.page` arguments."""
+    if kind is not None and kind not in _KINDS:
+        raise HTTPException(status_code=400, detail={"error": "Le type doit valoir income ou expense."})
+    return {
+        "category": category,
+        "kind": kind,
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+    }
+
+
+def _upload_format(request: Request, fmt: Optional[str]) -> Optional[str]:
+    if fmt is not None:
+        if fmt not in budget_import.FORMATS:
+            raise HTTPException(status_code=400, detail={"error": "Le format doit valoir csv ou jsonl."})
+        return fmt
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        return "csv"
+    if "json" in content_type:
+        return "jsonl"
+    return None
+
+
 def create_budget_router() -> APIRouter:
     router = APIRouter()
 
@@ -114,8 +105,95 @@ def create_budget_router() -> APIRouter:
     @router.get("/budget/")
     @router.get("/budgets")
     @router.get("/budgets/")
-    def list_budget_items() -> Dict[str, Any]:
-        return {"items": budget_store.list_items()}
+    def list_budget_items(
+        cursor: Optional[int] = None,
+        limit: Optional[int] = None,
+        category: Optional[str] = None,
+        type: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        if_none_match: Optional[str] = Header(None),
+    ) -> Response:
+        """List budget items.
+
+        Without query parameters every item is returned, as before. With any of
+        them, at most ``limit`` matching items are returned along with the
+        ``next_cursor`` to pass for the following page (``null`` at the end).
+        """
+        snapshot = budget_store.snapshot()
+        params = (cursor, limit, category, type, start, end)
+        if all(param is None for param in params):
+            return _cached_response(snapshot, if_none_match, snapshot.body)
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail={"error": f"Le paramètre limit doit être compris entre 1 et {MAX_PAGE_SIZE}."},
+            )
+        filters = _filters(category, type, start, end)
+        try:
+            items, next_cursor = snapshot.page(cursor or 0, limit or PAGE_SIZE, **filters)
+        except budget_store.BudgetStoreError as exc:
+            raise HTTPException(status_code=400, detail={"error": str(exc)}) from exc
+        return _cached_response(
+            snapshot, if_none_match, lambda: _json({"items": items, "next_cursor": next_cursor})
+        )
+
+    @router.get("/budget-items/export")
+    @router.get("/budget-items/export/")
+    @router.get("/budget/export")
+    @router.get("/budget/export/")
+    @router.get("/budgets/export")
+    @router.get("/budgets/export/")
+    def export_budget_items(
+        format: str = "csv",
+        category: Optional[str] = None,
+        type: Optional[str] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> StreamingResponse:
+        """Stream the items matching the listing filters as CSV or JSON Lines."""
+        if format not in budget_export.FORMATS:
+            raise HTTPException(status_code=400, detail={"error": "Le format doit valoir csv ou jsonl."})
+        items = budget_store.snapshot().iter_items(**_filters(category, type, start, end))
+        chunks = budget_export.csv_chunks(items) if format == "csv" else budget_export.jsonl_chunks(items)
+        media_type, extension = budget_export.FORMATS[format]
+        headers = {"Content-Disposition": f'attachment; filename="budget-items.{extension}"'}
+        return StreamingResponse(chunks, media_type=media_type, headers=headers)
+
+    @router.get("/budget-items/summary")
+    @router.get("/budget-items/summary/")
+    @router.get("/budget/summary")
+    @router.get("/budget/summary/")
+    @router.get("/budgets/summary")
+    @router.get("/budgets/summary/")
+    def budget_summary(if_none_match: Optional[str] = Header(None)) -> Response:
+        """Income, expense, balance and item count over all items."""
+        snapshot = budget_store.snapshot()
+        return _cached_response(snapshot, if_none_match, lambda: _json(snapshot.aggregates["totals"]))
+
+    @router.get("/budget-items/summary/categories")
+    @router.get("/budget-items/summary/categories/")
+    @router.get("/budget/summary/categories")
+    @router.get("/budget/summary/categories/")
+    @router.get("/budgets/summary/categories")
+    @router.get("/budgets/summary/categories/")
+    def budget_summary_by_category(if_none_match: Optional[str] = Header(None)) -> Response:
+        """Totals per category, sorted by category name."""
+        snapshot = budget_store.snapshot()
+        return _cached_response(
+            snapshot, if_none_match, lambda: _json({"categories": snapshot.aggregates["categories"]})
+        )
+
+    @router.get("/budget-items/summary/months")
+    @router.get("/budget-items/summary/months/")
+    @router.get("/budget/summary/months")
+    @router.get("/budget/summary/months/")
+    @router.get("/budgets/summary/months")
+    @router.get("/budgets/summary/months/")
+    def budget_summary_by_month(if_none_match: Optional[str] = Header(None)) -> Response:
+        """Totals per ``YYYY-MM`` month of ``createdAt``, oldest first."""
+        snapshot = budget_store.snapshot()
+        return _cached_response(snapshot, if_none_match, lambda: _json({"months": snapshot.aggregates["months"]}))
 
     @router.post("/budget-items", status_code=201)
     @router.post("/budget-items/", status_code=201)
@@ -123,11 +201,55 @@ def create_budget_router() -> APIRouter:
     @router.post("/budget/", status_code=201)
     @router.post("/budgets", status_code=201)
     @router.post("/budgets/", status_code=201)
-    def create_budget_item(payload: BudgetItemPayload) -> Dict[str, Any]:
+    def create_budget_item(payload: BudgetItemPayload, response: Response) -> Dict[str, Any]:
+        """Create a budget item.
+
+        A payload carrying the ``id`` of an existing item replaces that item,
+        in which case the status is 200 instead of 201.
+        """
         try:
-            item = budget_store.create_item(payload.to_payload())
+            item, replaced = budget_store.save_item(payload.to_payload())
         except budget_store.BudgetStoreError as exc:
             raise HTTPException(status_code=400, detail={"error": str(exc)}) from exc
+        if replaced:
+            response.status_code = 200
         return {"item": item}
 
+    @router.post("/budget-items/import", status_code=201)
+    @router.post("/budget-items/import/", status_code=201)
+    @router.post("/budget/import", status_code=201)
+    @router.post("/budget/import/", status_code=201)
+    @router.post("/budgets/import", status_code=201)
+    @router.post("/budgets/import/", status_code=201)
+    async def import_budget_items(request: Request, format: Optional[str] = None) -> Dict[str, Any]:
+        """Import a CSV or JSON Lines upload, all rows or none.
+
+        The body is parsed in a worker thread as it arrives. If any row is
+        invalid nothing is stored and the errors are returned per line.
+        """
+        fmt = _upload_format(request, format)
+        stream = request.stream()
+
+        def chunks():
+            while True:
+                try:
+                    yield anyio.from_thread.run(stream.__anext__)
+                except StopAsyncIteration:
+                    return
+
+        def run() -> budget_import.ImportResult:
+            return budget_import.import_items(budget_import.read_records(chunks(), fmt))
+
+        result = await anyio.to_thread.run_sync(run)
+        if result.error_count:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "error": f"{result.error_count} ligne(s) invalide(s), aucun poste importé.",
+                    "errors": result.errors,
+                    "error_count": result.error_count,
+                },
+            )
+        return {"imported": result.imported}
+
     return router
@@ -0,0 +1,68 @@
+"""Streaming export of budget items as CSV or JSON Lines.
+
+Items are encoded as they are read from the store and handed out in chunks
+of ``CHUNK_ITEMS`` rows, so memory stays flat however long the history is.
+CSV exports use the columns the import understands, so an export can be
+imported again as is.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, Iterable, Iterator, Mapping
+
+__all__ = ["CHUNK_ITEMS", "CSV_COLUMNS", "FORMATS", "csv_chunks", "jsonl_chunks"]
+
+CHUNK_ITEMS = 500
+CSV_COLUMNS = (
+    "id",
+    "name",
+    "title",
+    "amount",
+    "category",
+    "type",
+    "description",
+    "frequency",
+    "dueDate",
+    "createdAt",
+)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "jsonl": ("application/x-ndjson", "ndjson"),
+}
+
+
+def _cell(value: Any) -> Any:
+    return "" if value is None else value
+
+
+def csv_chunks(items: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+    """Encode ``items`` as CSV, with a BOM so spreadsheets read it as UTF-8."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(CSV_COLUMNS)
+    rows = 0
+    for item in items:
+        writer.writerow([_cell(item.get(column)) for column in CSV_COLUMNS])
+        rows += 1
+        if rows == CHUNK_ITEMS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+def jsonl_chunks(items: Iterable[Mapping[str, Any]]) -> Iterator[bytes]:
+    """Encode ``items`` as one JSON object per line."""
+    lines = []
+    for item in items:
+        lines.append(json.dumps(item, ensure_ascii=False, separators=(",", ":")))
+        if len(lines) == CHUNK_ITEMS:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
@@ -0,0 +1,179 @@
+"""Bulk import of budget items from CSV or JSON Lines.
+
+Uploads are parsed as they stream in, one record at a time, and every record
+goes through the same validation as a single item. Nothing is written unless
+every record is valid; the whole batch is then stored with one append.
+
+Amounts use the same normalisation as the API's payload model
+(:func:`parse_amount`). Common plain numbers take a fast path, and the
+patterns for the general case are compiled once.
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import budget_store
+
+__all__ = ["FORMATS", "ImportResult", "import_items", "parse_amount", "read_records"]
+
+FORMATS = ("csv", "jsonl")
+MAX_REPORTED_ERRORS = 100
+
+_PLAIN_NUMBER = re.compile(r"-?\d+(?:\.\d*)?\Z")
+_NON_NUMERIC = re.compile(r"[^0-9,\.\-]")
+_WHITESPACE = str.maketrans("", "", " \u00a0\u202f")
+_CSV_DELIMITERS = (",", ";", "\t")
+_INVALID_AMOUNT = "Le montant doit être un nombre."
+
+Record = Tuple[int, Any]
+
+
+def parse_amount(value: Any) -> Optional[float]:
+    """Parse an amount such as ``"1 234,56 €"`` or ``"1,234.56"``.
+
+    Returns ``None`` for an empty value and raises :class:`ValueError` for
+    anything that is not a number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        raise ValueError(_INVALID_AMOUNT)
+    stripped = value.strip()
+    if not stripped:
+        return None
+    if _PLAIN_NUMBER.match(stripped):
+        return float(stripped)
+
+    # Drop currency symbols, thin spaces and other non numeric characters while
+    # keeping decimal separators.
+    normalised = _NON_NUMERIC.sub("", stripped.translate(_WHITESPACE))
+    if normalised.count("-") > 1 or ("-" in normalised and not normalised.startswith("-")):
+        raise ValueError(_INVALID_AMOUNT)
+    if not normalised or normalised in {"-", ",", "."}:
+        raise ValueError(_INVALID_AMOUNT)
+
+    if "," in normalised and "." in normalised:
+        # The separator that comes last is the decimal one.
+        if normalised.rfind(",") > normalised.rfind("."):
+            normalised = normalised.replace(".", "").replace(",", ".")
+        else:
+            normalised = normalised.replace(",", "")
+    elif "," in normalised:
+        # "12,5" and "12,50" are decimals, "1,234" is a thousands separator.
+        if 0 < len(normalised.rsplit(",", 1)[1]) <= 2:
+            normalised = normalised.replace(",", ".")
+        else:
+            normalised = normalised.replace(",", "")
+
+    try:
+        return float(normalised)
+    except ValueError as exc:
+        raise ValueError(_INVALID_AMOUNT) from exc
+
+
+def _lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """Decode ``chunks`` as UTF-8 (with or without BOM) into lines."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _csv_records(first: str, lines: Iterator[str]) -> Iterator[Record]:
+    delimiter = max(_CSV_DELIMITERS, key=first.count)
+    header = [name.strip() for name in next(csv.reader([first], delimiter=delimiter))]
+    reader = csv.reader(lines, delimiter=delimiter)
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        record = {name: cell for name, cell in zip(header, row) if name and cell.strip()}
+        yield reader.line_num + 1, record
+
+
+def _jsonl_records(first: str, lines: Iterator[str]) -> Iterator[Record]:
+    yield 1, _json_record(first)
+    for number, line in enumerate(lines, 2):
+        if line.strip():
+            yield number, _json_record(line)
+
+
+def _json_record(line: str) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return ValueError("Ligne JSON invalide.")
+
+
+def read_records(chunks: Iterable[bytes], fmt: Optional[str] = None) -> Iterator[Record]:
+    """Yield ``(line number, record)`` pairs from an upload.
+
+    ``fmt`` is ``"csv"`` (header row first, ``,``, ``;`` or tab separated) or
+    ``"jsonl"`` (one object per line). Without it, an upload whose first line
+    starts with ``{`` is read as JSON Lines. Unparseable JSON lines are yielded
+    as :class:`ValueError` instances so they are reported with the others.
+    """
+    lines = _lines(chunks)
+    skipped = 0
+    for first in lines:
+        skipped += 1
+        if first.strip():
+            break
+    else:
+        return
+    if fmt is None:
+        fmt = "jsonl" if first.lstrip().startswith("{") else "csv"
+    records = _jsonl_records(first, lines) if fmt == "jsonl" else _csv_records(first, lines)
+    for number, record in records:
+        yield number + skipped - 1, record
+
+
+class ImportResult:
+    """Outcome of :func:`import_items`: ``imported`` items or row ``errors``."""
+
+    __slots__ = ("imported", "errors", "error_count")
+
+    def __init__(self, imported: int, errors: List[Dict[str, Any]], error_count: int) -> None:
+        self.imported = imported
+        self.errors = errors
+        self.error_count = error_count
+
+
+def import_items(records: Iterable[Record]) -> ImportResult:
+    """Validate every record and store them all in one write if none failed.
+
+    Only the first ``MAX_REPORTED_ERRORS`` errors are listed; ``error_count``
+    has the total.
+    """
+    items: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    error_count = 0
+    for line, record in records:
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            if not isinstance(record, dict):
+                raise ValueError("Chaque ligne doit être un objet JSON.")
+            if "amount" in record:
+                record["amount"] = parse_amount(record["amount"])
+            items.append(budget_store.prepare_item(record))
+        except ValueError as exc:
+            error_count += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line, "error": str(exc)})
+    if error_count:
+        return ImportResult(0, errors, error_count)
+    budget_store.add_items(items)
+    return ImportResult(len(items), [], 0)
@@ -1,17 +1,59 @@
+"""Budget item storage.
+
+Items live in an append-only JSON Lines log: every write appends one line and
+updates an in-memory index keyed by item id, which is loaded from the log once
+per process. A later line for an existing id replaces the earlier one. When
+superseded or unreadable lines make up more than ``COMPACT_RATIO`` of the log,
+a background thread rewrites it with only the live items and swaps it in
+atomically. Appends and the swap hold an exclusive ``flock`` on the log, so
+lines written meanwhile, by any process sharing the file, are carried over to
+the new log. A legacy ``budget_items.json`` array found next to the log is
+imported the first time the store is opened.
+
+Reads go through an immutable :class:`Snapshot` that is rebuilt only when the
+log changes. Freshness is a ``stat`` of the log, so appends and compactions by
+other processes sharing the file are picked up too. Serving an unchanged
+snapshot takes no lock. Totals per category, per month and overall are kept
+up to date on every write, so a snapshot carries its summaries ready-made.
+
+With ``BUDGET_STORAGE_BACKEND=sqlite`` items are kept in a SQLite database in
+WAL mode instead, indexed on ``createdAt``, ``category`` and ``type`` and safe
+to share between worker processes. Pages are then answered by indexed queries
+and the running totals live in a summary table updated in the same
+transaction as each write. The first open imports the JSON Lines log, or
+failing that the legacy JSON array, once.
+"""
+
 from __future__ import annotations
 
 import json
 import os
+import re
+import secrets
+import shutil
+import sqlite3
 import threading
 import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
 
 __all__ = [
+    "BACKEND",
     "BudgetStoreError",
+    "COMPACT_MIN_LINES",
+    "COMPACT_RATIO",
+    "Snapshot",
+    "add_items",
+    "compact",
     "create_item",
     "list_items",
+    "load",
+    "prepare_item",
+    "save_item",
+    "snapshot",
 ]
 
 
@@ -29,19 +71,34 @@ else:
     _STORAGE_PATH = base_dir / file_name
 
 _STORAGE_PATH = _STORAGE_PATH.resolve()
+# The configured path names the legacy JSON array; the log sits beside it.
+if _STORAGE_PATH.suffix == ".jsonl":
+    _LOG_PATH = _STORAGE_PATH
+    _LEGACY_PATH = _STORAGE_PATH.with_suffix(".json")
+else:
+    _LOG_PATH = _STORAGE_PATH.with_suffix(".jsonl")
+    _LEGACY_PATH = _STORAGE_PATH
+
+_SQLITE_PATH = _LOG_PATH.with_suffix(".sqlite3")
+
+BACKEND = os.getenv("BUDGET_STORAGE_BACKEND", "log").strip().lower()
+if BACKEND not in ("log", "sqlite"):
+    raise ValueError(f"BUDGET_STORAGE_BACKEND must be 'log' or 'sqlite', not {BACKEND!r}")
+
+COMPACT_RATIO = float(os.getenv("BUDGET_COMPACT_RATIO", "0.5"))
+COMPACT_MIN_LINES = int(os.getenv("BUDGET_COMPACT_MIN_LINES", "1000"))
+
 _LOCK = threading.Lock()
+_MONTH = re.compile(r"\d{4}-\d{2}")
 
 
-def _ensure_storage() -> None:
-    _STORAGE_PATH.parent.mkdir(parents=True, exist_ok=True)
-    if not _STORAGE_PATH.exists():
-        _STORAGE_PATH.write_text("[]", encoding="utf-8")
+def _encode(item: Dict[str, Any]) -> bytes:
+    return (json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
 
 
-def _read_items() -> List[Dict[str, Any]]:
-    _ensure_storage()
+def _read_legacy(path: Path) -> List[Dict[str, Any]]:
     try:
-        with _STORAGE_PATH.open("r", encoding="utf-8") as fh:
+        with path.open("r", encoding="utf-8") as fh:
             data = json.load(fh)
     except (OSError, json.JSONDecodeError):
         return []
@@ -50,22 +107,643 @@ def _read_items() -> List[Dict[str, Any]]:
     return [entry for entry in data if isinstance(entry, dict)]
 
 
-def _write_items(items: List[Dict[str, Any]]) -> None:
-    _ensure_storage()
-    temp_path = _STORAGE_PATH.with_name(_STORAGE_PATH.name + ".tmp")
-    with temp_path.open("w", encoding="utf-8") as fh:
-        json.dump(items, fh, ensure_ascii=False, indent=2)
-    temp_path.replace(_STORAGE_PATH)
+def _read_log(path: Path) -> List[Dict[str, Any]]:
+    """Return the live items of the log at ``path``, in log order."""
+    items: Dict[str, Dict[str, Any]] = {}
+    with path.open("rb") as fh:
+        for raw in fh:
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(entry, dict):
+                items[str(entry.get("id"))] = entry
+    return list(items.values())
+
+
+def _write_log(path: Path, items: List[Dict[str, Any]]) -> None:
+    """Atomically replace ``path`` with a log holding ``items``."""
+    temp_path = path.with_name(path.name + ".tmp")
+    with temp_path.open("wb") as fh:
+        fh.writelines(_encode(item) for item in items)
+        fh.flush()
+        os.fsync(fh.fileno())
+    temp_path.replace(path)
+
+
+def _month(item: Mapping[str, Any]) -> str:
+    created_at = item.get("createdAt")
+    if isinstance(created_at, str) and _MONTH.match(created_at):
+        return created_at[:7]
+    return "unknown"
+
+
+def _kind(item: Mapping[str, Any]) -> str:
+    return "income" if item.get("type") == "income" else "expense"
+
+
+def _amount(item: Mapping[str, Any]) -> float:
+    amount = item.get("amount")
+    return float(amount) if isinstance(amount, (int, float)) else 0.0
+
+
+def _groups(item: Mapping[str, Any]) -> Tuple[str, str]:
+    """The category and month an item is summed under."""
+    return str(item.get("category") or "Général"), _month(item)
+
+
+class _Aggregates:
+    """Income and expense totals overall, per category and per month.
+
+    Maintained as items are added and replaced, so summaries never rescan the
+    history.
+    """
+
+    def __init__(self) -> None:
+        self.totals = _zero()
+        self.categories: Dict[str, Dict[str, float]] = {}
+        self.months: Dict[str, Dict[str, float]] = {}
+
+    def apply(self, item: Mapping[str, Any], sign: int) -> None:
+        kind = _kind(item)
+        amount = _amount(item) * sign
+        category, month = _groups(item)
+        groups = ((self.categories, category), (self.months, month))
+        for bucket in (self.totals, *(group.setdefault(key, _zero()) for group, key in groups)):
+            bucket[kind] += amount
+            bucket["count"] += sign
+        for group, key in groups:
+            if not group[key]["count"]:
+                del group[key]
+
+    def freeze(self) -> Dict[str, Any]:
+        return {
+            "totals": _summary(self.totals),
+            "categories": [{"category": key, **_summary(value)} for key, value in sorted(self.categories.items())],
+            "months": [{"month": key, **_summary(value)} for key, value in sorted(self.months.items())],
+        }
+
+
+def _zero() -> Dict[str, float]:
+    return {"income": 0.0, "expense": 0.0, "count": 0}
+
+
+def _summary(bucket: Dict[str, float]) -> Dict[str, Any]:
+    income = round(bucket["income"], 2)
+    expense = round(bucket["expense"], 2)
+    return {"income": income, "expense": expense, "balance": round(income - expense, 2), "count": int(bucket["count"])}
+
+
+class Snapshot:
+    """Immutable view of the store at one version of the log.
+
+    ``items`` holds the stored dicts themselves, which are never modified once
+    written, so callers must not modify them either. ``etag`` is derived from
+    the storage's version ``key`` (for the log, the file's identity, size and
+    mtime), so every process serving the same data hands out the same tag.
+    """
+
+    __slots__ = ("_items", "aggregates", "etag", "_key", "_body")
+
+    def __init__(self, items: Optional[Tuple[Mapping[str, Any], ...]], aggregates: Dict[str, Any],
+                 key: Tuple[int, ...]) -> None:
+        self._items = items
+        self.aggregates = aggregates
+        self.etag = '"%s"' % "-".join("%x" % part for part in key)
+        self._key = key
+        self._body: Optional[bytes] = None
+
+    @property
+    def items(self) -> Tuple[Mapping[str, Any], ...]:
+        return self._items
+
+    def body(self) -> bytes:
+        """``{"items": [...]}`` as JSON, serialised once per snapshot."""
+        if self._body is None:
+            self._body = json.dumps({"items": self.items}, ensure_ascii=False).encode("utf-8")
+        return self._body
+
+    def page(
+        self,
+        cursor: int = 0,
+        limit: int = 100,
+        *,
+        category: Optional[str] = None,
+        kind: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> Tuple[List[Mapping[str, Any]], Optional[int]]:
+        """Return up to ``limit`` matching items from position ``cursor`` on.
+
+        Items keep their insertion order, so positions are stable cursors. The
+        second value is the cursor of the next page, or ``None`` at the end.
+        ``start`` and ``end`` are ISO dates or datetimes bounding ``createdAt``,
+        both inclusive.
+        """
+        if cursor < 0 or limit < 1:
+            raise BudgetStoreError("Pagination invalide.")
+        matches: List[Mapping[str, Any]] = []
+        for position, item in self._matches(cursor, category, kind, start, end):
+            if len(matches) == limit:
+                return matches, position
+            matches.append(item)
+        return matches, None
+
+    def iter_items(
+        self,
+        *,
+        category: Optional[str] = None,
+        kind: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> Iterator[Mapping[str, Any]]:
+        """Yield every item matching the :meth:`page` filters, one at a time."""
+        for _, item in self._matches(0, category, kind, start, end):
+            yield item
+
+    def _matches(self, cursor: int, category: Optional[str], kind: Optional[str],
+                 start: Optional[str], end: Optional[str]) -> Iterator[Tuple[int, Mapping[str, Any]]]:
+        items = self.items
+        for position in range(cursor, len(items)):
+            item = items[position]
+            if category is not None and item.get("category") != category:
+                continue
+            if kind is not None and _kind(item) != kind:
+                continue
+            if start is not None or end is not None:
+                created_at = item.get("createdAt")
+                if not isinstance(created_at, str):
+                    continue
+                if start is not None and created_at < start:
+                    continue
+                if end is not None and created_at[:len(end)] > end:
+                    continue
+            yield position, item
+
+
+class _SqliteSnapshot(Snapshot):
+    """Snapshot of the SQLite store.
+
+    The version, summaries and items are read in one transaction. Pages and
+    exports are queried from the table, in a transaction that first checks the
+    version is still the snapshot's; after a later write they are filtered from
+    the snapshot's own items instead, so nothing newer than the ETag is served.
+    """
+
+    __slots__ = ("_store", "_seqs")
+
+    def __init__(self, store: "_SqliteStore", items: Tuple[Mapping[str, Any], ...], seqs: Tuple[int, ...],
+                 aggregates: Dict[str, Any], key: Tuple[int, int]) -> None:
+        super().__init__(items, aggregates, key)
+        self._store = store
+        # Row sequence number of each item, ascending; pages use them as cursors.
+        self._seqs = seqs
+
+    def _current(self, conn: sqlite3.Connection) -> bool:
+        """Whether the transaction open on ``conn`` sees this snapshot's version."""
+        return conn.execute("SELECT value FROM budget_meta WHERE key = 'version'").fetchone()[0] == self._key[1]
+
+    def page(
+        self,
+        cursor: int = 0,
+        limit: int = 100,
+        *,
+        category: Optional[str] = None,
+        kind: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+    ) -> Tuple[List[Mapping[str, Any]], Optional[int]]:
+        """Like :meth:`Snapshot.page`, with row sequence numbers as cursors."""
+        if cursor < 0 or limit < 1:
+            raise BudgetStoreError("Pagination invalide.")
+        where, params = _where(cursor, category, kind, start, end)
+        conn = self._store._connection()
+        conn.execute("BEGIN")
+        try:
+            rows = None
+            if self._current(conn):
+                rows = conn.execute(
+                    f"SELECT seq, data FROM budget_items WHERE {where} ORDER BY seq LIMIT ?", (*params, limit + 1)
+                ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        if rows is None:
+            return super().page(cursor, limit, category=category, kind=kind, start=start, end=end)
+        next_cursor = rows.pop()[0] if len(rows) > limit else None
+        return [json.loads(data) for _, data in rows], next_cursor
+
+    def _matches(self, cursor: int, category: Optional[str], kind: Optional[str],
+                 start: Optional[str], end: Optional[str]) -> Iterator[Tuple[int, Mapping[str, Any]]]:
+        # A connection of its own, so a long export neither shares a cursor
+        # with other requests on this thread nor sees their writes halfway.
+        where, params = _where(cursor, category, kind, start, end)
+        conn = self._store._connect()
+        try:
+            conn.execute("BEGIN")
+            if self._current(conn):
+                rows = conn.execute(f"SELECT seq, data FROM budget_items WHERE {where} ORDER BY seq", params)
+                while True:
+                    batch = rows.fetchmany(500)
+                    if not batch:
+                        return
+                    for seq, data in batch:
+                        yield seq, json.loads(data)
+        finally:
+            conn.close()
+        seqs = self._seqs
+        for position, item in super()._matches(bisect_left(seqs, cursor), category, kind, start, end):
+            yield seqs[position], item
+
+
+def _where(cursor: int, category: Optional[str], kind: Optional[str],
+           start: Optional[str], end: Optional[str]) -> Tuple[str, List[Any]]:
+    clauses = ["seq >= ?"]
+    params: List[Any] = [cursor]
+    if category is not None:
+        clauses.append("category = ?")
+        params.append(category)
+    if kind == "income":
+        clauses.append("type = 'income'")
+    elif kind is not None:
+        clauses.append("(type IS NULL OR type != 'income')")
+    if start is not None:
+        clauses.append("created_at >= ?")
+        params.append(start)
+    if end is not None:
+        # Inclusive prefix bound: "2024-03-31" also admits "2024-03-31T12:00".
+        clauses.append("created_at <= ?")
+        params.append(end + "\U0010ffff")
+    return " AND ".join(clauses), params
+
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class _LogStore:
+    def __init__(self, path: Path, legacy_path: Path) -> None:
+        self.path = path
+        self.legacy_path = legacy_path
+        self._items: Optional[Dict[str, Dict[str, Any]]] = None
+        self._aggregates = _Aggregates()
+        self._fd = -1
+        self._ino = 0
+        self._offset = 0
+        self._lines = 0
+        self._snapshot: Optional[Snapshot] = None
+        self._compacting = False
+
+    def load(self) -> None:
+        with _LOCK:
+            self._open()
+
+    def _open(self) -> Dict[str, Dict[str, Any]]:
+        """Load the index on first use; callers hold ``_LOCK``."""
+        if self._items is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if not self.path.exists():
+                _write_log(self.path, _read_legacy(self.legacy_path))
+            self._load(recover=True)
+        return self._items
+
+    def _load(self, recover: bool = False) -> None:
+        """(Re)read the whole log; with ``recover``, cut off a torn final line."""
+        if self._fd >= 0:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        self._items = {}
+        self._aggregates = _Aggregates()
+        self._ino = os.fstat(self._fd).st_ino
+        self._offset = self._lines = 0
+        self._read_tail()
+        if recover and os.fstat(self._fd).st_size > self._offset:
+            os.ftruncate(self._fd, self._offset)
+
+    def _read_tail(self) -> None:
+        """Apply complete lines written after ``_offset``, by any process."""
+        with self.path.open("rb") as fh:
+            fh.seek(self._offset)
+            for raw in fh:
+                if not raw.endswith(b"\n"):
+                    break  # torn or still being written
+                self._offset += len(raw)
+                self._lines += 1
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict):
+                    self._put(entry)
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Hold an exclusive ``flock`` on the current log; callers hold ``_LOCK``.
+
+        Appends and the final step of a compaction take it, so that no process
+        appends to a log that a compaction is replacing. If another process
+        swapped the log while we waited, the new one is opened and locked.
+        """
+        import fcntl
+
+        while True:
+            fd = self._fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.stat(self.path).st_ino == self._ino:
+                break
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            self._load()
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _put(self, item: Dict[str, Any]) -> None:
+        key = str(item.get("id"))
+        previous = self._items.get(key)
+        if previous is not None:
+            self._aggregates.apply(previous, -1)
+        self._items[key] = item
+        self._aggregates.apply(item, 1)
+
+    def _sync(self) -> os.stat_result:
+        """Catch up with writes and compactions by other processes."""
+        st = os.stat(self.path)
+        if st.st_ino != self._ino or st.st_size < self._offset:
+            self._load()
+            st = os.stat(self.path)
+        elif st.st_size > self._offset:
+            self._read_tail()
+        return st
+
+    def snapshot(self) -> Snapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            try:
+                if _stat_key(os.stat(self.path)) == snapshot._key:
+                    return snapshot
+            except OSError:
+                pass
+        with _LOCK:
+            self._open()
+            key = _stat_key(self._sync())
+            if self._snapshot is None or key != self._snapshot._key:
+                self._snapshot = Snapshot(tuple(self._items.values()), self._aggregates.freeze(), key)
+            return self._snapshot
+
+    def append(self, items: List[Dict[str, Any]]) -> int:
+        """Write ``items`` to the log with a single append.
+
+        Returns how many of them replaced an existing item.
+        """
+        data = b"".join(_encode(item) for item in items)
+        with _LOCK:
+            self._open()
+            with self._exclusive():
+                self._sync()
+                replaced = sum(str(item.get("id")) in self._items for item in items)
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(self._fd, view):]
+                if os.fstat(self._fd).st_size == self._offset + len(data):
+                    for item in items:
+                        self._put(item)
+                    self._offset += len(data)
+                    self._lines += len(items)
+                else:
+                    self._read_tail()
+            live = len(self._items)
+            due = self._lines >= COMPACT_MIN_LINES and self._lines - live > self._lines * COMPACT_RATIO
+            if due and not self._compacting:
+                threading.Thread(target=self.compact, name="budget-compact", daemon=True).start()
+        return replaced
+
+    def compact(self) -> None:
+        """Rewrite the log with only the live items.
+
+        The snapshot is written without blocking appends. Whatever was
+        appended meanwhile, by any process, is then copied from the old log
+        to the new one under the log lock, right before the swap. Only one
+        compaction runs at a time; a call made during another one returns.
+        """
+        with _LOCK:
+            if self._compacting:
+                return
+            self._compacting = True
+            self._open()
+            self._sync()
+            snapshot = list(self._items.values())
+            ino, offset = self._ino, self._offset
+        temp_path = self.path.with_name(self.path.name + ".compact")
+        try:
+            _write_log(temp_path, snapshot)
+            with _LOCK:
+                with self._exclusive():
+                    if self._ino != ino:
+                        return  # another process compacted the log first
+                    with self.path.open("rb") as old, temp_path.open("ab") as new:
+                        old.seek(offset)
+                        shutil.copyfileobj(old, new)
+                        new.flush()
+                        os.fsync(new.fileno())
+                    temp_path.replace(self.path)
+                self._load()
+        finally:
+            with _LOCK:
+                self._compacting = False
+            temp_path.unlink(missing_ok=True)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS budget_items (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    created_at TEXT,
+    category TEXT,
+    type TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS budget_items_created_at ON budget_items (created_at);
+CREATE INDEX IF NOT EXISTS budget_items_category ON budget_items (category);
+CREATE INDEX IF NOT EXISTS budget_items_type ON budget_items (type);
+CREATE TABLE IF NOT EXISTS budget_summary (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    income REAL NOT NULL,
+    expense REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (scope, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS budget_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _text(value: Any) -> Optional[str]:
+    return value if isinstance(value, str) else None
+
+
+class _SqliteStore:
+    """Budget items in a SQLite database, one connection per thread."""
+
+    def __init__(self, path: Path, log_path: Path, legacy_path: Path) -> None:
+        self.path = path
+        self.log_path = log_path
+        self.legacy_path = legacy_path
+        self._local = threading.local()
+        self._snapshot: Optional[_SqliteSnapshot] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit; writes open their own ``BEGIN IMMEDIATE`` transaction.
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connect()
+            conn.execute("PRAGMA journal_mode = WAL")
+            with _LOCK:
+                conn.executescript(_SCHEMA)
+                self._migrate(conn)
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Import the existing log or legacy JSON array, once per database."""
+        with self._transaction(conn):
+            if conn.execute("SELECT 1 FROM budget_meta WHERE key = 'uid'").fetchone():
+                return
+            conn.execute("INSERT INTO budget_meta VALUES ('uid', ?), ('version', 0)", (secrets.randbits(62),))
+            conn.execute("INSERT INTO budget_summary VALUES ('total', '', 0, 0, 0)")
+            if self.log_path.exists():
+                items = _read_log(self.log_path)
+            else:
+                items = _read_legacy(self.legacy_path)
+            self._write(conn, items)
+
+    @staticmethod
+    @contextmanager
+    def _transaction(conn: sqlite3.Connection) -> Iterator[None]:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _write(self, conn: sqlite3.Connection, items: List[Dict[str, Any]]) -> int:
+        """Upsert ``items`` and their contribution to the summaries; return how many replaced a row."""
+        deltas: Dict[Tuple[str, str], List[float]] = {}
+        replaced = 0
+
+        def add(item: Mapping[str, Any], sign: int) -> None:
+            kind = _kind(item)
+            category, month = _groups(item)
+            for scope_key in (("total", ""), ("category", category), ("month", month)):
+                delta = deltas.setdefault(scope_key, [0.0, 0.0, 0])
+                delta[0 if kind == "income" else 1] += _amount(item) * sign
+                delta[2] += sign
+
+        for item in items:
+            key = str(item.get("id"))
+            previous = conn.execute("SELECT data FROM budget_items WHERE id = ?", (key,)).fetchone()
+            if previous is not None:
+                add(json.loads(previous[0]), -1)
+                replaced += 1
+            add(item, 1)
+            conn.execute(
+                "INSERT INTO budget_items (id, created_at, category, type, data) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET created_at = excluded.created_at, "
+                "category = excluded.category, type = excluded.type, data = excluded.data",
+                (key, _text(item.get("createdAt")), _text(item.get("category")), _text(item.get("type")),
+                 json.dumps(item, ensure_ascii=False, separators=(",", ":"))),
+            )
+        conn.executemany(
+            "INSERT INTO budget_summary VALUES (?, ?, ?, ?, ?) ON CONFLICT (scope, key) DO UPDATE SET "
+            "income = income + excluded.income, expense = expense + excluded.expense, "
+            "count = count + excluded.count",
+            [(*scope_key, *delta) for scope_key, delta in deltas.items()],
+        )
+        conn.execute("DELETE FROM budget_summary WHERE count = 0 AND scope != 'total'")
+        conn.execute("UPDATE budget_meta SET value = value + 1 WHERE key = 'version'")
+        return replaced
+
+    def load(self) -> None:
+        self._connection()
+
+    def snapshot(self) -> Snapshot:
+        conn = self._connection()
+        snapshot = self._snapshot
+        version = conn.execute("SELECT value FROM budget_meta WHERE key = 'version'").fetchone()[0]
+        if snapshot is not None and snapshot._key[1] == version:
+            return snapshot
+        conn.execute("BEGIN")
+        try:
+            uid, version = (value for (value,) in conn.execute(
+                "SELECT value FROM budget_meta WHERE key IN ('uid', 'version') ORDER BY key"
+            ))
+            aggregates = _Aggregates()
+            for scope, key, income, expense, count in conn.execute("SELECT * FROM budget_summary"):
+                bucket = {"income": income, "expense": expense, "count": count}
+                if scope == "total":
+                    aggregates.totals = bucket
+                else:
+                    (aggregates.categories if scope == "category" else aggregates.months)[key] = bucket
+            rows = conn.execute("SELECT seq, data FROM budget_items ORDER BY seq").fetchall()
+        finally:
+            conn.execute("COMMIT")
+        items = tuple(json.loads(data) for _, data in rows)
+        seqs = tuple(seq for seq, _ in rows)
+        snapshot = _SqliteSnapshot(self, items, seqs, aggregates.freeze(), (uid, version))
+        self._snapshot = snapshot
+        return snapshot
+
+    def append(self, items: List[Dict[str, Any]]) -> int:
+        conn = self._connection()
+        with self._transaction(conn):
+            return self._write(conn, items)
+
+    def compact(self) -> None:
+        """Fold the write-ahead log back into the database file."""
+        conn = self._connection()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("PRAGMA optimize")
+
+
+if BACKEND == "sqlite":
+    _store: Any = _SqliteStore(_SQLITE_PATH, _LOG_PATH, _LEGACY_PATH)
+else:
+    _store = _LogStore(_LOG_PATH, _LEGACY_PATH)
+
+
+def load() -> None:
+    """Open the store now instead of on first use, importing legacy data."""
+    _store.load()
+
+
+def compact() -> None:
+    """Rewrite the log with only the live items (checkpoint it, for SQLite)."""
+    _store.compact()
+
+
+def snapshot() -> Snapshot:
+    """Return the current :class:`Snapshot`; cheap while nothing has changed."""
+    return _store.snapshot()
 
 
 def list_items() -> List[Dict[str, Any]]:
     """Return a copy of all stored budget items."""
-    with _LOCK:
-        return [dict(item) for item in _read_items()]
+    return [dict(item) for item in _store.snapshot().items]
 
 
-def create_item(data: Dict[str, Any]) -> Dict[str, Any]:
-    """Validate and persist a budget item, returning the stored representation."""
+def prepare_item(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate ``data`` and fill in defaults, returning the item to store."""
     if not isinstance(data, dict):  # pragma: no cover - defensive guard
         raise BudgetStoreError("Le corps de la requête doit être un objet JSON.")
 
@@ -103,10 +781,22 @@ def create_item(data: Dict[str, Any]) -> Dict[str, Any]:
     item.setdefault("category", item.get("category") or "Général")
     item.setdefault("type", item.get("type") or "expense")
     item.setdefault("id", uuid.uuid4().hex)
+    return item
+
+
+def create_item(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate and persist a budget item, returning the stored representation."""
+    return save_item(data)[0]
+
+
+def save_item(data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """Like :func:`create_item`, also telling whether an item with the same id was replaced."""
+    item = prepare_item(data)
+    replaced = _store.append([item])
+    return dict(item), bool(replaced)
 
-    with _LOCK:
-        items = _read_items()
-        items.append(item)
-        _write_items(items)
 
-    return dict(item)
+def add_items(items: List[Dict[str, Any]]) -> None:
+    """Persist items returned by :func:`prepare_item` in one write."""
+    if items:
+        _store.append(items)
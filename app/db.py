@@ -1,21 +1,46 @@
 from __future__ import annotations
 
 # INSERT START: imports
+import json
 import os
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 import uuid
 
+from . import hls, waveform
+from .admission import ACTIVE_STATUSES
+
 # INSERT END: imports
 
 # INSERT START: constants
 AUDIO_DIR = Path("public/audio")
-AUDIO_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = Path("audio_jobs.db")
-_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-_conn.row_factory = sqlite3.Row
+# Opened on first use (or by ``init_db`` at app startup) so that importing this
+# module touches neither the database nor the filesystem.
+_conn: Optional[sqlite3.Connection] = None
+_conn_lock = threading.Lock()
+
+# Finished jobs older than ``RETENTION_DAYS`` are purged with their MP3 by a
+# background thread, ``RETENTION_BATCH`` rows per transaction, every
+# ``RETENTION_INTERVAL`` seconds. With ``AUDIO_ARCHIVE_PATH`` set, purged rows
+# are first appended to that file as JSON lines. ``0`` days keeps everything.
+# Jobs still queued or running after ``STALE_HOURS`` were lost to a restart or a
+# crash and are purged the same way, as are HLS staging directories left that
+# long; ``0`` hours keeps them.
+RETENTION_DAYS = max(0.0, float(os.getenv("AUDIO_RETENTION_DAYS", "30")))
+STALE_HOURS = max(0.0, float(os.getenv("AUDIO_STALE_HOURS", "24")))
+RETENTION_BATCH = max(1, int(os.getenv("AUDIO_RETENTION_BATCH", "500")))
+RETENTION_INTERVAL = max(60, int(os.getenv("AUDIO_RETENTION_INTERVAL", "3600")))
+_archive_env = os.getenv("AUDIO_ARCHIVE_PATH")
+ARCHIVE_PATH = Path(_archive_env) if _archive_env else None
+# Free pages handed back to the filesystem after each purged batch.
+VACUUM_PAGES = 2000
+FINISHED_STATUSES = ("done", "error", "cancelled")
+_retention_started = False
 # INSERT END: constants
 
 # INSERT START: model
@@ -48,8 +73,39 @@ class Audio:
 
 # INSERT START: init_db
 
-def init_db() -> None:
-    _conn.execute(
+# Columns added after the original schema; ``init_db`` adds any that an older
+# database is missing. Stage durations are kept as plain columns so that they
+# can be aggregated in SQL, with per-stage start times in ``stage_timings``.
+_EXTRA_COLUMNS = {
+    "stage_timings": "TEXT",
+    "probe_s": "REAL",
+    "download_s": "REAL",
+    "convert_s": "REAL",
+    "bytes_downloaded": "INTEGER",
+    "extractor": "TEXT",
+    "source_format": "TEXT",
+    "source_codec": "TEXT",
+}
+
+def _connection() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        with _conn_lock:
+            if _conn is None:
+                AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+                conn.row_factory = sqlite3.Row
+                _create_schema(conn)
+                _conn = conn
+    return _conn
+
+def _create_schema(conn: sqlite3.Connection) -> None:
+    # Incremental auto-vacuum lets retention return space a batch at a time.
+    # Switching an existing database over takes one full VACUUM.
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    conn.execute(
         """
         CREATE TABLE IF NOT EXISTS audio (
             id TEXT PRIMARY KEY,
@@ -64,7 +120,19 @@ def init_db() -> None:
         )
         """
     )
-    _conn.commit()
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(audio)")}
+    for column, column_type in _EXTRA_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE audio ADD COLUMN {column} {column_type}")
+    # Listings page through (created_at, id), optionally within one status.
+    conn.execute("CREATE INDEX IF NOT EXISTS audio_created_at ON audio (created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS audio_status_created_at ON audio (status, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS audio_source_url ON audio (source_url)")
+    conn.commit()
+
+def init_db() -> None:
+    """Create the audio directory and open the database, creating its schema."""
+    _connection()
 
 # INSERT END: init_db
 
@@ -72,7 +140,8 @@ def init_db() -> None:
 
 def create_audio_job(source_url: str) -> str:
     audio = Audio(source_url=source_url)
-    _conn.execute(
+    conn = _connection()
+    conn.execute(
         """
         INSERT INTO audio (
             id, created_at, source_url, status, progress, message, title, duration_s, filepath_mp3
@@ -90,7 +159,7 @@ def create_audio_job(source_url: str) -> str:
             audio.filepath_mp3,
         ),
     )
-    _conn.commit()
+    conn.commit()
     return audio.id
 
 def update_audio_job(audio_id: str, **fields: Any) -> None:
@@ -99,21 +168,181 @@ def update_audio_job(audio_id: str, **fields: Any) -> None:
     cols = ", ".join(f"{k}=?" for k in fields.keys())
     values = list(fields.values())
     values.append(audio_id)
-    _conn.execute(f"UPDATE audio SET {cols} WHERE id=?", values)
-    _conn.commit()
+    conn = _connection()
+    conn.execute(f"UPDATE audio SET {cols} WHERE id=?", values)
+    conn.commit()
+
+def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    data = dict(row)
+    data["created_at"] = datetime.fromisoformat(data["created_at"])
+    data["stage_timings"] = json.loads(data["stage_timings"]) if data.get("stage_timings") else {}
+    return data
 
 def get_audio_job(audio_id: str) -> Optional[Dict[str, Any]]:
-    cur = _conn.execute("SELECT * FROM audio WHERE id=?", (audio_id,))
+    cur = _connection().execute("SELECT * FROM audio WHERE id=?", (audio_id,))
     row = cur.fetchone()
     if row:
-        data = dict(row)
-        data["created_at"] = datetime.fromisoformat(data["created_at"])
-        return data
+        return _row_to_dict(row)
     return None
 
+def count_audio_jobs(statuses: Iterable[str]) -> int:
+    statuses = list(statuses)
+    placeholders = ", ".join("?" for _ in statuses)
+    cur = _connection().execute(f"SELECT COUNT(*) FROM audio WHERE status IN ({placeholders})", statuses)
+    return cur.fetchone()[0]
+
+def _utc_naive(value: datetime) -> str:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+def list_audio_jobs(
+    *,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Return jobs newest first, and the cursor of the next page or ``None``.
+
+    ``since`` is inclusive and ``until`` exclusive. The cursor is the
+    ``created_at|id`` of the last job returned.
+    """
+    clauses: List[str] = []
+    params: List[Any] = []
+    if status is not None:
+        clauses.append("status = ?")
+        params.append(status)
+    if since is not None:
+        clauses.append("created_at >= ?")
+        params.append(_utc_naive(since))
+    if until is not None:
+        clauses.append("created_at < ?")
+        params.append(_utc_naive(until))
+    if cursor is not None:
+        created_at, sep, audio_id = cursor.partition("|")
+        if not sep or not created_at or not audio_id:
+            raise ValueError("invalid cursor")
+        clauses.append("(created_at, id) < (?, ?)")
+        params.extend((created_at, audio_id))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = _connection().execute(
+        f"SELECT * FROM audio {where} ORDER BY created_at DESC, id DESC LIMIT ?", (*params, limit + 1)
+    ).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['created_at']}|{rows[-1]['id']}"
+    return [_row_to_dict(row) for row in rows], next_cursor
+
+STAGE_STATS_GROUPS = ("extractor", "source_format", "source_codec")
+
+def stage_stats(group_by: str = "extractor") -> List[Dict[str, Any]]:
+    if group_by not in STAGE_STATS_GROUPS:
+        raise ValueError(f"group_by must be one of: {', '.join(STAGE_STATS_GROUPS)}")
+    cur = _connection().execute(
+        f"""
+        SELECT {group_by} AS grp,
+               COUNT(*) AS jobs,
+               AVG(probe_s) AS probe_s,
+               AVG(download_s) AS download_s,
+               AVG(convert_s) AS convert_s,
+               AVG(bytes_downloaded) AS avg_bytes_downloaded,
+               SUM(bytes_downloaded) / NULLIF(SUM(download_s), 0) AS download_bytes_per_s
+        FROM audio
+        WHERE status = 'done' AND stage_timings IS NOT NULL
+        GROUP BY {group_by}
+        ORDER BY COALESCE(probe_s, 0) + COALESCE(download_s, 0) + COALESCE(convert_s, 0) DESC
+        """
+    )
+    rows = []
+    for row in cur.fetchall():
+        data = dict(row)
+        data[group_by] = data.pop("grp")
+        rows.append(data)
+    return rows
+
+def _remove_mp3(row: sqlite3.Row) -> None:
+    mp3s = {AUDIO_DIR / f"{row['id']}.mp3"}
+    if row["filepath_mp3"]:
+        mp3s.add(Path(row["filepath_mp3"]))
+    for mp3 in mp3s:
+        for path in (mp3, waveform.path_for(mp3)):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                continue
+        hls.discard(mp3)
+
+
+def purge_expired(now: Optional[datetime] = None) -> int:
+    """Archive or delete finished jobs past retention and stale unfinished jobs.
+
+    Their MP3s go with them. Works through ``RETENTION_BATCH`` rows per
+    transaction and gives freed pages back after each batch. Returns the
+    number of jobs removed.
+    """
+    now = now or datetime.utcnow()
+    removed = 0
+    if RETENTION_DAYS:
+        removed += _purge(FINISHED_STATUSES, now - timedelta(days=RETENTION_DAYS))
+    if STALE_HOURS:
+        removed += _purge(ACTIVE_STATUSES, now - timedelta(hours=STALE_HOURS))
+        hls.purge_staging(AUDIO_DIR, STALE_HOURS * 60 * 60)
+    return removed
+
+
+def _purge(statuses: Tuple[str, ...], before: datetime) -> int:
+    cutoff = before.isoformat()
+    placeholders = ", ".join("?" for _ in statuses)
+    conn = _connection()
+    removed = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT * FROM audio WHERE created_at < ? AND status IN ({placeholders}) "
+            "ORDER BY created_at LIMIT ?",
+            (cutoff, *statuses, RETENTION_BATCH),
+        ).fetchall()
+        if not rows:
+            break
+        if ARCHIVE_PATH is not None:
+            ARCHIVE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with ARCHIVE_PATH.open("a", encoding="utf-8") as fh:
+                fh.writelines(json.dumps(dict(row), ensure_ascii=False) + "\n" for row in rows)
+        # Files go first: a row left behind by a crash is harmless, a file is not.
+        for row in rows:
+            _remove_mp3(row)
+        conn.executemany("DELETE FROM audio WHERE id=?", [(row["id"],) for row in rows])
+        conn.commit()
+        # ``execute`` would only step the pragma once, freeing a single page.
+        conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+        removed += len(rows)
+        if len(rows) < RETENTION_BATCH:
+            break
+    return removed
+
+def _retention_loop() -> None:
+    while True:
+        try:
+            purge_expired()
+        except Exception:  # pragma: no cover - keep retention running
+            pass
+        time.sleep(RETENTION_INTERVAL)
+
+def start_retention() -> None:
+    """Start the background thread applying the retention policy."""
+    global _retention_started
+    with _conn_lock:
+        if _retention_started or not (RETENTION_DAYS or STALE_HOURS):
+            return
+        _retention_started = True
+    threading.Thread(target=_retention_loop, name="audio-retention", daemon=True).start()
+
 # INSERT END: CRUD
 
 # INSERT START: startup
-init_db()
+# ``init_db`` and ``start_retention`` are called from the FastAPI lifespan of the
+# apps serving audio jobs.
 # INSERT END: startup
 
@@ -0,0 +1,154 @@
+"""Optional HLS rendition of each job, for instant start and seek.
+
+With ``HLS_CODEC`` set, each job also gets its audio cut into
+``HLS_SEGMENT_SECONDS`` MPEG-TS segments plus a VOD playlist, in a directory
+beside the MP3 (:func:`directory_for`). A player starts as soon as it has the
+playlist and the first segment, and a seek only fetches the segments around
+the new position, instead of the whole MP3.
+
+``aac`` segments are one more output of the transcoding ffmpeg, encoded from
+the same decode. ``mp3`` segments (:data:`COPY_FROM_MP3`) are cut from the
+finished MP3 without re-encoding, which costs a fraction of a second where
+encoding the audio a second time would add about half the transcoding time.
+
+ffmpeg writes into a staging directory (:func:`prepare`) that :func:`publish`
+renames once the job has succeeded, so a rendition that can be served is
+complete and never changes afterwards: it is served with
+:data:`CACHE_CONTROL`. Staging directories left behind by a crash are removed
+by :func:`purge_staging`.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .waveform import CACHE_CONTROL
+
+__all__ = [
+    "CACHE_CONTROL",
+    "COPY_FROM_MP3",
+    "ENABLED",
+    "HLS_CODEC",
+    "HLS_SEGMENT_SECONDS",
+    "PLAYLIST",
+    "directory_for",
+    "discard",
+    "file_for",
+    "media_type",
+    "output_args",
+    "output_options",
+    "prepare",
+    "publish",
+    "purge_staging",
+]
+
+HLS_CODEC = os.getenv("HLS_CODEC", "").strip().lower()
+if HLS_CODEC not in ("", "aac", "mp3"):
+    raise ValueError(f"HLS_CODEC must be 'aac', 'mp3' or empty, not {HLS_CODEC!r}")
+ENABLED = bool(HLS_CODEC)
+COPY_FROM_MP3 = HLS_CODEC == "mp3"
+HLS_SEGMENT_SECONDS = max(2, int(os.getenv("HLS_SEGMENT_SECONDS", "6")))
+
+PLAYLIST = "index.m3u8"
+_SEGMENT = re.compile(r"seg\d{5}\.ts")
+_AAC_BITRATE = "128k"
+_MEDIA_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".ts": "video/mp2t"}
+
+
+def directory_for(mp3_path: Path) -> Path:
+    """Where the HLS rendition of ``mp3_path`` is published."""
+    return mp3_path.with_suffix(".hls")
+
+
+def _staging(mp3_path: Path) -> Path:
+    directory = directory_for(mp3_path)
+    return directory.with_name(directory.name + ".tmp")
+
+
+def prepare(mp3_path: Path) -> Path:
+    """Create an empty staging directory for ``mp3_path`` and return its playlist path."""
+    staging = _staging(mp3_path)
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    return staging / PLAYLIST
+
+
+def output_options(playlist: Path) -> Dict[str, str]:
+    """ffmpeg options of the output writing ``playlist`` and its segments.
+
+    With :data:`COPY_FROM_MP3` the input must be the finished MP3, whose
+    frames are copied as they are; otherwise the audio is encoded to AAC.
+    """
+    if COPY_FROM_MP3:
+        options = {"c:a": "copy"}
+    else:
+        options = {"c:a": "aac", "b:a": _AAC_BITRATE, "ar": "44100", "ac": "2"}
+    options.update(
+        {
+            "f": "hls",
+            "hls_time": str(HLS_SEGMENT_SECONDS),
+            "hls_playlist_type": "vod",
+            "hls_segment_filename": str(playlist.with_name("seg%05d.ts")),
+        }
+    )
+    return options
+
+
+def output_args(playlist: Path) -> List[str]:
+    """The same output as command line arguments, mapping the first audio stream."""
+    args = ["-map", "0:a:0"]
+    for option, value in output_options(playlist).items():
+        args += [f"-{option}", value]
+    args.append(str(playlist))
+    return args
+
+
+def publish(mp3_path: Path) -> None:
+    """Make the staged rendition of ``mp3_path`` servable."""
+    directory = directory_for(mp3_path)
+    shutil.rmtree(directory, ignore_errors=True)
+    _staging(mp3_path).rename(directory)
+
+
+def discard(mp3_path: Path) -> None:
+    """Remove the rendition of ``mp3_path``, published or not."""
+    shutil.rmtree(_staging(mp3_path), ignore_errors=True)
+    shutil.rmtree(directory_for(mp3_path), ignore_errors=True)
+
+
+def purge_staging(directory: Path, older_than: float) -> int:
+    """Remove the staging directories under ``directory`` unchanged for ``older_than`` seconds.
+
+    Returns how many were removed.
+    """
+    cutoff = time.time() - older_than
+    removed = 0
+    for staging in directory.glob("**/*.hls.tmp"):
+        try:
+            if staging.is_dir() and staging.stat().st_mtime < cutoff:
+                shutil.rmtree(staging)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def file_for(mp3_path: Path, name: str) -> Optional[Path]:
+    """The published playlist or segment ``name`` of ``mp3_path``, if it exists.
+
+    Only the names ffmpeg writes are accepted, so ``name`` taken from a URL
+    cannot point outside the rendition.
+    """
+    if name != PLAYLIST and not _SEGMENT.fullmatch(name):
+        return None
+    path = directory_for(mp3_path) / name
+    return path if path.is_file() else None
+
+
+def media_type(name: str) -> str:
+    return _MEDIA_TYPES[Path(name).suffix]
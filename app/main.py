@@ -1,33 +1,55 @@
 from __future__ import annotations
 
 import os
+from contextlib import asynccontextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
-from fastapi import BackgroundTasks, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 
-from . import audio_pipeline
+from . import admission, audio_pipeline, budget_store, hls, metrics, profiler, waveform
+from .admin import require_admin
 from .budget_api import create_budget_router
-from .db import AUDIO_DIR, create_audio_job, get_audio_job
+from .db import (
+    AUDIO_DIR,
+    get_audio_job,
+    init_db,
+    list_audio_jobs,
+    stage_stats,
+    start_retention,
+)
+
+DATA_DIR = Path(os.getenv("DATA_DIR", str(AUDIO_DIR))).resolve()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    init_db()
+    start_retention()
+    audio_pipeline.start_idle_reaper()
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    budget_store.load()
+    yield
+    audio_pipeline.shutdown()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["https://spotifree-tan.vercel.app", "http://localhost:5173"],
-    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=["*"],
     expose_headers=["Content-Disposition"],
 )
 
 app.include_router(create_budget_router(), prefix="/api")
 
-DATA_DIR = Path(os.getenv("DATA_DIR", str(AUDIO_DIR))).resolve()
-DATA_DIR.mkdir(parents=True, exist_ok=True)
-
 
 class JobRequest(BaseModel):
     url: str
@@ -44,15 +66,62 @@ async def health() -> dict[str, bool]:
     return {"ok": True}
 
 
+@app.get("/metrics")
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/admin/stats/stages", dependencies=[Depends(require_admin)])
+async def stage_stats_endpoint(group_by: str = "extractor") -> Dict[str, Any]:
+    try:
+        return {"group_by": group_by, "groups": stage_stats(group_by)}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.get("/api/admin/jobs", dependencies=[Depends(require_admin)])
+async def list_jobs_endpoint(
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+) -> Dict[str, Any]:
+    try:
+        jobs, next_cursor = await run_in_threadpool(
+            list_audio_jobs, status=status, since=since, until=until, cursor=cursor, limit=limit
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"jobs": jobs, "next_cursor": next_cursor}
+
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_process(
+    seconds: float = Query(10.0, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    thread: Optional[str] = Query(None),
+) -> PlainTextResponse:
+    try:
+        stacks = await run_in_threadpool(profiler.sample_stacks, seconds, interval_ms / 1000, thread)
+    except profiler.ProfilerBusyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return PlainTextResponse(stacks, headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'})
+
+
 @app.post("/api/jobs")
-async def create_job(payload: JobRequest, background_tasks: BackgroundTasks) -> Dict[str, str]:
+async def create_job(payload: JobRequest) -> Dict[str, Any]:
     source_url = payload.url.strip()
     if not source_url:
         raise HTTPException(status_code=400, detail="URL is required")
 
-    job_id = create_audio_job(source_url)
-    background_tasks.add_task(audio_pipeline.process_audio_job, job_id)
-    return {"job_id": job_id}
+    try:
+        job_id, position = audio_pipeline.submit(source_url)
+    except admission.QueueFullError as exc:
+        raise HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        ) from exc
+    return {"job_id": job_id, "estimated_wait_s": round(audio_pipeline.estimated_wait(position), 1)}
 
 
 @app.get("/api/jobs/{job_id}")
@@ -60,6 +129,7 @@ async def job_status(job_id: str) -> Dict[str, Any]:
     job = get_audio_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    audio_pipeline.touch(job_id)
 
     download_ready = bool(job.get("filepath_mp3"))
 
@@ -72,9 +142,24 @@ async def job_status(job_id: str) -> Dict[str, Any]:
         "duration_s": job.get("duration_s"),
         "created_at": job.get("created_at").isoformat() if job.get("created_at") else None,
         "download_url": f"/api/download/{job_id}" if download_ready else None,
+        "timings": job.get("stage_timings"),
+        "bytes_downloaded": job.get("bytes_downloaded"),
+        "extractor": job.get("extractor"),
+        "source_format": job.get("source_format"),
+        "source_codec": job.get("source_codec"),
     }
 
 
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str) -> Dict[str, str]:
+    status = audio_pipeline.cancel_audio_job(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status != "cancelled":
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return {"job_id": job_id, "status": status}
+
+
 @app.get("/api/download/{job_id}")
 async def download(job_id: str):
     file_path = (DATA_DIR / f"{job_id}.mp3").resolve()
@@ -97,3 +182,45 @@ async def download(job_id: str):
         filename=file_path.name,
         headers={"Cache-Control": "no-store"},
     )
+
+
+@app.get("/api/jobs/{job_id}/waveform")
+async def job_waveform(job_id: str):
+    peaks_path = waveform.path_for(DATA_DIR / f"{job_id}.mp3")
+    if not peaks_path.is_file():
+        job = get_audio_job(job_id)
+        if job and job.get("filepath_mp3"):
+            peaks_path = waveform.path_for(Path(job["filepath_mp3"]))
+
+    if not peaks_path.is_file():
+        return JSONResponse(
+            status_code=404,
+            content={"error": {"code": "NOT_FOUND", "message": "Forme d'onde introuvable"}},
+        )
+
+    return FileResponse(
+        path=peaks_path,
+        media_type="application/json",
+        headers={"Cache-Control": waveform.CACHE_CONTROL},
+    )
+
+
+@app.get("/api/jobs/{job_id}/hls/{name}")
+async def job_hls(job_id: str, name: str):
+    file_path = hls.file_for(DATA_DIR / f"{job_id}.mp3", name)
+    if file_path is None:
+        job = get_audio_job(job_id)
+        if job and job.get("filepath_mp3"):
+            file_path = hls.file_for(Path(job["filepath_mp3"]), name)
+
+    if file_path is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": {"code": "NOT_FOUND", "message": "Flux HLS introuvable"}},
+        )
+
+    return FileResponse(
+        path=file_path,
+        media_type=hls.media_type(name),
+        headers={"Cache-Control": hls.CACHE_CONTROL},
+    )
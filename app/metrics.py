@@ -0,0 +1,225 @@
+"""Process-wide metrics exposed in the Prometheus text format.
+
+The registry is deliberately small: counters, gauges and histograms keyed by a
+fixed tuple of label values, each guarded by its own lock so that recording a
+sample on the hot path costs a dict lookup and an addition. Values that are
+cheap to read at scrape time (queue depths, worker counts) are registered as
+gauge callbacks instead of being updated on every change.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+__all__ = [
+    "CACHE_LOOKUPS",
+    "Counter",
+    "DOWNLOAD_BANDWIDTH",
+    "DOWNLOAD_CONCURRENCY",
+    "DOWNLOAD_CONNECTIONS",
+    "DURATION_BUCKETS",
+    "Gauge",
+    "Histogram",
+    "BYTES_DOWNLOADED",
+    "BYTES_WRITTEN",
+    "ENCODE_REALTIME_FACTOR",
+    "JOBS",
+    "REJECTIONS",
+    "STAGE_DURATION",
+    "THROTTLE_CONCURRENCY",
+    "THROTTLE_DELAY",
+    "WORKERS",
+    "WORKERS_BUSY",
+    "render",
+]
+
+LabelValues = Tuple[str, ...]
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+_registry: List["_Metric"] = []
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, values: LabelValues, extra: Iterable[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callbacks: List[Callable[[], Dict[LabelValues, float]]] = []
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def add_callback(self, callback: Callable[[], Dict[LabelValues, float]]) -> None:
+        """Register ``callback`` to supply label values at scrape time."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                values.update(callback())
+            except Exception:  # pragma: no cover - a broken collector must not break scraping
+                continue
+        return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            counts = {key: list(value) for key, value in self._counts.items()}
+            sums = dict(self._sums)
+        lines = []
+        for key, bucket_counts in counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), bucket_counts):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else _format_value(bound)
+                lines.append(f"{self.name}_bucket{self._format_labels(key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(sums[key])}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render() -> str:
+    """Return every registered metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in list(_registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+JOBS = Gauge("spotifree_jobs", "Jobs currently in each pipeline stage.", ("pool", "stage"))
+WORKERS = Gauge("spotifree_workers", "Worker threads in the pool.", ("pool",))
+WORKERS_BUSY = Gauge("spotifree_workers_busy", "Worker threads currently running a job.", ("pool",))
+STAGE_DURATION = Histogram(
+    "spotifree_stage_duration_seconds",
+    "Wall-clock time spent in each pipeline stage.",
+    ("pool", "stage"),
+)
+BYTES_DOWNLOADED = Counter("spotifree_downloaded_bytes_total", "Bytes fetched from media origins.", ("pool",))
+BYTES_WRITTEN = Counter("spotifree_written_bytes_total", "Bytes of finished audio written to disk.", ("pool",))
+ENCODE_REALTIME_FACTOR = Histogram(
+    "spotifree_encode_realtime_factor",
+    "Media seconds encoded per wall-clock second.",
+    ("pool",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+DOWNLOAD_BANDWIDTH = Gauge(
+    "spotifree_download_bandwidth_bytes",
+    "Download budget in bytes per second, in total and per active download.",
+    ("scope",),
+)
+DOWNLOAD_CONNECTIONS = Gauge(
+    "spotifree_download_connections", "Connections currently open to each media host.", ("host",)
+)
+DOWNLOAD_CONCURRENCY = Gauge(
+    "spotifree_download_concurrency", "Connections per job last learned for each media host.", ("host",)
+)
+THROTTLE_CONCURRENCY = Gauge(
+    "spotifree_throttle_concurrency", "Concurrent requests currently allowed per media domain.", ("domain",)
+)
+THROTTLE_DELAY = Gauge(
+    "spotifree_throttle_delay_seconds", "Minimum gap between requests to each media domain.", ("domain",)
+)
+CACHE_LOOKUPS = Counter("spotifree_cache_lookups_total", "Cache lookups by cache and result.", ("cache", "result"))
+REJECTIONS = Counter("spotifree_rejections_total", "Submissions rejected before queueing.", ("reason",))
@@ -0,0 +1,356 @@
+"""Parallel media downloads with adaptive concurrency.
+
+A throttled origin caps each connection, so a job fetching a single stream is
+only as fast as that cap. :func:`download` fetches the format chosen by
+``extract_info(download=False)`` over several connections instead:
+
+* Progressive ``http``/``https`` formats of known size are split into byte
+  ranges, which a few threads write straight into the target file. A job
+  starts at the number of connections last learned for the host. While it
+  runs, a connection is added as long as aggregate throughput keeps improving
+  by ``GAIN_THRESHOLD``, one is dropped when throughput falls, and the count is
+  halved when a range request fails.
+* Fragmented formats (DASH, HLS) are handed to a variant of the session's
+  yt-dlp instance with ``concurrent_fragment_downloads`` set to the level
+  learned for the host.
+
+Both modes draw from a process-wide budget of ``DOWNLOAD_CONNECTIONS_PER_HOST``
+connections per host, so workers together cannot open enough connections to
+get the host to throttle all of them. Formats that suit neither mode, and
+ranged downloads that fail, go through yt-dlp's own downloader. Every
+download holds a :func:`app.bandwidth.share` and is throttled to it.
+
+``ydl`` must come from :func:`app.ydl_pool.session`.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from . import bandwidth, metrics, ydl_pool
+
+if TYPE_CHECKING:  # pragma: no cover - yt_dlp is imported on first use
+    from yt_dlp import YoutubeDL
+
+__all__ = [
+    "CHUNK_SIZE",
+    "CONNECTIONS_PER_HOST",
+    "CONNECTIONS_PER_JOB",
+    "GAIN_THRESHOLD",
+    "PARALLEL_DOWNLOADS",
+    "download",
+]
+
+PARALLEL_DOWNLOADS = os.getenv("PARALLEL_DOWNLOADS", "1") != "0"
+CONNECTIONS_PER_JOB = max(1, int(os.getenv("DOWNLOAD_CONNECTIONS_PER_JOB", "6")))
+CONNECTIONS_PER_HOST = max(1, int(os.getenv("DOWNLOAD_CONNECTIONS_PER_HOST", "8")))
+CHUNK_SIZE = max(256 * 1024, int(float(os.getenv("DOWNLOAD_CHUNK_MB", "1")) * 1024 * 1024))
+GAIN_THRESHOLD = 1.1
+
+_INITIAL_CONNECTIONS = 2
+_SAMPLE_INTERVAL = 0.5
+_CHUNK_ATTEMPTS = 5
+_READ_SIZE = 64 * 1024
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+_FRAGMENTED_PROTOCOLS = {"http_dash_segments", "m3u8", "m3u8_native", "ism", "f4m"}
+
+ProgressHook = Callable[[Dict[str, Any]], None]
+
+
+class _RangedDownloadError(Exception):
+    """Raised when a format cannot be fetched in byte ranges."""
+
+
+class _Hosts:
+    """Connections in use and learned concurrency level, per host."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._cond = threading.Condition()
+        self._in_use: Dict[str, int] = {}
+        self._levels: Dict[str, int] = {}
+
+    def acquire(self, host: str, count: int = 1, timeout: Optional[float] = None) -> int:
+        """Take up to ``count`` connections to ``host``, waiting for at least one.
+
+        Returns the number granted, or 0 if none freed up within ``timeout``.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._in_use.get(host, 0) < self.limit, timeout):
+                return 0
+            in_use = self._in_use.get(host, 0)
+            granted = min(count, self.limit - in_use)
+            self._in_use[host] = in_use + granted
+            return granted
+
+    def release(self, host: str, count: int = 1) -> None:
+        with self._cond:
+            remaining = self._in_use.get(host, 0) - count
+            if remaining > 0:
+                self._in_use[host] = remaining
+            else:
+                self._in_use.pop(host, None)
+            self._cond.notify_all()
+
+    def level(self, host: str) -> int:
+        with self._cond:
+            return self._levels.get(host, _INITIAL_CONNECTIONS)
+
+    def learn(self, host: str, level: int) -> None:
+        with self._cond:
+            self._levels[host] = max(1, min(CONNECTIONS_PER_JOB, level))
+
+    def snapshot(self) -> Tuple[Dict[Tuple[str, ...], float], Dict[Tuple[str, ...], float]]:
+        with self._cond:
+            in_use = {(host,): float(count) for host, count in self._in_use.items()}
+            levels = {(host,): float(level) for host, level in self._levels.items()}
+        return in_use, levels
+
+
+_hosts = _Hosts(CONNECTIONS_PER_HOST)
+
+
+class _RangedDownload:
+    """Fetch ``total`` bytes of ``url`` into ``path`` over adaptive parallel ranges."""
+
+    def __init__(self, ydl: "YoutubeDL", url: str, headers: Dict[str, str], total: int,
+                 path: Path, host: str, chunk_size: int, share: bandwidth.Share) -> None:
+        self._ydl = ydl
+        self._share = share
+        self._url = url
+        self._headers = headers
+        self._total = total
+        self._path = path
+        self._host = host
+        self._pending: Deque[Tuple[int, int, int]] = deque(
+            (start, min(start + chunk_size, total) - 1, 0) for start in range(0, total, chunk_size)
+        )
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._downloaded = 0
+        self._errors = 0
+        self._failure: Optional[BaseException] = None
+        self._workers = 0
+        self._threads: List[threading.Thread] = []
+        self._fd = -1
+        self.target = min(_hosts.level(host), CONNECTIONS_PER_JOB, len(self._pending))
+
+    def run(self, progress_hook: Optional[ProgressHook]) -> None:
+        self._fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(self._fd, self._total)
+            self._coordinate(progress_hook)
+        finally:
+            self._stop.set()
+            for thread in self._threads:
+                thread.join()
+            os.close(self._fd)
+
+    def _coordinate(self, progress_hook: Optional[ProgressHook]) -> None:
+        baseline: Optional[float] = None
+        seen_errors = 0
+        last_bytes = 0
+        last_time = time.monotonic()
+        self._spawn()
+        while True:
+            self._wake.wait(_SAMPLE_INTERVAL)
+            now = time.monotonic()
+            with self._lock:
+                downloaded, errors, failure = self._downloaded, self._errors, self._failure
+            if failure is not None:
+                raise _RangedDownloadError(str(failure)) from failure
+            rate = (downloaded - last_bytes) / max(now - last_time, 1e-6)
+            last_bytes, last_time = downloaded, now
+            if progress_hook is not None:
+                progress_hook({
+                    "status": "downloading",
+                    "downloaded_bytes": downloaded,
+                    "total_bytes": self._total,
+                    "filename": str(self._path),
+                    "speed": rate,
+                })
+            if downloaded >= self._total:
+                return
+
+            with self._lock:
+                if errors > seen_errors:
+                    self.target = max(1, self.target // 2)
+                    baseline = None
+                elif baseline is None or rate > baseline * GAIN_THRESHOLD:
+                    baseline = rate
+                    self.target = min(self.target + 1, CONNECTIONS_PER_JOB)
+                elif rate * GAIN_THRESHOLD < baseline and self.target > 1:
+                    self.target -= 1
+                    baseline = rate
+            seen_errors = errors
+            self._spawn()
+
+    def _spawn(self) -> None:
+        with self._lock:
+            wanted = min(self.target, self._workers + len(self._pending)) - self._workers
+            self._workers += max(0, wanted)
+        for _ in range(wanted):
+            thread = threading.Thread(target=self._worker, name="ranged-download", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                if self._workers > self.target or not self._pending:
+                    self._workers -= 1
+                    return
+                start, end, attempts = self._pending.popleft()
+            if not _hosts.acquire(self._host, timeout=_SAMPLE_INTERVAL):
+                with self._lock:
+                    self._pending.appendleft((start, end, attempts))
+                continue
+            position = start
+            try:
+                for position in self._fetch(start, end):
+                    pass
+            except Exception as exc:
+                with self._lock:
+                    self._errors += 1
+                    if isinstance(exc, _RangedDownloadError) or attempts + 1 >= _CHUNK_ATTEMPTS:
+                        self._failure = exc
+                        self._stop.set()
+                        self._wake.set()
+                    else:
+                        self._pending.appendleft((position, end, attempts + 1))
+            finally:
+                _hosts.release(self._host)
+        with self._lock:
+            self._workers -= 1
+
+    def _fetch(self, start: int, end: int) -> Iterator[int]:
+        """Write bytes ``start``-``end`` to the file, yielding the next offset after each write."""
+        from yt_dlp.networking import Request
+
+        request = Request(self._url, headers={**self._headers, "Range": f"bytes={start}-{end}"})
+        with self._ydl.urlopen(request) as response:
+            if response.status != 206:
+                raise _RangedDownloadError(f"HTTP {response.status} in reply to a range request")
+            match = _CONTENT_RANGE.fullmatch(response.headers.get("Content-Range", ""))
+            if not match or int(match[1]) != start or match[3] not in ("*", str(self._total)):
+                raise _RangedDownloadError("Unexpected Content-Range in reply to a range request")
+            position = start
+            while position <= end and not self._stop.is_set():
+                data = response.read(min(_READ_SIZE, end - position + 1))
+                if not data:
+                    raise ConnectionError(f"Range {start}-{end} ended early at byte {position}")
+                os.pwrite(self._fd, data, position)
+                position += len(data)
+                with self._lock:
+                    self._downloaded += len(data)
+                    if self._downloaded >= self._total:
+                        self._wake.set()
+                self._share.consume(len(data))
+                yield position
+
+
+def _ranged_size(info: Dict[str, Any]) -> Optional[int]:
+    """Return the size of ``info``'s format if it can be fetched in ranges."""
+    if info.get("requested_formats") or info.get("protocol") not in ("http", "https"):
+        return None
+    size = info.get("filesize")
+    if not size or size < 2 * _chunk_size(info):
+        return None
+    return int(size)
+
+
+def _chunk_size(info: Dict[str, Any]) -> int:
+    # Some extractors (YouTube) cap the range an origin serves at full speed.
+    limit = (info.get("downloader_options") or {}).get("http_chunk_size")
+    return min(CHUNK_SIZE, limit) if limit else CHUNK_SIZE
+
+
+@contextmanager
+def _host_connections(ydl: "YoutubeDL", host: Optional[str], fragmented: bool) -> Iterator["YoutubeDL"]:
+    """Yield the instance to run a yt-dlp download on, within the connection budget of ``host``.
+
+    Fragmented downloads get the host's learned level of connections, on a
+    variant of ``ydl`` with that ``concurrent_fragment_downloads``; the level
+    goes up by one after a clean download and is halved after a failed one.
+    """
+    from yt_dlp.utils import DownloadError
+
+    if not PARALLEL_DOWNLOADS or host is None:
+        yield ydl
+        return
+    granted = _hosts.acquire(host, _hosts.level(host) if fragmented else 1)
+    try:
+        if fragmented:
+            with ydl_pool.with_options(ydl, concurrent_fragment_downloads=granted) as tuned:
+                yield tuned
+        else:
+            yield ydl
+    except DownloadError:
+        if fragmented:
+            _hosts.learn(host, granted // 2)
+        raise
+    else:
+        if fragmented:
+            _hosts.learn(host, granted + 1)
+    finally:
+        _hosts.release(host, granted)
+
+
+def download(ydl: "YoutubeDL", info: Dict[str, Any], progress_hook: Optional[ProgressHook] = None) -> Dict[str, Any]:
+    """Download the format selected in ``info`` and return the updated info.
+
+    ``info`` comes from ``ydl.extract_info(url, download=False)``. The file is
+    written to ``ydl.prepare_filename(info)`` and ``progress_hook`` receives the
+    same ``downloading`` and ``finished`` events yt-dlp sends its own hooks.
+    """
+    with bandwidth.share() as share:
+        return _download(ydl, info, progress_hook, share)
+
+
+def _download(ydl: "YoutubeDL", info: Dict[str, Any], progress_hook: Optional[ProgressHook],
+              share: bandwidth.Share) -> Dict[str, Any]:
+    url = info.get("url")
+    host = urlparse(url).hostname if url else None
+    total = _ranged_size(info) if PARALLEL_DOWNLOADS and host else None
+    if total is not None:
+        path = Path(ydl.prepare_filename(info))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        ranged = _RangedDownload(
+            ydl, url, dict(info.get("http_headers") or {}), total, path, host, _chunk_size(info), share
+        )
+        try:
+            ranged.run(progress_hook)
+        except _RangedDownloadError:
+            path.unlink(missing_ok=True)
+            _hosts.learn(host, ranged.target // 2)
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        else:
+            _hosts.learn(host, ranged.target)
+            if progress_hook is not None:
+                progress_hook({
+                    "status": "finished",
+                    "downloaded_bytes": total,
+                    "total_bytes": total,
+                    "filename": str(path),
+                })
+            info["filepath"] = info["_filename"] = str(path)
+            return info
+
+    with ydl_pool.progress_hook(ydl, share.progress_hook):
+        with _host_connections(ydl, host, info.get("protocol") in _FRAGMENTED_PROTOCOLS) as downloader:
+            return downloader.process_ie_result(info, download=True)
+
+
+metrics.DOWNLOAD_CONNECTIONS.add_callback(lambda: _hosts.snapshot()[0])
+metrics.DOWNLOAD_CONCURRENCY.add_callback(lambda: _hosts.snapshot()[1])
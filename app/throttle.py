@@ -0,0 +1,195 @@
+"""Per-domain AIMD limiter for requests to media sites.
+
+Origins signal overload with HTTP 429 or 403 ("Sign in to confirm you're not a
+bot"). Retrying blindly at full concurrency only earns more of them. Work
+against a site therefore runs inside :func:`slot`, which holds a concurrency
+limit and a minimum gap between request starts for the URL's domain, shared by
+every worker in the process:
+
+* on a throttling signal the limit is halved and the gap doubled, starting at
+  one second, up to ``THROTTLE_MAX_DELAY``;
+* on success the limit grows by ``1 / limit`` (about one slot per window of
+  requests) and the gap shrinks by ``_DELAY_STEP``.
+
+:func:`call` retries a function only while it is throttled, waiting out the
+domain's gap between attempts. Levels are exported as
+``spotifree_throttle_concurrency`` and ``spotifree_throttle_delay_seconds``.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+from . import metrics
+
+__all__ = [
+    "THROTTLE_ATTEMPTS",
+    "THROTTLE_INITIAL_CONCURRENCY",
+    "THROTTLE_MAX_CONCURRENCY",
+    "THROTTLE_MAX_DELAY",
+    "ThrottledError",
+    "call",
+    "domain_of",
+    "is_throttled",
+    "retry_sleep",
+    "slot",
+]
+
+THROTTLE_INITIAL_CONCURRENCY = max(1.0, float(os.getenv("THROTTLE_INITIAL_CONCURRENCY", "4")))
+THROTTLE_MAX_CONCURRENCY = max(THROTTLE_INITIAL_CONCURRENCY, float(os.getenv("THROTTLE_MAX_CONCURRENCY", "16")))
+THROTTLE_MAX_DELAY = max(1.0, float(os.getenv("THROTTLE_MAX_DELAY", "30")))
+THROTTLE_ATTEMPTS = max(1, int(os.getenv("THROTTLE_ATTEMPTS", "3")))
+
+_BASE_DELAY = 1.0
+_DELAY_STEP = 0.5
+_POLL_INTERVAL = 0.5
+_THROTTLE_STATUSES = frozenset({403, 429})
+_THROTTLE_MARKERS = ("http error 429", "http error 403", "too many requests", "not a bot")
+_HOST_PREFIXES = ("www.", "m.", "music.")
+
+T = TypeVar("T")
+
+
+class ThrottledError(Exception):
+    """Raised when a domain keeps throttling us or its queue cannot be joined in time."""
+
+    def __init__(self, domain: str, retry_after: float) -> None:
+        super().__init__(f"{domain} is throttling requests, retry in {retry_after:.0f}s")
+        self.domain = domain
+        self.retry_after = retry_after
+
+
+class _Domain:
+    def __init__(self) -> None:
+        self.limit = THROTTLE_INITIAL_CONCURRENCY
+        self.delay = 0.0
+        self.in_flight = 0
+        self.next_start = 0.0
+
+
+_cond = threading.Condition()
+_domains: Dict[str, _Domain] = {}
+
+
+def domain_of(url: str) -> str:
+    host = (urlparse(url).hostname or "").lower()
+    for prefix in _HOST_PREFIXES:
+        if host.startswith(prefix):
+            return host[len(prefix):]
+    return host
+
+
+def is_throttled(exc: BaseException) -> bool:
+    """Return whether ``exc`` or an error it wraps is an origin throttling us."""
+    seen = set()
+    pending = [exc]
+    while pending:
+        error = pending.pop()
+        if error is None or id(error) in seen:
+            continue
+        seen.add(id(error))
+        status = getattr(error, "status", None)
+        if status in _THROTTLE_STATUSES:
+            return True
+        if any(marker in str(error).lower() for marker in _THROTTLE_MARKERS):
+            return True
+        # yt-dlp's DownloadError keeps the original error in exc_info.
+        wrapped = getattr(error, "exc_info", None)
+        pending.extend([error.__cause__, error.__context__, wrapped[1] if wrapped else None])
+    return False
+
+
+def retry_sleep(n: int) -> float:
+    """Exponential back-off for yt-dlp's ``retry_sleep_functions``."""
+    return min(THROTTLE_MAX_DELAY, _BASE_DELAY * 2 ** n)
+
+
+def _acquire(domain: str, max_wait: Optional[float], check: Optional[Callable[[], None]]) -> _Domain:
+    deadline = None if max_wait is None else time.monotonic() + max_wait
+    while True:
+        with _cond:
+            state = _domains.setdefault(domain, _Domain())
+            now = time.monotonic()
+            if state.in_flight < int(state.limit) and now >= state.next_start:
+                state.in_flight += 1
+                state.next_start = now + state.delay
+                return state
+            if deadline is not None and now >= deadline:
+                raise ThrottledError(domain, max(state.next_start - now, state.delay, _BASE_DELAY))
+            wait = state.next_start - now if now < state.next_start else _POLL_INTERVAL
+            _cond.wait(min(wait, _POLL_INTERVAL))
+        if check is not None:
+            check()
+
+
+@contextmanager
+def slot(url: str, *, max_wait: Optional[float] = None,
+         check: Optional[Callable[[], None]] = None) -> Iterator[None]:
+    """Run the block as one request to ``url``'s domain.
+
+    Waits for the domain's concurrency limit and request gap, at most
+    ``max_wait`` seconds (then :class:`ThrottledError`), calling ``check`` while
+    waiting so callers can abort. The block's outcome adjusts the domain.
+    """
+    domain = domain_of(url)
+    state = _acquire(domain, max_wait, check)
+    succeeded = throttled = False
+    try:
+        yield
+        succeeded = True
+    except Exception as exc:
+        throttled = is_throttled(exc)
+        raise
+    finally:
+        with _cond:
+            state.in_flight -= 1
+            if throttled:
+                state.limit = max(1.0, state.limit / 2)
+                state.delay = min(THROTTLE_MAX_DELAY, max(_BASE_DELAY, state.delay * 2))
+                state.next_start = max(state.next_start, time.monotonic() + state.delay)
+            elif succeeded:
+                state.limit = min(THROTTLE_MAX_CONCURRENCY, state.limit + 1 / state.limit)
+                state.delay = max(0.0, state.delay - _DELAY_STEP)
+            _cond.notify_all()
+
+
+def call(url: str, func: Callable[[], T], *, attempts: Optional[int] = None,
+         max_wait: Optional[float] = None, check: Optional[Callable[[], None]] = None) -> T:
+    """Call ``func`` in a :func:`slot` for ``url``, retrying while it is throttled.
+
+    Raises :class:`ThrottledError` once ``attempts`` (default
+    ``THROTTLE_ATTEMPTS``) throttled calls have failed.
+    """
+    attempts = attempts or THROTTLE_ATTEMPTS
+    attempt = 1
+    while True:
+        try:
+            with slot(url, max_wait=max_wait, check=check):
+                return func()
+        except Exception as exc:
+            if not is_throttled(exc):
+                raise
+            if attempt >= attempts:
+                domain = domain_of(url)
+                with _cond:
+                    delay = _domains[domain].delay
+                raise ThrottledError(domain, delay) from exc
+        attempt += 1
+
+
+def _levels() -> Tuple[Dict[Tuple[str, ...], float], Dict[Tuple[str, ...], float]]:
+    with _cond:
+        items = list(_domains.items())
+    return (
+        {(domain,): state.limit for domain, state in items},
+        {(domain,): state.delay for domain, state in items},
+    )
+
+
+metrics.THROTTLE_CONCURRENCY.add_callback(lambda: _levels()[0])
+metrics.THROTTLE_DELAY.add_callback(lambda: _levels()[1])
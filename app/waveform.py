@@ -0,0 +1,138 @@
+"""Waveform peaks computed while a job is transcoded.
+
+Players draw a waveform and scrub previews from a few thousand min/max pairs
+instead of decoding the whole MP3 in the browser. The transcoding ffmpeg gets
+a second output, :data:`PCM_OUTPUT_ARGS`: the same decoded audio as mono
+16-bit PCM on stdout. :func:`drain` streams it through :class:`Peaks`, which
+reduces every ``_BLOCK`` samples to their minimum and maximum with NumPy as
+they arrive, so memory stays small whatever the duration. :meth:`Peaks.result`
+then merges those blocks down to at most ``WAVEFORM_PEAKS`` pairs.
+
+Peaks are stored beside the MP3 (:func:`path_for`) in the JSON format of
+BBC's audiowaveform, which waveform libraries such as peaks.js read directly.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List
+
+__all__ = [
+    "CACHE_CONTROL",
+    "PCM_OUTPUT_ARGS",
+    "Peaks",
+    "SAMPLE_RATE",
+    "WAVEFORM_PEAKS",
+    "drain",
+    "path_for",
+    "write",
+]
+
+WAVEFORM_PEAKS = max(100, int(os.getenv("WAVEFORM_PEAKS", "2000")))
+SAMPLE_RATE = 11025
+# A job's peaks never change once written, and job ids are never reused.
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+PCM_OUTPUT_ARGS = ["-map", "0:a:0", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "s16le", "pipe:1"]
+
+_BLOCK = 64
+_READ_SIZE = 1 << 16
+_STDERR_LIMIT = 64 * 1024
+
+
+def path_for(mp3_path: Path) -> Path:
+    """Where the peaks of ``mp3_path`` are stored."""
+    return mp3_path.with_suffix(".peaks.json")
+
+
+class Peaks:
+    """Min/max reduction of a stream of 16-bit little-endian mono samples."""
+
+    def __init__(self) -> None:
+        self._mins: List[Any] = []
+        self._maxs: List[Any] = []
+        self._pending = b""
+
+    def feed(self, data: bytes) -> None:
+        import numpy as np
+
+        data = self._pending + data
+        usable = len(data) - len(data) % (2 * _BLOCK)
+        self._pending = data[usable:]
+        if usable:
+            blocks = np.frombuffer(data, dtype="<i2", count=usable // 2).reshape(-1, _BLOCK)
+            self._mins.append(blocks.min(axis=1))
+            self._maxs.append(blocks.max(axis=1))
+
+    def result(self) -> Dict[str, Any]:
+        """Return at most ``WAVEFORM_PEAKS`` pairs, scaled to 8 bits."""
+        import numpy as np
+
+        if len(self._pending) >= 2:
+            # The final, partial block.
+            tail = np.frombuffer(self._pending, dtype="<i2", count=len(self._pending) // 2)
+            self._mins.append(tail.min(keepdims=True))
+            self._maxs.append(tail.max(keepdims=True))
+            self._pending = b""
+        mins = np.concatenate(self._mins) if self._mins else np.zeros(0, dtype="<i2")
+        maxs = np.concatenate(self._maxs) if self._maxs else np.zeros(0, dtype="<i2")
+        per_peak = max(1, -(-mins.size // WAVEFORM_PEAKS))
+        if mins.size:
+            starts = np.arange(0, mins.size, per_peak)
+            mins = np.minimum.reduceat(mins, starts)
+            maxs = np.maximum.reduceat(maxs, starts)
+        pairs = np.empty(mins.size * 2, dtype=np.int8)
+        pairs[0::2] = mins >> 8
+        pairs[1::2] = maxs >> 8
+        return {
+            "version": 2,
+            "channels": 1,
+            "sample_rate": SAMPLE_RATE,
+            "samples_per_pixel": per_peak * _BLOCK,
+            "bits": 8,
+            "length": int(mins.size),
+            "data": pairs.tolist(),
+        }
+
+
+def drain(process: subprocess.Popen, peaks: Peaks) -> bytes:
+    """Feed ``process``'s stdout to ``peaks`` until it exits.
+
+    Stderr is read on a helper thread so neither pipe can fill up and stall
+    ffmpeg; its last 64 KiB are returned for error reporting.
+    """
+    stderr: Deque[bytes] = deque()
+
+    def read_stderr() -> None:
+        size = 0
+        for line in process.stderr:
+            stderr.append(line)
+            size += len(line)
+            while size > _STDERR_LIMIT and len(stderr) > 1:
+                size -= len(stderr.popleft())
+
+    reader = threading.Thread(target=read_stderr, name="ffmpeg-stderr", daemon=True)
+    reader.start()
+    try:
+        while True:
+            chunk = process.stdout.read(_READ_SIZE)
+            if not chunk:
+                break
+            peaks.feed(chunk)
+    finally:
+        process.stdout.close()
+        process.wait()
+        reader.join()
+        process.stderr.close()
+    return b"".join(stderr)
+
+
+def write(path: Path, peaks: Peaks) -> None:
+    """Atomically store the result of ``peaks`` at ``path``."""
+    temp_path = path.with_name(path.name + ".tmp")
+    temp_path.write_text(json.dumps(peaks.result(), separators=(",", ":")), encoding="utf-8")
+    temp_path.replace(path)
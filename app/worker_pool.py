@@ -0,0 +1,113 @@
+"""Dedicated worker pool for the audio pipeline.
+
+Jobs are queued here rather than handed to Starlette background tasks, which
+share the request threadpool. At most ``size`` pipelines, and therefore ffmpeg
+processes, run at once, and a burst of submissions waits in the queue instead
+of competing with sync route handlers. The queue holds at most ``max_depth``
+jobs.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+__all__ = ["WorkerPool"]
+
+
+class WorkerPool:
+    """Run ``target(job_id)`` for queued job ids on a fixed set of threads."""
+
+    def __init__(self, target: Callable[[str], None], size: int, name: str = "audio-worker",
+                 max_depth: Optional[int] = None) -> None:
+        self._target = target
+        self._size = max(1, size)
+        self._name = name
+        self._max_depth = max_depth
+        self._queue: Deque[str] = deque()
+        self._ready = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._busy = 0
+        self._closed = False
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    @property
+    def busy(self) -> int:
+        with self._ready:
+            return self._busy
+
+    def depth(self) -> int:
+        with self._ready:
+            return len(self._queue)
+
+    def submit(self, job_id: str) -> int:
+        """Queue ``job_id`` and return the number of jobs ahead of it.
+
+        Raises :class:`queue.Full` when ``max_depth`` jobs are already waiting
+        and :class:`RuntimeError` once the pool has been shut down.
+        """
+        with self._ready:
+            if self._closed:
+                raise RuntimeError("worker pool is shut down")
+            if self._max_depth is not None and len(self._queue) >= self._max_depth:
+                raise queue.Full
+            if not self._threads:
+                self._start()
+            position = len(self._queue)
+            self._queue.append(job_id)
+            self._ready.notify()
+        return position
+
+    def remove(self, job_id: str) -> bool:
+        """Drop ``job_id`` from the queue, returning whether it was still queued."""
+        with self._ready:
+            try:
+                self._queue.remove(job_id)
+            except ValueError:
+                return False
+            return True
+
+    def shutdown(self, wait: bool = True) -> List[str]:
+        """Stop the workers once their current job is done.
+
+        Jobs still queued are not run; their ids are returned. With ``wait``,
+        block until the workers have exited.
+        """
+        with self._ready:
+            self._closed = True
+            dropped = list(self._queue)
+            self._queue.clear()
+            self._ready.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+        return dropped
+
+    def _start(self) -> None:
+        for index in range(self._size):
+            thread = threading.Thread(target=self._run, name=f"{self._name}-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self) -> None:
+        while True:
+            with self._ready:
+                while not self._queue and not self._closed:
+                    self._ready.wait()
+                if self._closed:
+                    return
+                job_id = self._queue.popleft()
+                self._busy += 1
+            try:
+                self._target(job_id)
+            except Exception:  # pragma: no cover - the target records its own errors
+                pass
+            finally:
+                with self._ready:
+                    self._busy -= 1
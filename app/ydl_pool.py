@@ -0,0 +1,251 @@
+"""Warm, reusable ``YoutubeDL`` sessions.
+
+Building a ``YoutubeDL`` per call throws away its HTTP connection pool, cookies
+and extractor state, including the player JavaScript and signature functions
+that the YouTube extractor caches on its instance. :func:`session` instead
+hands out an idle instance built from the same options. Instances are not
+thread safe, so an instance serves one call at a time. After ``YDL_MAX_USES``
+calls, or after any call that raised, an instance is closed and replaced,
+which bounds the memory held by its caches; at most ``YDL_MAX_INSTANCES`` are
+kept warm, the least recently used being closed first. Sessions can share an
+on-disk cache directory through ``YTDLP_CACHE_DIR``.
+
+An instance is never reconfigured between calls: its options, output template
+and progress hook are set when it is built. It downloads into a directory of
+its own and forwards progress to the hooks of the call it is serving, to which
+:func:`progress_hook` adds. A call needing other options for part of its work
+leases a variant instance with :func:`with_options`.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+from . import metrics
+
+if TYPE_CHECKING:  # pragma: no cover - yt_dlp is imported on first use
+    from yt_dlp import YoutubeDL
+
+__all__ = ["YDL_CACHE_DIR", "YDL_MAX_INSTANCES", "YDL_MAX_USES", "progress_hook", "session", "with_options"]
+
+YDL_MAX_USES = max(1, int(os.getenv("YDL_MAX_USES", "50")))
+YDL_MAX_INSTANCES = max(1, int(os.getenv("YDL_MAX_INSTANCES", "8")))
+YDL_CACHE_DIR = os.getenv("YTDLP_CACHE_DIR")
+
+ProgressHook = Callable[[Dict[str, Any]], None]
+
+_lock = threading.Lock()
+# Instances not serving a call, least recently used first.
+_idle: "OrderedDict[int, _Session]" = OrderedDict()
+# Instances serving a call, by id of their YoutubeDL.
+_leased: Dict[int, "_Session"] = {}
+_live = 0
+
+
+class _Session:
+    def __init__(self, key: str, params: Dict[str, Any], filename: Optional[str]) -> None:
+        from yt_dlp import YoutubeDL
+
+        self.key = key
+        self.params = dict(params)
+        self.filename = filename
+        self.uses = 0
+        self.hooks: List[ProgressHook] = []
+        # The session whose call a variant instance is serving.
+        self.parent: Optional[_Session] = None
+        self.directory: Optional[Path] = None
+        options = dict(params)
+        if YDL_CACHE_DIR:
+            options.setdefault("cachedir", YDL_CACHE_DIR)
+        if filename is not None:
+            self.directory = Path(tempfile.mkdtemp(prefix="ydl-"))
+            options["outtmpl"] = str(self.directory / filename)
+        options["progress_hooks"] = [self._progress]
+        self.ydl = YoutubeDL(options)
+
+    def _progress(self, status: Dict[str, Any]) -> None:
+        for hook in tuple((self.parent or self).hooks):
+            hook(status)
+
+    def hand_over(self, target: Path) -> None:
+        """Move the files downloaded during the call into ``target``."""
+        if self.directory is None:
+            return
+        target.mkdir(parents=True, exist_ok=True)
+        for entry in self.directory.iterdir():
+            shutil.move(str(entry), str(target / entry.name))
+
+    def close(self) -> None:
+        try:
+            self.ydl.close()
+        except Exception:  # pragma: no cover - closing must never mask the caller's error
+            pass
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _key(params: Dict[str, Any], filename: Optional[str]) -> str:
+    return repr((sorted(params.items()), filename))
+
+
+def _take(key: str) -> Optional[_Session]:
+    with _lock:
+        for ident, idle in reversed(_idle.items()):
+            if idle.key == key:
+                del _idle[ident]
+                return idle
+    return None
+
+
+def _over_capacity() -> List[_Session]:
+    """Remove idle instances beyond ``YDL_MAX_INSTANCES``; the caller closes them."""
+    global _live
+    evicted = []
+    while _live > YDL_MAX_INSTANCES and _idle:
+        evicted.append(_idle.popitem(last=False)[1])
+        _live -= 1
+    return evicted
+
+
+def _create(key: str, params: Dict[str, Any], filename: Optional[str]) -> _Session:
+    global _live
+    created = _Session(key, params, filename)
+    with _lock:
+        _live += 1
+        evicted = _over_capacity()
+    for stale in evicted:
+        stale.close()
+    return created
+
+
+def _retire(current: _Session) -> None:
+    global _live
+    current.close()
+    with _lock:
+        _live -= 1
+
+
+def _lease(key: str, params: Dict[str, Any], filename: Optional[str]) -> _Session:
+    current = _take(key)
+    if current is None:
+        current = _create(key, params, filename)
+        metrics.CACHE_LOOKUPS.inc(cache="ydl_session", result="miss")
+    else:
+        metrics.CACHE_LOOKUPS.inc(cache="ydl_session", result="hit")
+    with _lock:
+        _leased[id(current.ydl)] = current
+    return current
+
+
+def _leased_session(ydl: "YoutubeDL") -> _Session:
+    with _lock:
+        current = _leased.get(id(ydl))
+    if current is None:
+        raise ValueError("not a YoutubeDL leased from ydl_pool.session")
+    return current
+
+
+def _end_lease(current: _Session) -> None:
+    with _lock:
+        _leased.pop(id(current.ydl), None)
+    current.hooks = []
+    current.parent = None
+
+
+def _release(current: _Session) -> None:
+    if current.uses >= YDL_MAX_USES:
+        _retire(current)
+        return
+    with _lock:
+        _idle[id(current)] = current
+        evicted = _over_capacity()
+    for stale in evicted:
+        stale.close()
+
+
+@atexit.register
+def _close_all() -> None:
+    """Close every instance at exit, removing their download directories."""
+    with _lock:
+        sessions = list(_idle.values()) + list(_leased.values())
+        _idle.clear()
+    for current in sessions:
+        current.close()
+
+
+@contextmanager
+def _serving(current: _Session, target: Optional[Path]) -> Iterator["YoutubeDL"]:
+    """Lend ``current`` for one call, then hand its downloads over to ``target``."""
+    try:
+        yield current.ydl
+        if target is not None:
+            current.hand_over(target)
+    except BaseException:
+        _end_lease(current)
+        _retire(current)
+        raise
+    _end_lease(current)
+    current.uses += 1
+    _release(current)
+
+
+@contextmanager
+def session(
+    params: Dict[str, Any],
+    *,
+    outtmpl: Optional[str] = None,
+    progress_hook: Optional[ProgressHook] = None,
+) -> Iterator["YoutubeDL"]:
+    """Yield a warm ``YoutubeDL`` built from ``params`` for the duration of one call.
+
+    Calls share an instance when their ``params`` and the file name part of
+    ``outtmpl`` are equal. Inside the block, downloads are written to the
+    instance's own directory, which is also where the paths reported to
+    ``progress_hook`` point; when the block exits without an error they are
+    moved, under the same names, to the directory part of ``outtmpl``, which
+    must be a literal path.
+    """
+    target: Optional[Path] = None
+    filename: Optional[str] = None
+    if outtmpl is not None:
+        target, filename = Path(os.path.dirname(outtmpl)), os.path.basename(outtmpl)
+    current = _lease(_key(params, filename), params, filename)
+    if progress_hook is not None:
+        current.hooks.append(progress_hook)
+    with _serving(current, target) as ydl:
+        yield ydl
+
+
+@contextmanager
+def progress_hook(ydl: "YoutubeDL", hook: ProgressHook) -> Iterator[None]:
+    """Also send the progress of the call served by the leased ``ydl`` to ``hook``."""
+    current = _leased_session(ydl)
+    current.hooks.append(hook)
+    try:
+        yield
+    finally:
+        current.hooks.remove(hook)
+
+
+@contextmanager
+def with_options(ydl: "YoutubeDL", **overrides: Any) -> Iterator["YoutubeDL"]:
+    """Yield an instance like the leased ``ydl`` but with ``overrides`` in its options.
+
+    The variant serves the same call: its progress goes to the hooks of
+    ``ydl``'s call and its downloads are handed over with ``ydl``'s. Variants
+    are pooled like any other instance, keyed on their options.
+    """
+    parent = _leased_session(ydl)
+    params = {**parent.params, **overrides}
+    current = _lease(_key(params, parent.filename), params, parent.filename)
+    current.parent = parent
+    with _serving(current, parent.directory) as variant:
+        yield variant
@@ -2,20 +2,52 @@ from __future__ import annotations
 
 import os
 from pathlib import Path
-from typing import List
+from typing import Dict, List
+
+from app.admission import MAX_DURATION, MAX_FILESIZE, QUEUE_MAX_DEPTH
 
 # Application configuration loaded from environment variables with sane defaults.
 
 PORT: int = int(os.getenv("PORT", "8000"))
 
+# Created at app startup rather than on import.
 DATA_DIR: Path = Path(os.getenv("DATA_DIR", "/data/output")).resolve()
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 CONCURRENCY: int = max(1, int(os.getenv("CONCURRENCY", "2")))
 
+# The worker pool starts with CONCURRENCY threads and is resized every
+# AUTOSCALE_INTERVAL seconds within [MIN_WORKERS, MAX_WORKERS]. The limits can be
+# changed at runtime through the admin API.
+MIN_WORKERS: int = max(1, int(os.getenv("MIN_WORKERS", "1")))
+MAX_WORKERS: int = max(MIN_WORKERS, CONCURRENCY, int(os.getenv("MAX_WORKERS", str(2 * (os.cpu_count() or 1)))))
+AUTOSCALE_INTERVAL: int = max(1, int(os.getenv("AUTOSCALE_INTERVAL", "15")))
+
 RATE_LIMIT_WINDOW: int = int(os.getenv("RATE_LIMIT_WINDOW", str(10 * 60)))
 RATE_LIMIT_MAX: int = max(1, int(os.getenv("RATE_LIMIT_MAX", "5")))
 
+# Admission limits (QUEUE_MAX_DEPTH, MAX_DURATION, MAX_FILESIZE) are shared with
+# the app pipeline and parsed by app.admission.
+
+# Jobs whose status has not been polled for this many minutes are cancelled (0 disables).
+IDLE_CANCEL_MINUTES: int = max(0, int(os.getenv("IDLE_CANCEL_MINUTES", "10")))
+
+# Per-stage deadlines: a base allowance in seconds plus a multiple of the probed
+# media duration. A download that reports no progress for STALL_TIMEOUT seconds
+# is failed by the watchdog even if its deadline has not been reached.
+STAGE_TIMEOUTS: Dict[str, int] = {
+    "probe": int(os.getenv("PROBE_TIMEOUT", "60")),
+    "download": int(os.getenv("DOWNLOAD_TIMEOUT", "300")),
+    "convert": int(os.getenv("CONVERT_TIMEOUT", "120")),
+    "tag": int(os.getenv("TAG_TIMEOUT", "30")),
+}
+STAGE_TIMEOUT_SCALE: Dict[str, float] = {
+    "probe": 0.0,
+    "download": float(os.getenv("DOWNLOAD_TIMEOUT_SCALE", "1.0")),
+    "convert": float(os.getenv("CONVERT_TIMEOUT_SCALE", "0.5")),
+    "tag": 0.0,
+}
+STALL_TIMEOUT: int = int(os.getenv("STALL_TIMEOUT", "120"))
+
 _default_origins = [
     "https://spotifree-tan.vercel.app",
     "http://localhost:5173",
@@ -31,7 +63,17 @@ __all__ = [
     "PORT",
     "DATA_DIR",
     "CONCURRENCY",
+    "MIN_WORKERS",
+    "MAX_WORKERS",
+    "AUTOSCALE_INTERVAL",
     "RATE_LIMIT_WINDOW",
     "RATE_LIMIT_MAX",
+    "QUEUE_MAX_DEPTH",
+    "MAX_DURATION",
+    "MAX_FILESIZE",
+    "IDLE_CANCEL_MINUTES",
+    "STAGE_TIMEOUTS",
+    "STAGE_TIMEOUT_SCALE",
+    "STALL_TIMEOUT",
     "CORS_ORIGINS",
 ]
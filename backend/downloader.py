@@ -1,20 +1,18 @@
 from __future__ import annotations
 
 import re
+import subprocess
 import shutil
 import tempfile
+import time
 from pathlib import Path
-from typing import Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import urlparse
 
-import ffmpeg
-from mutagen.easyid3 import EasyID3
-from mutagen.id3 import ID3NoHeaderError
-from tenacity import retry, stop_after_attempt, wait_exponential
-from yt_dlp import YoutubeDL
-from yt_dlp.utils import DownloadError
+from app import hls, metrics, parallel_download, throttle, waveform, ydl_pool
 
-from .config import DATA_DIR
+from .config import DATA_DIR, STAGE_TIMEOUTS
+from . import jobs
 from .jobs import Job, ProgressCallback
 
 BLACKLISTED_DOMAINS: Iterable[str] = (
@@ -29,6 +27,40 @@ BLACKLISTED_DOMAINS: Iterable[str] = (
 
 ALLOWED_BITRATES = {128, 192, 256, 320}
 
+# Options of the warm YoutubeDL sessions; per-job settings are passed to
+# ydl_pool.session separately so that jobs share an instance.
+#
+# The API stops waiting for a probe after PROBE_TIMEOUT, but its thread runs
+# until yt-dlp returns. Network reads are therefore bounded to a quarter of
+# that deadline and extraction is retried once at most, so an abandoned probe
+# frees its threadpool worker shortly after the deadline.
+_PROBE_OPTIONS: Dict[str, Any] = {
+    "quiet": True,
+    "no_warnings": True,
+    "skip_download": True,
+    "socket_timeout": max(1, min(15, STAGE_TIMEOUTS["probe"] // 4)),
+    "extractor_retries": 1,
+    "retries": 3,
+    "retry_sleep_functions": {"extractor": throttle.retry_sleep},
+    "noplaylist": True,
+}
+_DOWNLOAD_OPTIONS: Dict[str, Any] = {
+    "format": "bestaudio/best",
+    "noplaylist": True,
+    "socket_timeout": 15,
+    "quiet": True,
+    "no_warnings": True,
+    "retries": 3,
+    "fragment_retries": 3,
+    "retry_sleep_functions": {"http": throttle.retry_sleep, "fragment": throttle.retry_sleep},
+}
+# Seconds a probe may queue behind a throttled domain before the submission is refused.
+PROBE_MAX_WAIT = 10.0
+
+
+# yt_dlp, ffmpeg and mutagen take hundreds of milliseconds to import, so they
+# are imported by the functions that use them rather than at startup.
+
 
 class UnsupportedMediaError(Exception):
     """Raised when a URL is valid but media cannot be processed."""
@@ -63,21 +95,26 @@ def sanitize_filename(value: str) -> str:
     return sanitized[:120].strip() or "audio"
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=6), reraise=True)
 def probe_media(url: str) -> Dict[str, Optional[str]]:
-    opts = {
-        "quiet": True,
-        "no_warnings": True,
-        "skip_download": True,
-        "socket_timeout": 15,
-        "retries": 3,
-        "noplaylist": True,
-    }
-    with YoutubeDL(opts) as ydl:
-        try:
-            info = ydl.extract_info(url, download=False)
-        except DownloadError as exc:  # pragma: no cover - passthrough
-            raise UnsupportedMediaError(str(exc)) from exc
+    from yt_dlp.utils import DownloadError
+
+    started = time.monotonic()
+    deadline = started + STAGE_TIMEOUTS["probe"]
+
+    def check_deadline() -> None:
+        # Surfaces as asyncio.TimeoutError, which it is an alias of, in the API.
+        if time.monotonic() > deadline:
+            raise TimeoutError("Analyse du média trop longue.")
+
+    def extract() -> Dict[str, Any]:
+        check_deadline()
+        with ydl_pool.session(_PROBE_OPTIONS) as ydl:
+            return ydl.extract_info(url, download=False)
+
+    try:
+        info = throttle.call(url, extract, max_wait=PROBE_MAX_WAIT, check=check_deadline)
+    except DownloadError as exc:  # pragma: no cover - passthrough
+        raise UnsupportedMediaError(str(exc)) from exc
 
     if info.get("is_live") or info.get("live_status") in {"is_live", "is_upcoming"}:
         raise UnsupportedMediaError("Flux en direct non pris en charge")
@@ -100,11 +137,27 @@ def probe_media(url: str) -> Dict[str, Optional[str]]:
         "uploader": info.get("uploader"),
         "duration": info.get("duration"),
         "ext": info.get("ext"),
-        "original_info": info,
+        "filesize": _estimate_audio_filesize(info),
     }
+    metrics.STAGE_DURATION.observe(time.monotonic() - started, pool="backend", stage="probe")
     return summary
 
 
+def _estimate_audio_filesize(info: Dict[str, Any]) -> Optional[int]:
+    """Return the size in bytes of the stream ``bestaudio/best`` would pick, if known."""
+    audio_only = [
+        fmt
+        for fmt in info.get("formats") or []
+        if fmt.get("acodec") not in (None, "none") and fmt.get("vcodec") in (None, "none")
+    ]
+    if audio_only:
+        best = max(audio_only, key=lambda fmt: fmt.get("abr") or fmt.get("tbr") or 0)
+        size = best.get("filesize") or best.get("filesize_approx")
+    else:
+        size = info.get("filesize") or info.get("filesize_approx")
+    return int(size) if size else None
+
+
 def download_job(job: Job, progress_cb: ProgressCallback) -> Path:
     progress_cb(5, "Initialisation du téléchargement…")
 
@@ -113,30 +166,61 @@ def download_job(job: Job, progress_cb: ProgressCallback) -> Path:
     output_dir = DATA_DIR
     output_dir.mkdir(parents=True, exist_ok=True)
     temp_dir = Path(tempfile.mkdtemp(prefix=f"{job.id}_", dir=str(output_dir)))
+    final_path: Optional[Path] = None
 
     try:
-        downloaded = _download_audio(job.url, temp_dir, progress_cb)
+        jobs.enter_stage(job.id, "download")
+        downloaded, source = throttle.call(
+            job.url,
+            lambda: _download_audio(job.url, temp_dir, progress_cb),
+            check=lambda: jobs.raise_if_cancelled(job.id),
+        )
+        jobs.record_source(
+            job.id,
+            extractor=source.get("extractor_key"),
+            source_format=source.get("format_id"),
+            source_codec=source.get("acodec") or source.get("ext"),
+            bytes_downloaded=downloaded.stat().st_size,
+        )
         progress_cb(75, "Analyse du média…")
 
         metadata = {k: v for k, v in (job.metadata or {}).items() if v}
-        info = job.info.get("original_info") or job.info or {}
+        info = job.info
         base_name = metadata.get("title") or info.get("title") or f"audio-{job.id}"
         base_name = sanitize_filename(base_name)
         final_path = _unique_path(output_dir / f"{base_name}.mp3")
 
+        jobs.enter_stage(job.id, "convert")
         source_ext = downloaded.suffix.lower()
         if source_ext == ".mp3":
             progress_cb(85, "Vérification du MP3…")
             shutil.copy2(downloaded, final_path)
+            _derive_outputs(job.id, downloaded, final_path)
         else:
             progress_cb(85, "Conversion en MP3…")
-            _convert_to_mp3(downloaded, final_path, bitrate)
-
+            convert_started = time.monotonic()
+            _convert_to_mp3(job.id, downloaded, final_path, bitrate)
+            elapsed = time.monotonic() - convert_started
+            if info.get("duration") and elapsed > 0:
+                metrics.ENCODE_REALTIME_FACTOR.observe(info["duration"] / elapsed, pool="backend")
+        if hls.COPY_FROM_MP3:
+            _segment_mp3(job.id, final_path)
+        if hls.ENABLED:
+            hls.publish(final_path)
+
+        jobs.enter_stage(job.id, "tag")
         progress_cb(95, "Application des métadonnées…")
         _apply_metadata(final_path, info, metadata)
+        metrics.BYTES_WRITTEN.inc(final_path.stat().st_size, pool="backend")
 
         progress_cb(100, "Terminé")
         return final_path
+    except BaseException:
+        if final_path is not None:
+            final_path.unlink(missing_ok=True)
+            waveform.path_for(final_path).unlink(missing_ok=True)
+            hls.discard(final_path)
+        raise
     finally:
         shutil.rmtree(temp_dir, ignore_errors=True)
 
@@ -150,8 +234,7 @@ def _unique_path(path: Path) -> Path:
     return candidate
 
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=6), reraise=True)
-def _download_audio(url: str, temp_dir: Path, progress_cb: ProgressCallback) -> Path:
+def _download_audio(url: str, temp_dir: Path, progress_cb: ProgressCallback) -> Tuple[Path, Dict[str, Any]]:
     downloaded_path: Optional[Path] = None
 
     def _hook(status: Dict[str, Optional[str]]) -> None:
@@ -163,35 +246,34 @@ def _download_audio(url: str, temp_dir: Path, progress_cb: ProgressCallback) ->
                 ratio = min(1.0, max(0.0, downloaded / total))
                 progress_cb(int(ratio * 70), "Téléchargement en cours…")
         elif status.get("status") == "finished":
+            metrics.BYTES_DOWNLOADED.inc(
+                status.get("total_bytes") or status.get("downloaded_bytes") or 0, pool="backend"
+            )
             filename = status.get("filename")
             if filename:
                 downloaded_path = Path(filename)
             progress_cb(70, "Téléchargement terminé")
 
-    opts = {
-        "format": "bestaudio/best",
-        "outtmpl": str(temp_dir / "%(id)s.%(ext)s"),
-        "noplaylist": True,
-        "progress_hooks": [_hook],
-        "socket_timeout": 15,
-        "quiet": True,
-        "no_warnings": True,
-        "retries": 3,
-    }
-
-    with YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(url, download=True)
+    outtmpl = str(temp_dir / "%(id)s.%(ext)s")
+    with ydl_pool.session(_DOWNLOAD_OPTIONS, outtmpl=outtmpl, progress_hook=_hook) as ydl:
+        info = ydl.extract_info(url, download=False)
+        info = parallel_download.download(ydl, info, _hook)
         if not downloaded_path:
             filename = info.get("_filename")
             if filename:
                 downloaded_path = Path(filename)
     if not downloaded_path:
         raise RuntimeError("Téléchargement impossible")
-    return downloaded_path
+    # The session moved the file out of its own directory on exit.
+    return temp_dir / downloaded_path.name, info
+
 
+def _convert_to_mp3(job_id: str, source: Path, target: Path, bitrate: int) -> None:
+    """Transcode ``source`` to ``target``, deriving the other outputs in the same pass."""
+    import ffmpeg
 
-def _convert_to_mp3(source: Path, target: Path, bitrate: int) -> None:
-    audio_stream = ffmpeg.input(str(source)).audio.filter("aresample", resampler="soxr", ar=44100)
+    source_input = ffmpeg.input(str(source))
+    audio_stream = source_input.audio.filter("aresample", 44100, resampler="soxr")
     stream = ffmpeg.output(
         audio_stream,
         str(target),
@@ -201,11 +283,60 @@ def _convert_to_mp3(source: Path, target: Path, bitrate: int) -> None:
         ar=44100,
         ac=2,
     )
-    stream = ffmpeg.overwrite_output(stream)
-    ffmpeg.run(stream, quiet=True)
+    stream = ffmpeg.overwrite_output(ffmpeg.merge_outputs(stream, *_side_outputs(source_input, target)))
+    _run_with_peaks(job_id, ffmpeg.compile(stream), target)
+
+
+def _derive_outputs(job_id: str, source: Path, target: Path) -> None:
+    """Decode ``source`` only for the outputs stored beside ``target``."""
+    import ffmpeg
+
+    stream = ffmpeg.merge_outputs(*_side_outputs(ffmpeg.input(str(source)), target))
+    _run_with_peaks(job_id, ffmpeg.compile(ffmpeg.overwrite_output(stream)), target)
+
+
+def _side_outputs(source_input: Any, target: Path) -> List[Any]:
+    """The waveform PCM and, when encoded from the source, the HLS rendition."""
+    import ffmpeg
+
+    outputs = [ffmpeg.output(source_input.audio, "pipe:", format="s16le", ac=1, ar=waveform.SAMPLE_RATE)]
+    if hls.ENABLED and not hls.COPY_FROM_MP3:
+        playlist = hls.prepare(target)
+        outputs.append(ffmpeg.output(source_input.audio, str(playlist), **hls.output_options(playlist)))
+    return outputs
+
+
+def _segment_mp3(job_id: str, target: Path) -> None:
+    """Cut the HLS rendition from the finished MP3, copying its frames."""
+    import ffmpeg
+
+    playlist = hls.prepare(target)
+    stream = ffmpeg.output(ffmpeg.input(str(target)).audio, str(playlist), **hls.output_options(playlist))
+    process = ffmpeg.run_async(ffmpeg.overwrite_output(stream), quiet=True)
+    with jobs.track_process(job_id, process):
+        out, err = process.communicate()
+    jobs.raise_if_cancelled(job_id)
+    if process.returncode:
+        raise ffmpeg.Error("ffmpeg", out, err)
+
+
+def _run_with_peaks(job_id: str, cmd: List[str], target: Path) -> None:
+    import ffmpeg
+
+    peaks = waveform.Peaks()
+    process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    with jobs.track_process(job_id, process):
+        err = waveform.drain(process, peaks)
+    jobs.raise_if_cancelled(job_id)
+    if process.returncode:
+        raise ffmpeg.Error("ffmpeg", b"", err)
+    waveform.write(waveform.path_for(target), peaks)
 
 
 def _apply_metadata(path: Path, info: Dict[str, Optional[str]], overrides: Dict[str, Optional[str]]) -> None:
+    from mutagen.easyid3 import EasyID3
+    from mutagen.id3 import ID3NoHeaderError
+
     tags: Dict[str, str] = {}
     if overrides.get("title"):
         tags["title"] = overrides["title"].strip()
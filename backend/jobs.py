@@ -1,23 +1,57 @@
 from __future__ import annotations
 
-import queue
+import cProfile
+import itertools
+import os
+import subprocess
 import threading
 import time
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor
-from dataclasses import dataclass, field
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Callable, Deque, Dict, Optional
+from typing import Any, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional
 
-from .config import CONCURRENCY, DATA_DIR, RATE_LIMIT_MAX, RATE_LIMIT_WINDOW
+from app import admission, hls, metrics
+from app.admission import QueueFullError
+
+from .config import (
+    AUTOSCALE_INTERVAL,
+    CONCURRENCY,
+    DATA_DIR,
+    IDLE_CANCEL_MINUTES,
+    MAX_WORKERS,
+    MIN_WORKERS,
+    RATE_LIMIT_MAX,
+    RATE_LIMIT_WINDOW,
+    STAGE_TIMEOUT_SCALE,
+    STAGE_TIMEOUTS,
+    STALL_TIMEOUT,
+)
 
 ProgressCallback = Callable[[int, Optional[str]], None]
 Processor = Callable[["Job", ProgressCallback], Path]
 
 
-@dataclass
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+
+# The parts of a ``probe_media`` summary the pipeline reads. Anything else,
+# notably yt-dlp's full info dict, is dropped when a job is created.
+INFO_FIELDS = ("id", "title", "uploader", "duration", "ext", "filesize")
+
+
+@dataclass(slots=True)
 class Job:
+    """A submitted job.
+
+    ``metadata`` and ``info`` are not modified once the job is created and
+    ``timings`` is replaced rather than updated, so copies of a job can share
+    them.
+    """
+
     id: str
     url: str
     created_at: datetime
@@ -28,20 +62,91 @@ class Job:
     result_path: Optional[Path] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
     info: Dict[str, Any] = field(default_factory=dict)
+    last_polled: float = field(default_factory=time.monotonic)
+    stage: Optional[str] = None
+    stage_started: float = 0.0
+    last_progress: float = 0.0
+    timings: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    bytes_downloaded: int = 0
+    extractor: Optional[str] = None
+    source_format: Optional[str] = None
+    source_codec: Optional[str] = None
+    profile: bool = False
+    profile_path: Optional[Path] = None
+
+    def __post_init__(self) -> None:
+        self.info = {key: self.info[key] for key in INFO_FIELDS if self.info.get(key) is not None}
+
+
+class JobStatus(NamedTuple):
+    """What a status poll needs from a job, read under the lock in one go."""
+
+    id: str
+    status: str
+    progress: int
+    message: str
+    result_path: Optional[Path]
+    timings: Dict[str, Dict[str, Any]]
+    bytes_downloaded: int
+    extractor: Optional[str]
+    source_format: Optional[str]
+    source_codec: Optional[str]
+    profile_path: Optional[Path]
+
+
+@dataclass
+class _Slot:
+    """A worker thread and the job it is currently running."""
+
+    index: int
+    job_id: Optional[str] = None
+    expired_at: Optional[float] = None
+    retired: bool = False
+
 
+TERMINAL_STATUSES = frozenset({"done", "error", "cancelled"})
+
+STAGE_LABELS = {
+    "probe": "analyse",
+    "download": "téléchargement",
+    "convert": "conversion",
+    "tag": "métadonnées",
+}
+
+# How often the watchdog looks at running jobs, and how long a worker stuck in
+# an expired job may take to notice before its slot is replaced.
+_WATCHDOG_INTERVAL = 5.0
+_WATCHDOG_GRACE = 30.0
 
 _jobs: Dict[str, Job] = {}
 _jobs_lock = threading.RLock()
-_task_queue: "queue.Queue[str]" = queue.Queue()
+_pending: Deque[str] = deque()
+_pending_ready = threading.Condition(_jobs_lock)
+_cancelled: Dict[str, str] = {}
+_processes: Dict[str, List[subprocess.Popen]] = {}
 _processor: Optional[Processor] = None
 _started_workers = False
-_executor: Optional[ThreadPoolExecutor] = None
+_slots: Dict[int, _Slot] = {}
+_slot_ids = itertools.count(1)
+_pool_limits = {"min": MIN_WORKERS, "max": MAX_WORKERS}
+_pool_load = {"cpu": 0.0, "network_wait": 0.0}
+
+# Autoscaling thresholds. Load is the one-minute load average per core, which
+# also accounts for running ffmpeg children. Network wait is the share of busy
+# slots sitting in the download stage, which mostly waits on the origin.
+_CPU_HIGH = 0.85
+_CPU_SATURATED = 1.0
+_NETWORK_BOUND = 0.5
 
 _rate_lock = threading.Lock()
 _rate_requests: Dict[str, Deque[float]] = {}
 
 _cleanup_started = False
 
+# cProfile output of jobs submitted with profiling enabled. Files are removed
+# with the rest of DATA_DIR by the cleanup loop.
+PROFILE_DIR = DATA_DIR / "profiles"
+
 
 def configure(processor: Processor) -> None:
     global _processor
@@ -51,46 +156,171 @@ def configure(processor: Processor) -> None:
 
 
 def _start_workers() -> None:
-    global _started_workers, _executor
+    global _started_workers
     if _started_workers:
         return
-    _executor = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="job-worker")
-    for _ in range(CONCURRENCY):
-        _executor.submit(_worker_loop)
+    for _ in range(min(max(CONCURRENCY, MIN_WORKERS), MAX_WORKERS)):
+        _spawn_worker()
+    metrics.JOBS.add_callback(_jobs_by_stage)
+    metrics.WORKERS.add_callback(lambda: {("backend",): pool_size()})
+    metrics.WORKERS_BUSY.add_callback(lambda: {("backend",): pool_stats()["busy"]})
+    watchdog_thread = threading.Thread(target=_watchdog_loop, name="job-watchdog", daemon=True)
+    watchdog_thread.start()
+    autoscale_thread = threading.Thread(target=_autoscale_loop, name="job-autoscaler", daemon=True)
+    autoscale_thread.start()
     _started_workers = True
 
 
+def _spawn_worker() -> _Slot:
+    slot = _Slot(index=next(_slot_ids))
+    with _jobs_lock:
+        _slots[slot.index] = slot
+    thread = threading.Thread(target=_worker_loop, args=(slot,), name=f"job-worker-{slot.index}", daemon=True)
+    thread.start()
+    return slot
+
+
+def _jobs_by_stage() -> Dict[tuple, float]:
+    counts = {("backend", "queued"): 0.0}
+    with _jobs_lock:
+        counts[("backend", "queued")] = float(len(_pending))
+        for slot in _slots.values():
+            job = _jobs.get(slot.job_id) if slot.job_id else None
+            if job is not None and job.stage:
+                key = ("backend", job.stage)
+                counts[key] = counts.get(key, 0.0) + 1
+    return counts
+
+
+def _retire_idle_worker() -> bool:
+    with _jobs_lock:
+        for slot in _slots.values():
+            if slot.job_id is None:
+                slot.retired = True
+                del _slots[slot.index]
+                _pending_ready.notify_all()
+                return True
+    return False
+
+
+def pool_size() -> int:
+    with _jobs_lock:
+        return len(_slots)
+
+
+# Drives queue wait estimates and Retry-After hints.
+_backlog = admission.Backlog(pool_size)
+
+
+def pool_stats() -> Dict[str, Any]:
+    with _jobs_lock:
+        return {
+            "workers": len(_slots),
+            "busy": sum(1 for slot in _slots.values() if slot.job_id is not None),
+            "min_workers": _pool_limits["min"],
+            "max_workers": _pool_limits["max"],
+            "queue_depth": len(_pending),
+            "cpu_load": round(_pool_load["cpu"], 2),
+            "network_wait": round(_pool_load["network_wait"], 2),
+        }
+
+
+def set_pool_limits(min_workers: Optional[int] = None, max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """Change the autoscaling limits and resize the pool to fit within them."""
+    with _jobs_lock:
+        low = _pool_limits["min"] if min_workers is None else min_workers
+        high = _pool_limits["max"] if max_workers is None else max_workers
+        if low < 1 or high < low:
+            raise ValueError("Limites invalides : 1 <= min_workers <= max_workers requis.")
+        _pool_limits["min"], _pool_limits["max"] = low, high
+    _resize(max(low, min(high, pool_size())))
+    return pool_stats()
+
+
+def _resize(target: int) -> None:
+    size = pool_size()
+    for _ in range(target - size):
+        _spawn_worker()
+    for _ in range(size - target):
+        if not _retire_idle_worker():
+            break
+
+
 def _start_cleanup() -> None:
     global _cleanup_started
     if _cleanup_started:
         return
     cleanup_thread = threading.Thread(target=_cleanup_loop, daemon=True)
     cleanup_thread.start()
+    if IDLE_CANCEL_MINUTES:
+        idle_thread = threading.Thread(target=_idle_loop, daemon=True)
+        idle_thread.start()
     _cleanup_started = True
 
 
-def submit(job: Job) -> None:
+def queue_depth() -> int:
+    with _jobs_lock:
+        return len(_pending)
+
+
+def drain_rate() -> float:
+    """Return the estimated number of jobs leaving the queue per second."""
+    return _backlog.drain_rate()
+
+
+def estimated_wait(position: Optional[int] = None) -> float:
+    """Return the expected seconds before a job at ``position`` is picked up."""
+    if position is None:
+        position = queue_depth()
+    return _backlog.estimated_wait(position)
+
+
+def ensure_capacity() -> None:
+    """Raise :class:`QueueFullError` if a new job would not be accepted."""
+    _backlog.ensure_capacity(queue_depth(), "File d'attente pleine, réessayez plus tard.")
+
+
+def submit(job: Job) -> float:
+    """Queue ``job`` and return its estimated wait in seconds."""
     with _jobs_lock:
+        ensure_capacity()
+        position = queue_depth()
         _jobs[job.id] = job
-    _task_queue.put(job.id)
+        _pending.append(job.id)
+        _pending_ready.notify()
+    return estimated_wait(position)
 
 
 def get(job_id: str) -> Optional[Job]:
+    """Return a copy of ``job_id``'s record, sharing its read-only parts."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return replace(job) if job else None
+
+
+def snapshot(job_id: str, *, touch: bool = False) -> Optional[JobStatus]:
+    """Return the status of ``job_id`` without copying the job.
+
+    With ``touch``, also record that a client is still polling it.
+    """
     with _jobs_lock:
         job = _jobs.get(job_id)
         if not job:
             return None
-        return Job(
-            id=job.id,
-            url=job.url,
-            created_at=job.created_at,
-            bitrate=job.bitrate,
-            status=job.status,
-            progress=job.progress,
-            message=job.message,
-            result_path=job.result_path,
-            metadata=dict(job.metadata),
-            info=dict(job.info),
+        if touch:
+            job.last_polled = time.monotonic()
+        return JobStatus(
+            job.id,
+            job.status,
+            job.progress,
+            job.message,
+            job.result_path,
+            job.timings,
+            job.bytes_downloaded,
+            job.extractor,
+            job.source_format,
+            job.source_codec,
+            job.profile_path,
         )
 
 
@@ -98,18 +328,172 @@ def update(job_id: str, *, status: Optional[str] = None, progress: Optional[int]
            message: Optional[str] = None, result_path: Optional[Path] = None) -> None:
     with _jobs_lock:
         job = _jobs.get(job_id)
-        if not job:
+        if not job or job.status == "cancelled" or job_id in _cancelled:
             return
         if status is not None:
             job.status = status
         if progress is not None:
             job.progress = max(0, min(100, progress))
+            job.last_progress = time.monotonic()
         if message is not None:
             job.message = message
         if result_path is not None:
             job.result_path = result_path
 
 
+def enter_stage(job_id: str, stage: str) -> None:
+    """Mark the start of ``stage`` for ``job_id``, resetting its deadline."""
+    raise_if_cancelled(job_id)
+    now = time.monotonic()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return
+        previous, previous_started = job.stage, job.stage_started
+        timings = dict(job.timings)
+        if previous:
+            timings[previous] = {**timings[previous], "duration_s": round(now - previous_started, 3)}
+        timings[stage] = {"started_at": datetime.utcnow().isoformat()}
+        job.timings = timings
+        job.stage = stage
+        job.stage_started = now
+        job.last_progress = now
+    if previous:
+        metrics.STAGE_DURATION.observe(now - previous_started, pool="backend", stage=previous)
+
+
+def _close_stage(job_id: str) -> None:
+    now = time.monotonic()
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job or not job.stage:
+            return
+        stage, started = job.stage, job.stage_started
+        job.timings = {**job.timings, stage: {**job.timings[stage], "duration_s": round(now - started, 3)}}
+        job.stage = None
+    metrics.STAGE_DURATION.observe(now - started, pool="backend", stage=stage)
+
+
+def record_source(job_id: str, *, extractor: Optional[str] = None, source_format: Optional[str] = None,
+                  source_codec: Optional[str] = None, bytes_downloaded: int = 0) -> None:
+    """Store what was actually downloaded for ``job_id``."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return
+        job.extractor = extractor
+        job.source_format = source_format
+        job.source_codec = source_codec
+        job.bytes_downloaded = bytes_downloaded
+
+
+STAGE_SUMMARY_GROUPS = ("extractor", "source_format", "source_codec")
+
+
+def stage_summary(group_by: str = "extractor") -> List[Dict[str, Any]]:
+    """Return average stage durations and throughput of finished jobs per ``group_by``."""
+    if group_by not in STAGE_SUMMARY_GROUPS:
+        raise ValueError(f"group_by doit être l'un de : {', '.join(STAGE_SUMMARY_GROUPS)}")
+    groups: Dict[Optional[str], Dict[str, Any]] = {}
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.status != "done":
+                continue
+            group = groups.setdefault(getattr(job, group_by), {"jobs": 0, "bytes": 0, "stages": {}})
+            group["jobs"] += 1
+            group["bytes"] += job.bytes_downloaded
+            for stage, timing in job.timings.items():
+                if "duration_s" in timing:
+                    totals = group["stages"].setdefault(stage, [0.0, 0])
+                    totals[0] += timing["duration_s"]
+                    totals[1] += 1
+    summary = []
+    for key, group in groups.items():
+        download = group["stages"].get("download")
+        summary.append({
+            group_by: key,
+            "jobs": group["jobs"],
+            "avg_bytes_downloaded": group["bytes"] // group["jobs"],
+            "avg_duration_s": {stage: round(total / count, 3) for stage, (total, count) in group["stages"].items()},
+            "download_bytes_per_s": round(group["bytes"] / download[0]) if download and download[0] else None,
+        })
+    summary.sort(key=lambda row: sum(row["avg_duration_s"].values()), reverse=True)
+    return summary
+
+
+def stage_deadline(stage: str, duration: Optional[float] = None) -> float:
+    """Return the seconds allowed for ``stage`` on media lasting ``duration`` seconds."""
+    return STAGE_TIMEOUTS[stage] + STAGE_TIMEOUT_SCALE[stage] * (duration or 0)
+
+
+def touch(job_id: str) -> None:
+    """Record that a client is still interested in ``job_id``."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job:
+            job.last_polled = time.monotonic()
+
+
+def cancel(job_id: str, message: str = "Annulé") -> Optional[str]:
+    """Cancel ``job_id`` and return its resulting status, or ``None`` if unknown.
+
+    Queued jobs are removed from the queue. Running jobs are flagged so that
+    their next progress callback raises :class:`JobCancelled`, and subprocesses
+    registered through :func:`track_process` are terminated.
+    """
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return None
+        if job.status in TERMINAL_STATUSES:
+            return job.status
+        if job.status == "queued":
+            try:
+                _pending.remove(job_id)
+            except ValueError:
+                pass
+        else:
+            _cancelled[job_id] = message
+            for process in _processes.get(job_id, []):
+                _terminate(process)
+        job.status = "cancelled"
+        job.message = message
+        return job.status
+
+
+def raise_if_cancelled(job_id: str) -> None:
+    with _jobs_lock:
+        message = _cancelled.get(job_id)
+    if message is not None:
+        raise JobCancelled(message)
+
+
+@contextmanager
+def track_process(job_id: str, process: subprocess.Popen) -> Iterator[subprocess.Popen]:
+    """Register ``process`` so that cancelling ``job_id`` terminates it."""
+    with _jobs_lock:
+        _processes.setdefault(job_id, []).append(process)
+        if job_id in _cancelled:
+            _terminate(process)
+    try:
+        yield process
+    finally:
+        with _jobs_lock:
+            tracked = _processes.get(job_id, [])
+            if process in tracked:
+                tracked.remove(process)
+            if not tracked:
+                _processes.pop(job_id, None)
+
+
+def _terminate(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        try:
+            process.terminate()
+        except OSError:
+            pass
+
+
 def rate_limit_exceeded(ip: str) -> bool:
     now = time.time()
     with _rate_lock:
@@ -117,38 +501,192 @@ def rate_limit_exceeded(ip: str) -> bool:
         while history and now - history[0] > RATE_LIMIT_WINDOW:
             history.popleft()
         if len(history) >= RATE_LIMIT_MAX:
+            metrics.REJECTIONS.inc(reason="rate_limit")
             return True
         history.append(now)
     return False
 
 
-def _worker_loop() -> None:
-    while True:
-        job_id = _task_queue.get()
-        job = get(job_id)
+def _next_job(slot: _Slot) -> Optional[Job]:
+    """Block until a job is queued, assign it to ``slot`` and return a copy."""
+    with _pending_ready:
+        while not _pending and not slot.retired:
+            _pending_ready.wait()
+        if slot.retired:
+            return None
+        job_id = _pending.popleft()
+        update(job_id, status="in_progress", progress=0, message="Téléchargement en cours…")
+        slot.job_id = job_id
+        slot.expired_at = None
+        return get(job_id)
+
+
+def _worker_loop(slot: _Slot) -> None:
+    while not slot.retired:
+        job = _next_job(slot)
         if not job:
-            _task_queue.task_done()
             continue
         if _processor is None:
             update(job.id, status="error", message="Aucun processeur configuré", progress=0)
-            _task_queue.task_done()
+            with _jobs_lock:
+                _cancelled.pop(job.id, None)
+                slot.job_id = None
             continue
-        update(job.id, status="in_progress", progress=0, message="Téléchargement en cours…")
 
         def _progress_callback(value: int, message: Optional[str] = None) -> None:
+            raise_if_cancelled(job.id)
             if message is None:
                 update(job.id, progress=value)
             else:
                 update(job.id, progress=value, message=message)
 
+        started = time.monotonic()
         try:
-            result_path = _processor(job, _progress_callback)
+            result_path = _run_processor(job, _progress_callback)
+        except JobCancelled:
+            pass
         except Exception as exc:  # pragma: no cover - defensive
             update(job.id, status="error", message=str(exc))
         else:
             update(job.id, status="done", progress=100, message="Terminé", result_path=result_path)
         finally:
-            _task_queue.task_done()
+            _close_stage(job.id)
+            with _jobs_lock:
+                _cancelled.pop(job.id, None)
+                slot.job_id = None
+            _backlog.record_completion(time.monotonic() - started)
+
+
+def _run_processor(job: Job, progress_cb: ProgressCallback) -> Path:
+    if not job.profile:
+        return _processor(job, progress_cb)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(_processor, job, progress_cb)
+    finally:
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        path = PROFILE_DIR / f"{job.id}.prof"
+        profiler.dump_stats(str(path))
+        with _jobs_lock:
+            stored = _jobs.get(job.id)
+            if stored:
+                stored.profile_path = path
+
+
+def _watchdog_loop() -> None:
+    while True:
+        time.sleep(_WATCHDOG_INTERVAL)
+        try:
+            _check_slots(time.monotonic())
+        except Exception:  # pragma: no cover - keep the watchdog alive
+            continue
+
+
+def _check_slots(now: float) -> None:
+    """Fail jobs that overran their stage and replace slots that never came back."""
+    replacements = 0
+    with _jobs_lock:
+        for slot in list(_slots.values()):
+            job = _jobs.get(slot.job_id) if slot.job_id else None
+            if job is None:
+                continue
+            if slot.job_id in _cancelled:
+                if slot.expired_at is None:
+                    slot.expired_at = now
+                elif now - slot.expired_at > _WATCHDOG_GRACE:
+                    slot.retired = True
+                    del _slots[slot.index]
+                    replacements += 1
+                continue
+            reason = _overdue(job, now)
+            if reason:
+                job.status = "error"
+                job.message = reason
+                _cancelled[job.id] = reason
+                for process in _processes.get(job.id, []):
+                    _terminate(process)
+                slot.expired_at = now
+    for _ in range(replacements):
+        _spawn_worker()
+
+
+def _autoscale_loop() -> None:
+    samples = busy_total = downloading_total = 0
+    while True:
+        time.sleep(1)
+        with _jobs_lock:
+            for slot in _slots.values():
+                job = _jobs.get(slot.job_id) if slot.job_id else None
+                if job is not None:
+                    busy_total += 1
+                    downloading_total += job.stage == "download"
+        samples += 1
+        if samples < AUTOSCALE_INTERVAL:
+            continue
+        network_wait = downloading_total / busy_total if busy_total else 0.0
+        samples = busy_total = downloading_total = 0
+        try:
+            _autoscale(_cpu_load(), network_wait)
+        except Exception:  # pragma: no cover - keep the autoscaler alive
+            continue
+
+
+def _cpu_load() -> float:
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):  # pragma: no cover - not available on Windows
+        return 0.0
+
+
+def _autoscale(cpu: float, network_wait: float) -> None:
+    """Grow the pool while jobs queue and CPU or network allow, shrink it when idle."""
+    with _jobs_lock:
+        _pool_load["cpu"], _pool_load["network_wait"] = cpu, network_wait
+        low, high = _pool_limits["min"], _pool_limits["max"]
+        size = len(_slots)
+        idle = sum(1 for slot in _slots.values() if slot.job_id is None)
+        depth = len(_pending)
+    network_bound = network_wait >= _NETWORK_BOUND
+    if size > high:
+        _resize(high)
+    elif depth and size < high and (cpu < _CPU_HIGH or network_bound):
+        step = depth if network_bound else 1
+        _resize(min(high, size + step))
+    elif size > low and ((not depth and idle) or (cpu > _CPU_SATURATED and not network_bound)):
+        _resize(size - 1)
+    elif size < low:
+        _resize(low)
+
+
+def _overdue(job: Job, now: float) -> Optional[str]:
+    if job.stage is None:
+        return None
+    label = STAGE_LABELS.get(job.stage, job.stage)
+    limit = stage_deadline(job.stage, job.info.get("duration"))
+    if now - job.stage_started > limit:
+        return f"Délai dépassé pendant l'étape « {label} » ({int(limit)} s)."
+    if job.stage == "download" and now - job.last_progress > STALL_TIMEOUT:
+        return f"Aucune progression depuis {STALL_TIMEOUT} s pendant l'étape « {label} »."
+    return None
+
+
+def _reap_idle(now: float) -> None:
+    """Cancel the jobs whose status has not been polled for ``IDLE_CANCEL_MINUTES``."""
+    timeout = IDLE_CANCEL_MINUTES * 60
+    with _jobs_lock:
+        abandoned = [
+            job.id
+            for job in _jobs.values()
+            if job.status not in TERMINAL_STATUSES and now - job.last_polled > timeout
+        ]
+    for job_id in abandoned:
+        cancel(job_id, "Annulé : job abandonné par le client")
+
+
+def _idle_loop() -> None:
+    while True:
+        time.sleep(30)
+        _reap_idle(time.monotonic())
 
 
 def _cleanup_loop() -> None:
@@ -157,6 +695,8 @@ def _cleanup_loop() -> None:
         time.sleep(interval)
         cutoff = datetime.utcnow() - timedelta(hours=24)
         try:
+            # Before the files: emptying a staging directory would refresh its mtime.
+            hls.purge_staging(DATA_DIR, 24 * 60 * 60)
             for path in DATA_DIR.glob("**/*"):
                 if path.is_file():
                     mtime = datetime.utcfromtimestamp(path.stat().st_mtime)
@@ -165,15 +705,44 @@ def _cleanup_loop() -> None:
                             path.unlink()
                         except OSError:
                             continue
+            # HLS renditions are directories; drop them once emptied above.
+            for path in DATA_DIR.glob("**/*.hls"):
+                try:
+                    path.rmdir()
+                except OSError:
+                    continue
         except Exception:
             continue
 
 
 __all__ = [
+    "INFO_FIELDS",
     "Job",
+    "JobCancelled",
+    "JobStatus",
+    "PROFILE_DIR",
+    "QueueFullError",
+    "TERMINAL_STATUSES",
+    "cancel",
+    "STAGE_LABELS",
     "configure",
+    "drain_rate",
+    "enter_stage",
+    "ensure_capacity",
+    "estimated_wait",
+    "queue_depth",
+    "raise_if_cancelled",
+    "record_source",
+    "stage_deadline",
+    "stage_summary",
     "submit",
     "get",
+    "pool_size",
+    "pool_stats",
+    "set_pool_limits",
+    "snapshot",
+    "touch",
+    "track_process",
     "update",
     "rate_limit_exceeded",
 ]
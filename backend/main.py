@@ -1,23 +1,41 @@
 from __future__ import annotations
 
+import asyncio
+import io
+import pstats
+import time
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
-from fastapi import Body, FastAPI, HTTPException, Request
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from pydantic import BaseModel, ValidationError
 
-from .config import CORS_ORIGINS
+from app import admission, hls, metrics, profiler, waveform
+from app.admin import is_admin, require_admin
+from app.throttle import ThrottledError
+
+from .config import CORS_ORIGINS, DATA_DIR, MAX_DURATION, MAX_FILESIZE, STAGE_TIMEOUTS
 from . import downloader, jobs
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    jobs.configure(downloader.download_job)
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
-    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
 )
 
@@ -28,9 +46,12 @@ class JobRequest(BaseModel):
     title: Optional[str] = None
     artist: Optional[str] = None
     album: Optional[str] = None
+    profile: bool = False
 
 
-jobs.configure(downloader.download_job)
+class PoolLimits(BaseModel):
+    min_workers: Optional[int] = None
+    max_workers: Optional[int] = None
 
 
 @app.get("/api/health")
@@ -38,9 +59,14 @@ async def api_health() -> Dict[str, bool]:
     return {"ok": True}
 
 
+@app.get("/metrics")
+async def metrics_endpoint() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/jobs/{job_id}")
 async def job_status(job_id: str) -> Dict[str, Any]:
-    job = jobs.get(job_id)
+    job = jobs.snapshot(job_id, touch=True)
     if not job:
         raise HTTPException(status_code=404, detail={"error": {"code": "NOT_FOUND", "message": "Job introuvable."}})
     download_url = None
@@ -52,17 +78,47 @@ async def job_status(job_id: str) -> Dict[str, Any]:
         "progress": job.progress,
         "message": job.message,
         "download_url": download_url,
+        "timings": job.timings,
+        "bytes_downloaded": job.bytes_downloaded,
+        "extractor": job.extractor,
+        "source_format": job.source_format,
+        "source_codec": job.source_codec,
     }
 
 
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str) -> Dict[str, Any]:
+    status = jobs.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail={"error": {"code": "NOT_FOUND", "message": "Job introuvable."}})
+    if status != "cancelled":
+        raise HTTPException(
+            status_code=409,
+            detail={"error": {"code": "ALREADY_FINISHED", "message": "Le job est déjà terminé."}},
+        )
+    return {"job_id": job_id, "status": status}
+
+
+def _queue_full(exc: jobs.QueueFullError) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail={"error": {"code": "QUEUE_FULL", "message": str(exc)}},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.post("/api/jobs")
-async def create_job(request: Request, payload: Dict[str, Any] = Body(...)) -> Dict[str, str]:
+async def create_job(request: Request, payload: Dict[str, Any] = Body(...)) -> Dict[str, Any]:
     client_ip = request.client.host if request.client else "unknown"
     if jobs.rate_limit_exceeded(client_ip):
         raise HTTPException(
             status_code=429,
             detail={"error": {"code": "RATE_LIMITED", "message": "Trop de requêtes, réessayez plus tard."}},
         )
+    try:
+        jobs.ensure_capacity()
+    except jobs.QueueFullError as exc:
+        raise _queue_full(exc) from exc
     if not isinstance(payload, dict):
         raise HTTPException(
             status_code=400,
@@ -82,6 +138,14 @@ async def create_job(request: Request, payload: Dict[str, Any] = Body(...)) -> D
     except (KeyError, ValueError) as exc:
         raise HTTPException(status_code=400, detail={"error": {"code": "INVALID_URL", "message": str(exc)}})
 
+    if data.get("profile") and not is_admin(
+        request.headers.get("authorization"), request.headers.get("x-admin-token")
+    ):
+        raise HTTPException(
+            status_code=403,
+            detail={"error": {"code": "PROFILE_FORBIDDEN", "message": "Profilage réservé aux administrateurs."}},
+        )
+
     bitrate = data.get("bitrate") or 192
     if bitrate not in downloader.ALLOWED_BITRATES:
         raise HTTPException(
@@ -89,8 +153,35 @@ async def create_job(request: Request, payload: Dict[str, Any] = Body(...)) -> D
             detail={"error": {"code": "INVALID_BITRATE", "message": "Bitrate non supporté."}},
         )
 
+    probe_started_at = datetime.utcnow().isoformat()
+    probe_started = time.monotonic()
     try:
-        info = downloader.probe_media(validated_url)
+        info = await asyncio.wait_for(
+            run_in_threadpool(downloader.probe_media, validated_url), timeout=STAGE_TIMEOUTS["probe"]
+        )
+        admission.check_media_limits(info)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail={"error": {"code": "PROBE_TIMEOUT", "message": "Analyse du média trop longue."}},
+        )
+    except admission.MediaTooLargeError as exc:
+        if exc.limit == "duration":
+            message = f"Média trop long (maximum {MAX_DURATION // 60} minutes)"
+        else:
+            message = f"Média trop volumineux (maximum {MAX_FILESIZE // (1024 * 1024)} Mo)"
+        raise HTTPException(status_code=413, detail={"error": {"code": "MEDIA_TOO_LARGE", "message": message}})
+    except ThrottledError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "error": {
+                    "code": "UPSTREAM_THROTTLED",
+                    "message": "La source limite nos requêtes, réessayez plus tard.",
+                }
+            },
+            headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+        )
     except downloader.UnsupportedMediaError:
         raise HTTPException(
             status_code=400,
@@ -111,14 +202,71 @@ async def create_job(request: Request, payload: Dict[str, Any] = Body(...)) -> D
         bitrate=bitrate,
         metadata=metadata,
         info=info,
+        profile=bool(data.get("profile")),
+        timings={"probe": {"started_at": probe_started_at, "duration_s": round(time.monotonic() - probe_started, 3)}},
     )
-    jobs.submit(job)
-    return {"job_id": job_id}
+    try:
+        wait = jobs.submit(job)
+    except jobs.QueueFullError as exc:
+        raise _queue_full(exc) from exc
+    return {"job_id": job_id, "estimated_wait_s": round(wait, 1)}
+
+
+@app.get("/api/admin/pool", dependencies=[Depends(require_admin)])
+async def pool_status() -> Dict[str, Any]:
+    return jobs.pool_stats()
+
+
+@app.put("/api/admin/pool", dependencies=[Depends(require_admin)])
+async def update_pool(limits: PoolLimits) -> Dict[str, Any]:
+    try:
+        return jobs.set_pool_limits(limits.min_workers, limits.max_workers)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail={"error": {"code": "INVALID_LIMITS", "message": str(exc)}})
+
+
+@app.get("/api/admin/stats/stages", dependencies=[Depends(require_admin)])
+async def stage_stats(group_by: str = Query("extractor")) -> Dict[str, Any]:
+    try:
+        return {"group_by": group_by, "groups": jobs.stage_summary(group_by)}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail={"error": {"code": "INVALID_GROUP", "message": str(exc)}})
+
+
+@app.get("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_process(
+    seconds: float = Query(10.0, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    thread: Optional[str] = Query(None),
+) -> PlainTextResponse:
+    try:
+        stacks = await run_in_threadpool(profiler.sample_stacks, seconds, interval_ms / 1000, thread)
+    except profiler.ProfilerBusyError:
+        raise HTTPException(
+            status_code=409,
+            detail={"error": {"code": "PROFILER_BUSY", "message": "Un profilage est déjà en cours."}},
+        )
+    return PlainTextResponse(stacks, headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'})
+
+
+@app.get("/api/admin/jobs/{job_id}/profile", dependencies=[Depends(require_admin)])
+async def job_profile(job_id: str, format: str = Query("text", pattern="^(text|pstats)$")):
+    job = jobs.snapshot(job_id)
+    if not job or not job.profile_path or not job.profile_path.exists():
+        raise HTTPException(
+            status_code=404,
+            detail={"error": {"code": "NO_PROFILE", "message": "Aucun profil pour ce job."}},
+        )
+    if format == "pstats":
+        return FileResponse(job.profile_path, media_type="application/octet-stream", filename=job.profile_path.name)
+    report = io.StringIO()
+    pstats.Stats(str(job.profile_path), stream=report).sort_stats("cumulative").print_stats(50)
+    return PlainTextResponse(report.getvalue())
 
 
 @app.get("/api/download/{job_id}")
 async def download(job_id: str) -> FileResponse:
-    job = jobs.get(job_id)
+    job = jobs.snapshot(job_id)
     if not job or not job.result_path or not job.result_path.exists():
         raise HTTPException(status_code=404, detail={"error": {"code": "NOT_READY", "message": "Fichier indisponible."}})
     response = FileResponse(
@@ -130,3 +278,21 @@ async def download(job_id: str) -> FileResponse:
     return response
 
 
+@app.get("/api/jobs/{job_id}/waveform")
+async def job_waveform(job_id: str) -> FileResponse:
+    job = jobs.snapshot(job_id)
+    peaks_path = waveform.path_for(job.result_path) if job and job.result_path else None
+    if not peaks_path or not peaks_path.exists():
+        raise HTTPException(status_code=404, detail={"error": {"code": "NOT_READY", "message": "Forme d'onde indisponible."}})
+    return FileResponse(peaks_path, media_type="application/json", headers={"Cache-Control": waveform.CACHE_CONTROL})
+
+
+@app.get("/api/jobs/{job_id}/hls/{name}")
+async def job_hls(job_id: str, name: str) -> FileResponse:
+    job = jobs.snapshot(job_id)
+    path = hls.file_for(job.result_path, name) if job and job.result_path else None
+    if not path:
+        raise HTTPException(status_code=404, detail={"error": {"code": "NOT_READY", "message": "Flux HLS indisponible."}})
+    return FileResponse(path, media_type=hls.media_type(name), headers={"Cache-Control": hls.CACHE_CONTROL})
+
+
@@ -1,19 +1,44 @@
 import sys
+from contextlib import asynccontextmanager
+from datetime import datetime
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from fastapi import FastAPI, APIRouter, BackgroundTasks, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 
-from app import audio_pipeline
+from app import admission, audio_pipeline, budget_store, hls, metrics, profiler, waveform
+from app.admin import require_admin
 from app.budget_api import create_budget_router
-from app.db import AUDIO_DIR, create_audio_job, get_audio_job
+from app.db import (
+    AUDIO_DIR,
+    get_audio_job,
+    init_db,
+    list_audio_jobs,
+    stage_stats,
+    start_retention,
+)
 
 import os
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+DATA_DIR = Path(os.getenv("DATA_DIR", str(AUDIO_DIR))).resolve()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    start_retention()
+    audio_pipeline.start_idle_reaper()
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    budget_store.load()
+    yield
+    audio_pipeline.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 cors_origins_env = os.getenv("CORS_ORIGINS")
 allow_origins = (
@@ -28,7 +53,7 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
     allow_origin_regex=allow_origin_regex,
-    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_methods=["GET", "POST", "DELETE", "OPTIONS"],
     allow_headers=["*"],
     expose_headers=["Content-Disposition"],
     allow_credentials=False,
@@ -47,12 +72,24 @@ class JobRequest(BaseModel):
     bitrate: int | None = None
 
 
+def _submit(source_url: str) -> tuple[str, int]:
+    try:
+        return audio_pipeline.submit(source_url)
+    except admission.QueueFullError as exc:
+        raise HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        ) from exc
+
+
 @api_router.post("/audio/submit")
 @api_router.post("/audio/submit/")
-async def submit_audio(req: SubmitRequest, background_tasks: BackgroundTasks):
-    audio_id = create_audio_job(req.url)
-    background_tasks.add_task(audio_pipeline.process_audio_job, audio_id)
-    return {"audio_id": audio_id, "status": "queued"}
+async def submit_audio(req: SubmitRequest):
+    audio_id, position = _submit(req.url)
+    return {
+        "audio_id": audio_id,
+        "status": "queued",
+        "estimated_wait_s": round(audio_pipeline.estimated_wait(position), 1),
+    }
 
 
 @api_router.get("/audio/status/{audio_id}")
@@ -61,6 +98,7 @@ async def audio_status(audio_id: str):
     job = get_audio_job(audio_id)
     if not job:
         raise HTTPException(status_code=404, detail="Audio job not found")
+    audio_pipeline.touch(audio_id)
     return {
         "status": job["status"],
         "progress": job["progress"],
@@ -68,6 +106,11 @@ async def audio_status(audio_id: str):
         "title": job["title"],
         "duration_s": job["duration_s"],
         "filepath_mp3": job["filepath_mp3"],
+        "timings": job.get("stage_timings"),
+        "bytes_downloaded": job.get("bytes_downloaded"),
+        "extractor": job.get("extractor"),
+        "source_format": job.get("source_format"),
+        "source_codec": job.get("source_codec"),
     }
 
 
@@ -82,21 +125,37 @@ async def audio_download(audio_id: str):
     return FileResponse(job["filepath_mp3"], media_type="audio/mpeg")
 
 
+@api_router.get("/jobs/{job_id}/waveform")
+@api_router.get("/jobs/{job_id}/waveform/")
+async def job_waveform(job_id: str):
+    job = get_audio_job(job_id)
+    peaks_path = waveform.path_for(Path(job["filepath_mp3"])) if job and job.get("filepath_mp3") else None
+    if not peaks_path or not peaks_path.is_file():
+        raise HTTPException(status_code=404, detail="Waveform not ready")
+    return FileResponse(peaks_path, media_type="application/json", headers={"Cache-Control": waveform.CACHE_CONTROL})
+
+
+@api_router.get("/jobs/{job_id}/hls/{name}")
+async def job_hls(job_id: str, name: str):
+    job = get_audio_job(job_id)
+    path = hls.file_for(Path(job["filepath_mp3"]), name) if job and job.get("filepath_mp3") else None
+    if not path:
+        raise HTTPException(status_code=404, detail="HLS stream not ready")
+    return FileResponse(path, media_type=hls.media_type(name), headers={"Cache-Control": hls.CACHE_CONTROL})
+
+
 # --- Compatibility endpoints used by the frontend ---
-DATA_DIR = Path(os.getenv("DATA_DIR", str(AUDIO_DIR))).resolve()
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 
 @api_router.post("/jobs")
 @api_router.post("/jobs/")
-async def create_job(req: JobRequest, background_tasks: BackgroundTasks):
+async def create_job(req: JobRequest):
     source_url = req.url.strip()
     if not source_url:
         raise HTTPException(status_code=400, detail="URL is required")
 
-    job_id = create_audio_job(source_url)
-    background_tasks.add_task(audio_pipeline.process_audio_job, job_id)
-    return {"job_id": job_id}
+    job_id, position = _submit(source_url)
+    return {"job_id": job_id, "estimated_wait_s": round(audio_pipeline.estimated_wait(position), 1)}
 
 
 @api_router.get("/jobs/{job_id}")
@@ -105,6 +164,7 @@ async def job_status(job_id: str):
     job = get_audio_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    audio_pipeline.touch(job_id)
 
     download_ready = bool(job.get("filepath_mp3"))
 
@@ -117,9 +177,63 @@ async def job_status(job_id: str):
         "duration_s": job.get("duration_s"),
         "created_at": job.get("created_at").isoformat() if job.get("created_at") else None,
         "download_url": f"/api/download/{job_id}" if download_ready else None,
+        "timings": job.get("stage_timings"),
+        "bytes_downloaded": job.get("bytes_downloaded"),
+        "extractor": job.get("extractor"),
+        "source_format": job.get("source_format"),
+        "source_codec": job.get("source_codec"),
     }
 
 
+@api_router.delete("/jobs/{job_id}")
+@api_router.delete("/jobs/{job_id}/")
+async def cancel_job(job_id: str):
+    status = audio_pipeline.cancel_audio_job(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if status != "cancelled":
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return {"job_id": job_id, "status": status}
+
+
+@api_router.get("/admin/stats/stages", dependencies=[Depends(require_admin)])
+async def stage_stats_endpoint(group_by: str = "extractor"):
+    try:
+        return {"group_by": group_by, "groups": stage_stats(group_by)}
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@api_router.get("/admin/jobs", dependencies=[Depends(require_admin)])
+async def list_jobs_endpoint(
+    status: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    try:
+        jobs, next_cursor = await run_in_threadpool(
+            list_audio_jobs, status=status, since=since, until=until, cursor=cursor, limit=limit
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"jobs": jobs, "next_cursor": next_cursor}
+
+
+@api_router.get("/admin/profile", dependencies=[Depends(require_admin)])
+async def profile_process(
+    seconds: float = Query(10.0, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    thread: str | None = Query(None),
+):
+    try:
+        stacks = await run_in_threadpool(profiler.sample_stacks, seconds, interval_ms / 1000, thread)
+    except profiler.ProfilerBusyError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    return PlainTextResponse(stacks, headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'})
+
+
 @api_router.get("/download/{job_id}")
 @api_router.get("/download/{job_id}/")
 @api_router.head("/download/{job_id}")
@@ -157,5 +271,10 @@ def health_api():
     return {"ok": True}
 
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(api_router)
 
@@ -0,0 +1,7 @@
+"""Offline performance harnesses for the download pipelines and the HTTP API.
+
+Run them as modules from the repository root, for example
+``python -m benchmarks.pipeline --jobs 20 --concurrency 4``. They need no
+network access: media is generated locally and served from a loopback HTTP
+server.
+"""
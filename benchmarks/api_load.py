@@ -0,0 +1,275 @@
+"""Async load test of the job API with stubbed pipelines.
+
+Thousands of simulated clients run against an in-process ASGI app through
+``httpx.ASGITransport``. Each client submits a job, polls its status until it
+finishes and downloads the MP3, then starts over until ``--duration`` seconds
+have passed. The real queues and worker pools are used, but the processing
+step is replaced by a short sleep followed by copying a pre-generated MP3, so
+the numbers reflect handler cost rather than media work.
+
+Targets:
+
+``app``     ``app.main:app``
+``server``  ``backend.server:app`` (the deployed entrypoint)
+``backend`` ``backend.main:app``
+
+Reported per target and endpoint: request count, error rate, status codes and
+p50/p95/p99 latency. Because the load generator shares the event loop with the
+app, a sync call in an ``async`` handler stalls every client at once; a monitor
+task measures how late its timer wake-ups are, reported as event-loop lag.
+Example::
+
+    python -m benchmarks.api_load --target server --clients 2000 --duration 15 \\
+        --output bench/api-main.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from .fixtures import generate_audio
+from .report import compare, environment, latency_summary, write_results
+
+TARGETS = {
+    "app": "app.main",
+    "server": "backend.server",
+    "backend": "backend.main",
+}
+ENDPOINTS = ("submit", "status", "download")
+TERMINAL_STATUSES = ("done", "error", "cancelled")
+LAG_INTERVAL = 0.01
+
+
+class _EndpointStats:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors = 0
+
+    def summary(self) -> Dict[str, Any]:
+        count = len(self.latencies)
+        return {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else None,
+            "status_codes": {str(code): total for code, total in sorted(self.statuses.items())},
+            "latency_ms": latency_summary(self.latencies, scale=1000, digits=2),
+        }
+
+
+def _configure_environment(workdir: Path, clients: int, workers: int) -> None:
+    """Isolate the apps in ``workdir`` and lift limits that would reject the load.
+
+    Must run before the target is imported, since configuration is read at
+    import time.
+    """
+    os.environ.update(
+        DATA_DIR=str(workdir / "output"),
+        CONCURRENCY=str(workers),
+        MIN_WORKERS=str(workers),
+        MAX_WORKERS=str(workers),
+        AUDIO_WORKERS=str(workers),
+        QUEUE_MAX_DEPTH=str(2 * clients),
+        RATE_LIMIT_MAX=str(1_000_000),
+        IDLE_CANCEL_MINUTES="0",
+    )
+    # app.db keeps its database and output directory relative to the cwd.
+    os.chdir(workdir)
+
+
+def _stub_pipelines(target: str, mp3: Path, delay: float) -> None:
+    """Replace media processing with a sleep and a copy of ``mp3``."""
+    if target == "backend":
+        from backend import downloader
+        from backend.config import DATA_DIR
+
+        def probe_media(url: str) -> Dict[str, Any]:
+            return {"id": url.rsplit("=", 1)[-1], "title": "Load test", "duration": 30, "filesize": mp3.stat().st_size}
+
+        def process(job: Any, progress_cb: Callable[..., None]) -> Path:
+            progress_cb(50, "Téléchargement en cours…")
+            time.sleep(delay)
+            target_path = DATA_DIR / f"{job.id}.mp3"
+            shutil.copyfile(mp3, target_path)
+            return target_path
+
+        # The app's lifespan hands downloader.download_job to the job queue.
+        downloader.probe_media = probe_media
+        downloader.download_job = process
+        return
+
+    from app import audio_pipeline
+    from app.db import AUDIO_DIR, update_audio_job
+    from app.worker_pool import WorkerPool
+
+    def process_audio_job(audio_id: str) -> None:
+        update_audio_job(audio_id, status="downloading", progress=50)
+        time.sleep(delay)
+        target_path = AUDIO_DIR / f"{audio_id}.mp3"
+        shutil.copyfile(mp3, target_path)
+        update_audio_job(audio_id, status="done", progress=100, filepath_mp3=str(target_path))
+
+    audio_pipeline._pool = WorkerPool(
+        process_audio_job, audio_pipeline.AUDIO_WORKERS, max_depth=audio_pipeline.QUEUE_MAX_DEPTH
+    )
+
+
+async def _timed(stats: _EndpointStats, call: Awaitable[httpx.Response]) -> Optional[httpx.Response]:
+    started = time.perf_counter()
+    try:
+        response = await call
+    except Exception:
+        stats.latencies.append(time.perf_counter() - started)
+        stats.statuses["exception"] += 1
+        stats.errors += 1
+        return None
+    stats.latencies.append(time.perf_counter() - started)
+    stats.statuses[response.status_code] += 1
+    if response.status_code >= 400:
+        stats.errors += 1
+    return response
+
+
+async def _client(index: int, http: httpx.AsyncClient, stats: Dict[str, _EndpointStats],
+                  deadline: float, poll_interval: float) -> None:
+    loop = asyncio.get_running_loop()
+    cycle = 0
+    while loop.time() < deadline:
+        cycle += 1
+        url = f"https://www.youtube.com/watch?v=load-{index}-{cycle}"
+        response = await _timed(stats["submit"], http.post("/api/jobs", json={"url": url}))
+        if response is None or response.status_code != 200:
+            await asyncio.sleep(poll_interval)
+            continue
+        job_id = response.json()["job_id"]
+
+        status = None
+        while status not in TERMINAL_STATUSES and loop.time() < deadline:
+            await asyncio.sleep(poll_interval)
+            response = await _timed(stats["status"], http.get(f"/api/jobs/{job_id}"))
+            if response is not None and response.status_code == 200:
+                status = response.json()["status"]
+        if status == "done":
+            await _timed(stats["download"], http.get(f"/api/download/{job_id}"))
+
+
+async def _monitor_lag(samples: List[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, loop.time() - started - LAG_INTERVAL))
+
+
+async def run_target(app: Any, clients: int, duration: float, poll_interval: float,
+                     ramp_up: float) -> Dict[str, Any]:
+    """Drive ``app`` with ``clients`` concurrent clients and return per-endpoint results."""
+    stats = {name: _EndpointStats() for name in ENDPOINTS}
+    lag: List[float] = []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as http:
+            loop = asyncio.get_running_loop()
+            monitor = asyncio.create_task(_monitor_lag(lag, stop))
+            started = time.perf_counter()
+            deadline = loop.time() + duration
+
+            async def start_client(index: int) -> None:
+                await asyncio.sleep(ramp_up * index / clients)
+                await _client(index, http, stats, deadline, poll_interval)
+
+            await asyncio.gather(*(start_client(index) for index in range(clients)))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await monitor
+
+    total = sum(len(endpoint.latencies) for endpoint in stats.values())
+    errors = sum(endpoint.errors for endpoint in stats.values())
+    return {
+        "requests": total,
+        "requests_per_s": round(total / elapsed, 1) if elapsed else None,
+        "error_rate": round(errors / total, 4) if total else None,
+        "wall_s": round(elapsed, 3),
+        "endpoints": {name: endpoint.summary() for name, endpoint in stats.items()},
+        "event_loop_lag_ms": latency_summary(lag, scale=1000, digits=2),
+        "event_loop_blocked_s": round(sum(sample for sample in lag if sample > LAG_INTERVAL), 3),
+    }
+
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", choices=sorted(TARGETS), default="server")
+    parser.add_argument("--clients", type=int, default=1000, help="concurrent simulated clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="seconds over which clients start")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="seconds between status polls")
+    parser.add_argument("--workers", type=int, default=4, help="pipeline workers")
+    parser.add_argument("--processing-time", type=float, default=0.5, help="simulated seconds per job")
+    parser.add_argument("--file-duration", type=int, default=180, help="length in seconds of the served MP3")
+    parser.add_argument("--output", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="print changes relative to an earlier results file")
+    args = parser.parse_args(argv)
+    if args.clients < 1 or args.workers < 1:
+        parser.error("--clients and --workers must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    output = args.output.resolve() if args.output else None
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    cwd = os.getcwd()
+    workdir = Path(tempfile.mkdtemp(prefix="bench-api-"))
+    try:
+        _configure_environment(workdir, args.clients, args.workers)
+        mp3 = generate_audio(workdir / "fixture.mp3", args.file_duration, "mp3")
+        app = importlib.import_module(TARGETS[args.target]).app
+        _stub_pipelines(args.target, mp3, args.processing_time)
+        result = asyncio.run(
+            run_target(app, args.clients, args.duration, args.poll_interval, args.ramp_up)
+        )
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "api_load",
+        "environment": environment(),
+        "params": {
+            "target": args.target,
+            "clients": args.clients,
+            "duration_s": args.duration,
+            "ramp_up_s": args.ramp_up,
+            "poll_interval_s": args.poll_interval,
+            "workers": args.workers,
+            "processing_time_s": args.processing_time,
+            "file_duration_s": args.file_duration,
+        },
+        "results": {args.target: result},
+    }
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if output:
+        write_results(output, report)
+    if baseline:
+        print("\n".join(compare(baseline, report)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
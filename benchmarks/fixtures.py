@@ -0,0 +1,228 @@
+"""Local media fixtures for the benchmarks.
+
+``FixtureServer`` generates a sine-wave audio file with the bundled ffmpeg and
+serves it over loopback HTTP, honouring ``Range`` requests and optionally
+capping each connection's rate to mimic a throttled origin. Track pages live under ``/bench-track/<id>`` and
+are resolved by :class:`FixtureIE`, a stub yt-dlp extractor, into a single
+audio format pointing at the generated file. ``install_extractor`` makes every
+``YoutubeDL`` created afterwards in this process try the stub first, so the
+pipelines run unmodified against the fixture.
+"""
+
+from __future__ import annotations
+
+import functools
+import http.server
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+import imageio_ffmpeg
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+
+__all__ = ["FORMATS", "FixtureIE", "FixtureServer", "generate_audio", "install_extractor"]
+
+# Container and codec of the generated source, keyed by the --format option.
+FORMATS: Dict[str, Dict[str, Any]] = {
+    "wav": {"ext": "wav", "acodec": "pcm_s16le", "args": ["-c:a", "pcm_s16le"]},
+    "m4a": {"ext": "m4a", "acodec": "aac", "args": ["-c:a", "aac", "-b:a", "160k"]},
+    "webm": {"ext": "webm", "acodec": "opus", "args": ["-c:a", "libopus", "-b:a", "160k"]},
+    "mp3": {"ext": "mp3", "acodec": "mp3", "args": ["-c:a", "libmp3lame", "-b:a", "192k"]},
+}
+
+
+def generate_audio(path: Path, duration: int, media_format: str = "wav") -> Path:
+    """Write a stereo 440 Hz sine of ``duration`` seconds to ``path``."""
+    subprocess.run(
+        [
+            imageio_ffmpeg.get_ffmpeg_exe(),
+            "-y",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:sample_rate=44100:duration={duration}",
+            "-ac",
+            "2",
+            *FORMATS[media_format]["args"],
+            str(path),
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    return path
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def __init__(self, *args: Any, rate: int = 0, **kwargs: Any) -> None:
+        # Set before the base class handles the request from its __init__.
+        self.rate = rate
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self) -> None:
+        path = Path(self.translate_path(self.path))
+        if not path.is_file():
+            super().do_GET()
+            return
+        size = path.stat().st_size
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match[1])
+            end = min(int(match[2]) if match[2] else end, end)
+            if start > end:
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(str(path)))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        with path.open("rb") as source:
+            source.seek(start)
+            self._send_body(source, end - start + 1)
+
+    def _send_body(self, source: BinaryIO, length: int) -> None:
+        if not self.rate:
+            shutil.copyfileobj(source, self.wfile, length)
+            return
+        started = time.monotonic()
+        sent = 0
+        while sent < length:
+            data = source.read(min(64 * 1024, length - sent))
+            if not data:
+                break
+            self.wfile.write(data)
+            sent += len(data)
+            delay = sent / self.rate - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - stdlib signature
+        pass
+
+    def handle(self) -> None:
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class FixtureServer:
+    """Serve a generated audio file of ``duration`` seconds on 127.0.0.1.
+
+    ``connection_rate`` caps every connection at that many bytes per second;
+    0 serves as fast as possible.
+    """
+
+    def __init__(self, duration: int = 60, media_format: str = "wav", connection_rate: int = 0) -> None:
+        if media_format not in FORMATS:
+            raise ValueError(f"media_format must be one of: {', '.join(FORMATS)}")
+        self.duration = duration
+        self.media_format = media_format
+        self.connection_rate = connection_rate
+        self._tmpdir: Optional[tempfile.TemporaryDirectory] = None
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+        self.media_path: Optional[Path] = None
+
+    def __enter__(self) -> "FixtureServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="bench-media-")
+        root = Path(self._tmpdir.name)
+        spec = FORMATS[self.media_format]
+        self.media_path = root / "media" / f"fixture.{spec['ext']}"
+        self.media_path.parent.mkdir()
+        generate_audio(self.media_path, self.duration, self.media_format)
+        handler = functools.partial(_QuietHandler, directory=str(root), rate=self.connection_rate)
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="bench-fixture", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._tmpdir is not None:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+
+    @property
+    def base_url(self) -> str:
+        assert self._server is not None, "server not started"
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def track_url(self, track_id: str) -> str:
+        return f"{self.base_url}/bench-track/{track_id}"
+
+    @property
+    def media_url(self) -> str:
+        return f"{self.base_url}/media/{self.media_path.name}"
+
+    @property
+    def media_size(self) -> int:
+        return self.media_path.stat().st_size
+
+
+class FixtureIE(InfoExtractor):
+    """Resolve ``/bench-track/<id>`` pages of the active :class:`FixtureServer`."""
+
+    IE_NAME = "benchfixture"
+    _VALID_URL = r"https?://127\.0\.0\.1:\d+/bench-track/(?P<id>[\w-]+)"
+    _fixture: Optional[FixtureServer] = None
+
+    def _real_extract(self, url: str) -> Dict[str, Any]:
+        track_id = self._match_id(url)
+        fixture = self._fixture
+        spec = FORMATS[fixture.media_format]
+        return {
+            "id": track_id,
+            "title": f"Benchmark track {track_id}",
+            "uploader": "benchmarks",
+            "duration": fixture.duration,
+            "formats": [
+                {
+                    "format_id": fixture.media_format,
+                    "url": fixture.media_url,
+                    "ext": spec["ext"],
+                    "acodec": spec["acodec"],
+                    "vcodec": "none",
+                    "abr": 160,
+                    "filesize": fixture.media_size,
+                }
+            ],
+        }
+
+
+_installed = False
+
+
+def install_extractor(fixture: FixtureServer) -> None:
+    """Route fixture track URLs through :class:`FixtureIE` in every new ``YoutubeDL``."""
+    global _installed
+    FixtureIE._fixture = fixture
+    if _installed:
+        return
+    original = yt_dlp.YoutubeDL.add_default_info_extractors
+
+    def add_default_info_extractors(self: yt_dlp.YoutubeDL) -> None:
+        self.add_info_extractor(FixtureIE())
+        original(self)
+
+    yt_dlp.YoutubeDL.add_default_info_extractors = add_default_info_extractors
+    _installed = True
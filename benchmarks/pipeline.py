@@ -0,0 +1,243 @@
+"""End-to-end benchmark of the download pipelines against local fixture media.
+
+Each of ``--concurrency`` simulated clients submits a job for a fixture track,
+polls it until it finishes and submits the next one, until ``--jobs`` jobs have
+run. The ``backend`` pipeline is driven through :mod:`backend.jobs` (probe,
+queue, download, convert, tag) and the ``app`` pipeline through
+:mod:`app.audio_pipeline`; both use the real yt-dlp downloader and ffmpeg, with
+a stub extractor resolving the fixture URLs. Worker pools are pinned to the
+client concurrency.
+
+Reported per pipeline: jobs/sec, p50/p95/p99 end-to-end latency, CPU seconds
+per job (this process plus the ffmpeg children it waited for) and peak RSS of
+this process. Peak RSS is the high-water mark of the whole run, so benchmark
+one pipeline per process when comparing memory. ``--origin-rate`` throttles
+each connection to the fixture server, which is how a rate-limited origin
+behaves. Example::
+
+    python -m benchmarks.pipeline --pipeline backend --jobs 20 --concurrency 4 \\
+        --output bench/backend-main.json
+    python -m benchmarks.pipeline --pipeline backend --jobs 20 --concurrency 4 \\
+        --compare bench/backend-main.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import imageio_ffmpeg
+
+from .fixtures import FORMATS, FixtureServer, install_extractor
+from .report import compare, environment, latency_summary, write_results
+
+PIPELINES = ("backend", "app")
+TERMINAL_STATUSES = ("done", "error", "cancelled")
+POLL_INTERVAL = 0.02
+
+Outcome = Tuple[str, Optional[str]]
+
+
+def _configure_environment(workdir: Path, jobs: int, concurrency: int) -> None:
+    """Point both pipelines at ``workdir`` and pin their pools to ``concurrency``.
+
+    Must run before :mod:`backend` or :mod:`app` is imported, since both read
+    their configuration at import time.
+    """
+    os.environ.update(
+        DATA_DIR=str(workdir / "backend-output"),
+        CONCURRENCY=str(concurrency),
+        MIN_WORKERS=str(concurrency),
+        MAX_WORKERS=str(concurrency),
+        AUDIO_WORKERS=str(concurrency),
+        QUEUE_MAX_DEPTH=str(jobs + concurrency),
+        IDLE_CANCEL_MINUTES="0",
+        MAX_DURATION="0",
+        MAX_FILESIZE_MB="0",
+    )
+    # ffmpeg-python runs ``ffmpeg`` from PATH; fall back to the bundled binary.
+    if shutil.which("ffmpeg") is None:
+        bin_dir = workdir / "bin"
+        bin_dir.mkdir()
+        (bin_dir / "ffmpeg").symlink_to(imageio_ffmpeg.get_ffmpeg_exe())
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+    # app.db keeps its database and output directory relative to the cwd.
+    os.chdir(workdir)
+
+
+def _wait(poll: Callable[[], Outcome], timeout: float) -> Outcome:
+    deadline = time.monotonic() + timeout
+    while True:
+        status, message = poll()
+        if status in TERMINAL_STATUSES:
+            return status, message
+        if time.monotonic() > deadline:
+            return "timeout", f"not finished after {timeout:.0f}s (last status {status})"
+        time.sleep(POLL_INTERVAL)
+
+
+def _run_backend_job(url: str, timeout: float) -> Outcome:
+    from backend import downloader, jobs
+
+    info = downloader.probe_media(url)
+    job = jobs.Job(id=uuid.uuid4().hex, url=url, created_at=datetime.utcnow(), bitrate=192, info=info)
+    jobs.submit(job)
+
+    def poll() -> Outcome:
+        current = jobs.snapshot(job.id)
+        return current.status, current.message
+
+    return _wait(poll, timeout)
+
+
+def _run_app_job(url: str, timeout: float) -> Outcome:
+    from app import audio_pipeline, db
+
+    audio_id = db.create_audio_job(url)
+    audio_pipeline.enqueue(audio_id)
+
+    def poll() -> Outcome:
+        current = db.get_audio_job(audio_id)
+        return current["status"], current["message"]
+
+    return _wait(poll, timeout)
+
+
+def _start_pipeline(name: str) -> Callable[[str, float], Outcome]:
+    if name == "backend":
+        from backend import downloader, jobs
+
+        jobs.configure(downloader.download_job)
+        return _run_backend_job
+    return _run_app_job
+
+
+def _cpu_seconds(who: int) -> float:
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor, 1)
+
+
+def run_pipeline(name: str, fixture: FixtureServer, jobs: int, concurrency: int,
+                 warmup: int = 1, timeout: float = 300.0) -> Dict[str, Any]:
+    """Run ``jobs`` jobs through pipeline ``name`` and return its measurements."""
+    run_job = _start_pipeline(name)
+
+    def timed(index: int) -> Tuple[float, str, Optional[str]]:
+        started = time.perf_counter()
+        try:
+            status, message = run_job(fixture.track_url(f"{name}-{index}"), timeout)
+        except Exception as exc:  # probe or submission failures count as errors
+            status, message = "error", f"{type(exc).__name__}: {exc}"
+        return time.perf_counter() - started, status, message
+
+    for index in range(warmup):
+        timed(-1 - index)
+
+    cpu_before = (_cpu_seconds(resource.RUSAGE_SELF), _cpu_seconds(resource.RUSAGE_CHILDREN))
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench-client") as clients:
+        outcomes = list(clients.map(timed, range(jobs)))
+    wall = time.perf_counter() - started
+    cpu_self = _cpu_seconds(resource.RUSAGE_SELF) - cpu_before[0]
+    cpu_children = _cpu_seconds(resource.RUSAGE_CHILDREN) - cpu_before[1]
+
+    latencies = [elapsed for elapsed, status, _ in outcomes if status == "done"]
+    errors: List[str] = []
+    for _, status, message in outcomes:
+        if status != "done" and len(errors) < 5:
+            errors.append(f"{status}: {message}")
+    completed = len(latencies)
+    return {
+        "jobs": jobs,
+        "completed": completed,
+        "failed": jobs - completed,
+        "wall_s": round(wall, 3),
+        "jobs_per_s": round(completed / wall, 3) if wall else None,
+        "latency_s": latency_summary(latencies),
+        "cpu_s": {"process": round(cpu_self, 3), "children": round(cpu_children, 3)},
+        "cpu_s_per_job": round((cpu_self + cpu_children) / completed, 3) if completed else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "errors": errors,
+    }
+
+
+def _parse_args(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pipeline", choices=PIPELINES + ("all",), default="all")
+    parser.add_argument("--jobs", type=int, default=20, help="measured jobs per pipeline")
+    parser.add_argument("--concurrency", type=int, default=2, help="concurrent clients and pool workers")
+    parser.add_argument("--warmup", type=int, default=1, help="unmeasured jobs run first")
+    parser.add_argument("--duration", type=int, default=60, help="fixture length in seconds")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="wav", help="fixture container")
+    parser.add_argument("--origin-rate", type=int, default=0,
+                        help="per-connection cap of the fixture server in KiB/s (0: unthrottled)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per-job timeout in seconds")
+    parser.add_argument("--output", type=Path, help="write results as JSON to this file")
+    parser.add_argument("--compare", type=Path, help="print changes relative to an earlier results file")
+    args = parser.parse_args(argv)
+    if args.jobs < 1 or args.concurrency < 1:
+        parser.error("--jobs and --concurrency must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    output = args.output.resolve() if args.output else None
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    pipelines = PIPELINES if args.pipeline == "all" else (args.pipeline,)
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    cwd = os.getcwd()
+    workdir = Path(tempfile.mkdtemp(prefix="bench-pipeline-"))
+    try:
+        _configure_environment(workdir, args.jobs + args.warmup, args.concurrency)
+        with FixtureServer(args.duration, args.format, args.origin_rate * 1024) as fixture:
+            install_extractor(fixture)
+            results = {
+                name: run_pipeline(name, fixture, args.jobs, args.concurrency, args.warmup, args.timeout)
+                for name in pipelines
+            }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "benchmark": "pipeline",
+        "environment": environment(),
+        "params": {
+            "jobs": args.jobs,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "media_duration_s": args.duration,
+            "media_format": args.format,
+            "origin_rate_kib_s": args.origin_rate,
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2, sort_keys=True))
+    if output:
+        write_results(output, report)
+    if baseline:
+        print("\n".join(compare(baseline, report)))
+    return 0 if all(result["failed"] == 0 for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Summaries and JSON result files shared by the benchmarks."""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+__all__ = ["compare", "environment", "latency_summary", "percentile", "write_results"]
+
+
+def percentile(values: Sequence[float], pct: float) -> Optional[float]:
+    """Return the nearest-rank ``pct`` percentile of ``values``."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def latency_summary(values: Sequence[float], scale: float = 1.0, digits: int = 3) -> Dict[str, Optional[float]]:
+    """Return count, mean, p50/p95/p99 and max of ``values`` multiplied by ``scale``."""
+
+    def _round(value: Optional[float]) -> Optional[float]:
+        return None if value is None else round(value * scale, digits)
+
+    return {
+        "count": len(values),
+        "mean": _round(sum(values) / len(values)) if values else None,
+        "p50": _round(percentile(values, 50)),
+        "p95": _round(percentile(values, 95)),
+        "p99": _round(percentile(values, 99)),
+        "max": _round(max(values)) if values else None,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    """Describe the code version and machine a run was made on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).resolve().parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: Path, results: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+def _numeric_leaves(data: Any, prefix: str = "") -> Iterable[tuple]:
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield from _numeric_leaves(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(data, (int, float)) and not isinstance(data, bool):
+        yield prefix, data
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Return one line per result metric present in both runs with its relative change."""
+    old = dict(_numeric_leaves(baseline.get("results", {})))
+    lines = []
+    for key, value in _numeric_leaves(current.get("results", {})):
+        if key not in old:
+            continue
+        before = old[key]
+        change = f"{(value - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"{key}: {before} -> {value} ({change})")
+    return lines
@@ -0,0 +1,107 @@
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app import admission, audio_pipeline
+
+
+@pytest.fixture
+def app_queue(monkeypatch):
+    """Stub the app pipeline's queue: ``queued`` holds the enqueued job ids."""
+    queued = []
+    ids = itertools.count()
+
+    def enqueue(audio_id):
+        time.sleep(0.001)  # widen the window between the check and the insert
+        queued.append(audio_id)
+        return len(queued) - 1
+
+    monkeypatch.setattr(admission, "QUEUE_MAX_DEPTH", 3)
+    monkeypatch.setattr(audio_pipeline, "create_audio_job", lambda url: f"job-{next(ids)}")
+    monkeypatch.setattr(audio_pipeline, "enqueue", enqueue)
+    monkeypatch.setattr(audio_pipeline._pool, "depth", lambda: len(queued))
+    return queued
+
+
+def test_full_queue_is_rejected_with_retry_after(app_queue):
+    from backend import server
+
+    for _ in range(3):
+        asyncio.run(server.submit_audio(server.SubmitRequest(url="https://example.com/a")))
+
+    with pytest.raises(HTTPException) as caught:
+        asyncio.run(server.submit_audio(server.SubmitRequest(url="https://example.com/a")))
+    assert caught.value.status_code == 503
+    assert int(caught.value.headers["Retry-After"]) >= 1
+
+
+def test_concurrent_submissions_do_not_overshoot_the_queue(app_queue):
+    accepted = []
+    barrier = threading.Barrier(16)
+
+    def submit():
+        barrier.wait()
+        try:
+            accepted.append(audio_pipeline.submit("https://example.com/a"))
+        except admission.QueueFullError:
+            pass
+
+    threads = [threading.Thread(target=submit) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(accepted) == len(app_queue) == 3
+
+
+def test_job_that_cannot_be_queued_is_not_left_queued(monkeypatch):
+    rows = {}
+
+    def create(url):
+        rows["job"] = {"status": "queued"}
+        return "job"
+
+    def enqueue(audio_id):
+        raise RuntimeError("worker pool is shut down")
+
+    monkeypatch.setattr(audio_pipeline, "create_audio_job", create)
+    monkeypatch.setattr(audio_pipeline, "update_audio_job", lambda audio_id, **fields: rows[audio_id].update(fields))
+    monkeypatch.setattr(audio_pipeline, "enqueue", enqueue)
+
+    with pytest.raises(RuntimeError):
+        audio_pipeline.submit("https://example.com/a")
+    assert rows["job"]["status"] == "error"
+
+def test_backend_rejects_full_queue_and_oversized_media(monkeypatch):
+    from backend import downloader, jobs, main
+
+    request = Request({"type": "http", "client": ("203.0.113.7", 1234), "headers": []})
+    monkeypatch.setattr(jobs, "rate_limit_exceeded", lambda client_ip: False)
+
+    monkeypatch.setattr(jobs, "queue_depth", lambda: admission.QUEUE_MAX_DEPTH)
+    with pytest.raises(HTTPException) as caught:
+        asyncio.run(main.create_job(request, {"url": "https://example.com/a"}))
+    assert caught.value.status_code == 503
+    assert caught.value.detail["error"]["code"] == "QUEUE_FULL"
+    assert "Retry-After" in caught.value.headers
+
+    monkeypatch.setattr(jobs, "queue_depth", lambda: 0)
+    monkeypatch.setattr(admission, "MAX_DURATION", 60)
+    monkeypatch.setattr(downloader, "probe_media", lambda url: {"duration": 3600, "filesize": None})
+    with pytest.raises(HTTPException) as caught:
+        asyncio.run(main.create_job(request, {"url": "https://example.com/a"}))
+    assert caught.value.status_code == 413
+    assert caught.value.detail["error"]["code"] == "MEDIA_TOO_LARGE"
+
+
+def test_media_limits_name_the_exceeded_limit(monkeypatch):
+    monkeypatch.setattr(admission, "MAX_FILESIZE", 1024)
+    with pytest.raises(admission.MediaTooLargeError) as caught:
+        admission.check_media_limits({"duration": 10, "filesize_approx": 4096})
+    assert caught.value.limit == "filesize"
+    admission.check_media_limits({"duration": 10, "filesize": 512})
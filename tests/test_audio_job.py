@@ -2,7 +2,6 @@ import asyncio
 import importlib
 import sys
 import types
-from fastapi import BackgroundTasks
 
 
 def test_submit_audio_without_mongo_env(tmp_path, monkeypatch):
@@ -21,9 +20,10 @@ def test_submit_audio_without_mongo_env(tmp_path, monkeypatch):
     )
     server = importlib.import_module("backend.server")
     importlib.reload(server)
+    monkeypatch.setattr(server.audio_pipeline, "enqueue", lambda audio_id: 0)
 
     req = server.SubmitRequest(url="http://example.com")
-    result = asyncio.run(server.submit_audio(req, BackgroundTasks()))
+    result = asyncio.run(server.submit_audio(req))
     assert result["status"] == "queued"
     assert "audio_id" in result
 
@@ -46,7 +46,7 @@ def test_audio_download_serves_mp3(tmp_path, monkeypatch):
 
     dummy_mp3 = tmp_path / "song.mp3"
     dummy_mp3.write_bytes(b"ID3")
-    audio_id = server.create_audio_job("http://example.com")
+    audio_id = db_module.create_audio_job("http://example.com")
     db_module.update_audio_job(audio_id, filepath_mp3=str(dummy_mp3), status="done")
     response = asyncio.run(server.audio_download(audio_id))
     assert response.media_type == "audio/mpeg"
@@ -0,0 +1,27 @@
+import time
+from datetime import datetime
+
+from app import bandwidth
+
+
+def test_budget_follows_peak_hours_and_reserve(monkeypatch):
+    """Peak hours may wrap past midnight; the serving reserve is kept out of the budget."""
+    monkeypatch.setattr(bandwidth, "BANDWIDTH_LIMIT_MBIT", 80.0)
+    monkeypatch.setattr(bandwidth, "BANDWIDTH_OFFPEAK_LIMIT_MBIT", 0.0)
+    monkeypatch.setattr(bandwidth, "BANDWIDTH_PEAK_HOURS", (18, 2))
+    monkeypatch.setattr(bandwidth, "BANDWIDTH_SERVE_RESERVE", 0.25)
+    assert bandwidth.download_budget(datetime(2024, 1, 1, 23)) == 7_500_000
+    assert bandwidth.download_budget(datetime(2024, 1, 1, 1)) == 7_500_000
+    assert bandwidth.download_budget(datetime(2024, 1, 1, 12)) is None
+
+
+def test_shares_split_the_budget(monkeypatch):
+    """Two active downloads each get half of the budget."""
+    monkeypatch.setattr(bandwidth, "download_budget", lambda now=None: 2_000_000.0)
+    with bandwidth.share() as first, bandwidth.share():
+        started = time.monotonic()
+        for _ in range(4):
+            first.consume(100_000)
+        elapsed = time.monotonic() - started
+    # 400 kB at 1 MB/s, less what the share may bank up front.
+    assert 0.35 <= elapsed < 1.0
@@ -1,8 +1,13 @@
+import asyncio
+import csv
 import importlib
+import json
 import sys
+from datetime import date
 from typing import Callable
 
 import pytest
+from fastapi.responses import Response
 
 
 @pytest.fixture
@@ -23,9 +28,14 @@ def budget_endpoints(tmp_path, monkeypatch):
                 return route.endpoint
         raise AssertionError(f"Endpoint {method} {path} not found")
 
+    create = get_endpoint("POST", "/budget-items")
     return {
-        "create": get_endpoint("POST", "/budget-items"),
+        "create": lambda payload, response=None: create(payload, response or Response()),
         "list": get_endpoint("GET", "/budget-items"),
+        "export": get_endpoint("GET", "/budget-items/export"),
+        "summary": get_endpoint("GET", "/budget-items/summary"),
+        "categories": get_endpoint("GET", "/budget-items/summary/categories"),
+        "months": get_endpoint("GET", "/budget-items/summary/months"),
         "payload_model": budget_api.BudgetItemPayload,
     }
 
@@ -40,8 +50,8 @@ def test_create_budget_item_success(budget_endpoints):
     assert item["category"] == "Courses"
     assert "id" in item
 
-    list_response = budget_endpoints["list"]()
-    items = list_response["items"]
+    list_response = budget_endpoints["list"](if_none_match=None)
+    items = json.loads(list_response.body)["items"]
     assert any(entry["id"] == item["id"] for entry in items)
 
 
@@ -70,3 +80,110 @@ def test_create_budget_item_requires_name(budget_endpoints):
     with pytest.raises(Exception) as exc_info:
         budget_endpoints["create"](payload)
     assert getattr(exc_info.value, "status_code", 400) == 400
+
+
+def test_list_budget_items_supports_etag(budget_endpoints):
+    payload_model = budget_endpoints["payload_model"]
+    budget_endpoints["create"](payload_model(name="Loyer", amount=800))
+    first = budget_endpoints["list"](if_none_match=None)
+    etag = first.headers["etag"]
+
+    assert budget_endpoints["list"](if_none_match=etag).status_code == 304
+    assert budget_endpoints["list"](if_none_match=f"W/{etag}").status_code == 304
+
+    budget_endpoints["create"](payload_model(name="Courses", amount=120))
+    changed = budget_endpoints["list"](if_none_match=etag)
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert [item["name"] for item in json.loads(changed.body)["items"]] == ["Loyer", "Courses"]
+
+
+def test_list_budget_items_paginates_and_filters(budget_endpoints):
+    payload_model = budget_endpoints["payload_model"]
+    for index in range(5):
+        budget_endpoints["create"](
+            payload_model(name=f"Courses {index}", amount=10, category="Courses", createdAt=f"2024-0{index + 1}-15T10:00:00")
+        )
+    budget_endpoints["create"](payload_model(name="Salaire", amount=2000, type="income", createdAt="2024-03-01T09:00:00"))
+
+    def page(**params):
+        response = budget_endpoints["list"](if_none_match=None, **params)
+        return json.loads(response.body)
+
+    first = page(limit=2, category="Courses")
+    assert [item["name"] for item in first["items"]] == ["Courses 0", "Courses 1"]
+    second = page(cursor=first["next_cursor"], limit=2, category="Courses")
+    third = page(cursor=second["next_cursor"], limit=2, category="Courses")
+    assert [item["name"] for item in second["items"] + third["items"]] == ["Courses 2", "Courses 3", "Courses 4"]
+    assert third["next_cursor"] is None
+
+    march = page(start=date(2024, 3, 1), end=date(2024, 3, 31))
+    assert [item["name"] for item in march["items"]] == ["Courses 2", "Salaire"]
+    assert [item["name"] for item in page(type="income")["items"]] == ["Salaire"]
+
+    with pytest.raises(Exception) as exc_info:
+        page(limit=1000)
+    assert exc_info.value.status_code == 400
+
+
+def test_summaries_follow_writes(budget_endpoints):
+    payload_model = budget_endpoints["payload_model"]
+    budget_endpoints["create"](payload_model(id="rent", name="Loyer", amount=800, category="Logement", createdAt="2024-01-05"))
+    budget_endpoints["create"](payload_model(name="Salaire", amount=2500, type="income", category="Revenus", createdAt="2024-02-01"))
+    # Re-saving an item replaces its previous contribution.
+    budget_endpoints["create"](payload_model(id="rent", name="Loyer", amount=850, category="Logement", createdAt="2024-02-05"))
+
+    summary = budget_endpoints["summary"](if_none_match=None)
+    assert json.loads(summary.body) == {"income": 2500.0, "expense": 850.0, "balance": 1650.0, "count": 2}
+    assert budget_endpoints["summary"](if_none_match=summary.headers["etag"]).status_code == 304
+
+    categories = json.loads(budget_endpoints["categories"](if_none_match=None).body)["categories"]
+    assert [(entry["category"], entry["expense"], entry["income"]) for entry in categories] == [
+        ("Logement", 850.0, 0.0),
+        ("Revenus", 0.0, 2500.0),
+    ]
+    months = json.loads(budget_endpoints["months"](if_none_match=None).body)["months"]
+    assert [(entry["month"], entry["balance"], entry["count"]) for entry in months] == [("2024-02", 1650.0, 2)]
+
+
+def test_create_with_an_existing_id_replaces_the_item(budget_endpoints):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app import budget_api
+
+    app = FastAPI()
+    app.include_router(budget_api.create_budget_router(), prefix="/api")
+    client = TestClient(app)
+
+    created = client.post("/api/budget-items", json={"name": "Loyer", "amount": 800})
+    assert created.status_code == 201
+    item_id = created.json()["item"]["id"]
+    replaced = client.post("/api/budget-items", json={"id": item_id, "name": "Loyer", "amount": 850})
+    assert replaced.status_code == 200
+
+    items = client.get("/api/budget-items").json()["items"]
+    assert [(entry["id"], entry["amount"]) for entry in items] == [(item_id, 850.0)]
+
+def test_export_streams_filtered_items(budget_endpoints):
+    payload_model = budget_endpoints["payload_model"]
+    budget_endpoints["create"](payload_model(name="Loyer", amount=800, category="Logement", description='Mai, "avance"'))
+    budget_endpoints["create"](payload_model(name="Courses", amount=120, category="Maison"))
+    budget_endpoints["create"](payload_model(name="Salaire", amount=2500, type="income", category="Logement"))
+
+    async def collect(response):
+        return b"".join([chunk async for chunk in response.body_iterator]).decode("utf-8")
+
+    def export(**params):
+        filters = {"category": None, "type": None, "start": None, "end": None, **params}
+        return asyncio.run(collect(budget_endpoints["export"](**filters)))
+
+    rows = list(csv.DictReader(export(format="csv", category="Logement").lstrip("\ufeff").splitlines()))
+    assert [(row["name"], row["amount"], row["type"]) for row in rows] == [
+        ("Loyer", "800.0", "expense"),
+        ("Salaire", "2500.0", "income"),
+    ]
+    assert rows[0]["description"] == 'Mai, "avance"'
+
+    lines = export(format="jsonl", type="expense").splitlines()
+    assert [json.loads(line)["name"] for line in lines] == ["Loyer", "Courses"]
@@ -0,0 +1,43 @@
+import importlib
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def modules(tmp_path, monkeypatch):
+    monkeypatch.setenv("BUDGET_STORAGE_PATH", str(tmp_path / "budget.json"))
+    for module in ["app.budget_store", "app.budget_import"]:
+        sys.modules.pop(module, None)
+    return importlib.import_module("app.budget_store"), importlib.import_module("app.budget_import")
+
+
+def _chunks(text, size=7):
+    data = text.encode("utf-8")
+    return [data[index:index + size] for index in range(0, len(data), size)]
+
+
+def test_csv_upload_is_imported_in_one_batch(modules):
+    budget_store, budget_import = modules
+    upload = '\ufeffname;amount;category\nLoyer;"1 234,56 €";Logement\n\nCourses;-12.5;"Maison\nCourses"\n'
+
+    result = budget_import.import_items(budget_import.read_records(_chunks(upload)))
+
+    assert result.imported == 2
+    items = budget_store.list_items()
+    assert [(item["name"], item["amount"], item["category"]) for item in items] == [
+        ("Loyer", 1234.56, "Logement"),
+        ("Courses", -12.5, "Maison\nCourses"),
+    ]
+
+
+def test_invalid_rows_are_reported_and_nothing_is_stored(modules):
+    budget_store, budget_import = modules
+    upload = '{"name": "Loyer", "amount": 800}\n{"name": "Courses", "amount": "abc"}\n{oops\n'
+
+    result = budget_import.import_items(budget_import.read_records(_chunks(upload)))
+
+    assert result.imported == 0
+    assert [error["line"] for error in result.errors] == [2, 3]
+    assert result.errors[0]["error"] == "Le montant doit être un nombre."
+    assert budget_store.list_items() == []
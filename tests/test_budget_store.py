@@ -0,0 +1,153 @@
+import asyncio
+import importlib
+import json
+import sys
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def open_store(tmp_path, monkeypatch):
+    storage_path = tmp_path / "budget.json"
+    monkeypatch.setenv("BUDGET_STORAGE_PATH", str(storage_path))
+
+    def reopen():
+        sys.modules.pop("app.budget_store", None)
+        return importlib.import_module("app.budget_store")
+
+    return storage_path, reopen
+
+
+def test_legacy_json_is_imported_once(open_store):
+    legacy_path, reopen = open_store
+    legacy = [{"id": "a", "name": "Loyer", "amount": 800.0}, {"id": "b", "name": "Courses", "amount": 120.0}]
+    legacy_path.write_text(json.dumps(legacy), encoding="utf-8")
+
+    store = reopen()
+    assert [item["id"] for item in store.list_items()] == ["a", "b"]
+    store.create_item({"name": "Internet", "amount": 30})
+
+    assert [item["id"] for item in reopen().list_items()][:2] == ["a", "b"]
+    assert len(reopen().list_items()) == 3
+    assert json.loads(legacy_path.read_text(encoding="utf-8")) == legacy
+
+
+def test_torn_final_line_is_dropped(open_store):
+    legacy_path, reopen = open_store
+    log_path = legacy_path.with_suffix(".jsonl")
+    log_path.write_text('{"id": "a", "name": "Loyer", "amount": 800.0}\n{"id": "b", "na', encoding="utf-8")
+
+    store = reopen()
+    assert [item["id"] for item in store.list_items()] == ["a"]
+    store.create_item({"id": "c", "name": "Internet", "amount": 30})
+    assert [item["id"] for item in reopen().list_items()] == ["a", "c"]
+
+
+def test_compaction_keeps_latest_version_of_each_item(open_store):
+    legacy_path, reopen = open_store
+    store = reopen()
+    for amount in range(5):
+        store.create_item({"id": "a", "name": "Loyer", "amount": amount})
+    store.create_item({"id": "b", "name": "Courses", "amount": 10})
+
+    store.compact()
+    lines = legacy_path.with_suffix(".jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["amount"] for line in lines] == [4.0, 10.0]
+    store.create_item({"id": "c", "name": "Internet", "amount": 30})
+    assert [item["id"] for item in reopen().list_items()] == ["a", "b", "c"]
+
+
+def test_appends_during_compaction_are_kept(open_store, monkeypatch):
+    legacy_path, reopen = open_store
+    store = reopen()
+    for amount in range(5):
+        store.create_item({"id": "a", "name": "Loyer", "amount": amount})
+    other_process = reopen()
+    other_process.load()
+
+    written, resume = threading.Event(), threading.Event()
+    write_log = store._write_log
+
+    def slow_write_log(path, items):
+        write_log(path, items)
+        written.set()
+        resume.wait(5)
+
+    monkeypatch.setattr(store, "_write_log", slow_write_log)
+    compaction = threading.Thread(target=store.compact)
+    compaction.start()
+    assert written.wait(5)
+    store.create_item({"id": "b", "name": "Courses", "amount": 10})
+    other_process.create_item({"id": "c", "name": "Internet", "amount": 30})
+    store.compact()  # returns at once while the first compaction runs
+    resume.set()
+    compaction.join()
+
+    lines = legacy_path.with_suffix(".jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["a", "b", "c"]
+    assert [item["id"] for item in store.list_items()] == ["a", "b", "c"]
+    assert [item["id"] for item in other_process.list_items()] == ["a", "b", "c"]
+
+def test_sqlite_backend_migrates_log_once(open_store, monkeypatch):
+    legacy_path, reopen = open_store
+    log_path = legacy_path.with_suffix(".jsonl")
+    log_path.write_text(
+        '{"id": "a", "name": "Loyer", "amount": 800.0, "category": "Logement", "createdAt": "2024-01-05"}\n'
+        '{"id": "b", "name": "Salaire", "amount": 2500.0, "type": "income", "createdAt": "2024-01-28"}\n',
+        encoding="utf-8",
+    )
+    monkeypatch.setenv("BUDGET_STORAGE_BACKEND", "sqlite")
+
+    store = reopen()
+    assert [item["id"] for item in store.list_items()] == ["a", "b"]
+    assert store.save_item({"id": "a", "name": "Loyer", "amount": 850, "category": "Logement", "createdAt": "2024-02-05"})[1]
+    store.create_item({"id": "c", "name": "Courses", "amount": 60, "category": "Maison", "createdAt": "2024-02-10"})
+
+    snapshot = reopen().snapshot()
+    assert [item["id"] for item in snapshot.items] == ["a", "b", "c"]
+    assert snapshot.aggregates["totals"] == {"income": 2500.0, "expense": 910.0, "balance": 1590.0, "count": 3}
+    assert [entry["month"] for entry in snapshot.aggregates["months"]] == ["2024-01", "2024-02"]
+
+    items, cursor = snapshot.page(limit=1, kind="expense", start="2024-02-01", end="2024-02-28")
+    assert [item["id"] for item in items] == ["a"]
+    items, cursor = snapshot.page(cursor, limit=1, kind="expense", start="2024-02-01", end="2024-02-28")
+    assert [item["id"] for item in items] == ["c"] and cursor is None
+
+
+
+def test_sqlite_snapshot_serves_nothing_newer_than_its_etag(open_store, monkeypatch):
+    monkeypatch.setenv("BUDGET_STORAGE_BACKEND", "sqlite")
+    _, reopen = open_store
+    store = reopen()
+    store.create_item({"id": "a", "name": "Loyer", "amount": 800, "category": "Logement", "createdAt": "2024-01-05"})
+    store.create_item({"id": "b", "name": "Courses", "amount": 60, "category": "Maison", "createdAt": "2024-01-10"})
+
+    snapshot = store.snapshot()
+    store.create_item({"id": "c", "name": "Essence", "amount": 70, "category": "Maison", "createdAt": "2024-01-12"})
+
+    assert store.snapshot().etag != snapshot.etag
+    assert [item["id"] for item in json.loads(snapshot.body())["items"]] == ["a", "b"]
+    items, cursor = snapshot.page(limit=1)
+    assert [item["id"] for item in items] == ["a"]
+    items, cursor = snapshot.page(cursor, limit=1)
+    assert [item["id"] for item in items] == ["b"] and cursor is None
+    assert [item["id"] for item in snapshot.iter_items(category="Maison")] == ["b"]
+    assert [item["id"] for item in store.snapshot().iter_items(category="Maison")] == ["b", "c"]
+
+@pytest.mark.parametrize("module", ["app.main", "backend.server"])
+def test_app_startup_opens_the_store(module, monkeypatch, tmp_path):
+    server = importlib.import_module(module)
+    opened = []
+    monkeypatch.setattr(server, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(server.budget_store, "load", lambda: opened.append(True))
+    for name in ("init_db", "start_retention"):
+        monkeypatch.setattr(server, name, lambda: None)
+    monkeypatch.setattr(server.audio_pipeline, "start_idle_reaper", lambda: None)
+    monkeypatch.setattr(server.audio_pipeline, "shutdown", lambda: None)
+
+    async def start_and_stop():
+        async with server.lifespan(server.app):
+            assert opened == [True]
+
+    asyncio.run(start_and_stop())
@@ -0,0 +1,88 @@
+import asyncio
+import sys
+import threading
+import time
+
+import pytest
+
+from app import audio_pipeline
+from app.worker_pool import WorkerPool
+
+SLEEPER = [sys.executable, "-c", "import time; time.sleep(30)"]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Run a stand-in job on a one-worker pool: it converts by running a subprocess."""
+    store = {}
+    running = threading.Event()
+    stopped = {}
+
+    def update(audio_id, **fields):
+        store[audio_id].update(fields)
+
+    def run(audio_id):
+        try:
+            audio_pipeline._set_status(audio_id, status="converting")
+            running.set()
+            audio_pipeline._run_ffmpeg(audio_id, SLEEPER)
+        except audio_pipeline.JobCancelled as exc:
+            stopped[audio_id] = time.monotonic()
+            update(audio_id, status="cancelled", message=str(exc))
+
+    monkeypatch.setattr(audio_pipeline, "get_audio_job", lambda audio_id: store.get(audio_id))
+    monkeypatch.setattr(audio_pipeline, "update_audio_job", update)
+    monkeypatch.setattr(audio_pipeline, "_pool", WorkerPool(run, 1))
+    monkeypatch.setattr(audio_pipeline, "IDLE_CANCEL_MINUTES", 1)
+
+    def submit(audio_id):
+        store[audio_id] = {"id": audio_id, "status": "queued"}
+        audio_pipeline.enqueue(audio_id)
+
+    yield store, submit, running, stopped
+    for audio_id in list(store):
+        audio_pipeline.cancel_audio_job(audio_id)
+
+
+def test_delete_cancels_queued_and_running_jobs(pipeline):
+    from app import main
+
+    store, submit, running, stopped = pipeline
+    submit("running")
+    assert running.wait(5)
+    submit("queued")
+
+    assert asyncio.run(main.cancel_job("queued")) == {"job_id": "queued", "status": "cancelled"}
+    assert audio_pipeline.queue_depth() == 0 and store["queued"]["status"] == "cancelled"
+
+    cancelled_at = time.monotonic()
+    assert asyncio.run(main.cancel_job("running"))["status"] == "cancelled"
+    deadline = time.monotonic() + 5
+    while "running" not in stopped and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stopped["running"] - cancelled_at < 5
+    assert store["running"]["status"] == "cancelled"
+
+
+def test_status_update_after_cancel_is_not_written(pipeline):
+    store, submit, running, stopped = pipeline
+    store["job"] = {"id": "job", "status": "downloading"}
+    audio_pipeline.cancel_audio_job("job", "Cancelled by test")
+
+    with pytest.raises(audio_pipeline.JobCancelled):
+        audio_pipeline._set_status("job", status="converting", progress=90)
+    assert store["job"]["status"] == "cancelled"
+
+
+def test_abandoned_jobs_are_cancelled(pipeline):
+    store, submit, running, stopped = pipeline
+    submit("watched")
+    assert running.wait(5)
+    submit("abandoned")
+    audio_pipeline.touch("watched")
+
+    audio_pipeline._reap_idle(time.monotonic() + 30)
+    assert store["abandoned"]["status"] == "queued"
+    audio_pipeline._reap_idle(time.monotonic() + 61)
+    assert store["abandoned"]["status"] == "cancelled"
+    assert store["abandoned"]["message"] == "Cancelled: abandoned by client"
@@ -0,0 +1,113 @@
+import importlib
+import json
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AUDIO_RETENTION_DAYS", "7")
+    monkeypatch.setenv("AUDIO_RETENTION_BATCH", "2")
+    monkeypatch.setenv("AUDIO_ARCHIVE_PATH", str(tmp_path / "archive.jsonl"))
+    sys.modules.pop("app.db", None)
+    module = importlib.import_module("app.db")
+    module.init_db()
+    return module
+
+
+def _add_job(db, created_at, status):
+    audio_id = db.create_audio_job("https://example.com/" + created_at.isoformat())
+    db.update_audio_job(audio_id, created_at=created_at.isoformat(), status=status)
+    return audio_id
+
+
+def test_list_audio_jobs_pages_newest_first(db):
+    start = datetime(2024, 1, 1)
+    ids = [_add_job(db, start + timedelta(hours=hour), "done" if hour % 2 else "error") for hour in range(5)]
+
+    page, cursor = db.list_audio_jobs(limit=2)
+    assert [job["id"] for job in page] == [ids[4], ids[3]]
+    page, cursor = db.list_audio_jobs(limit=2, cursor=cursor)
+    assert [job["id"] for job in page] == [ids[2], ids[1]]
+    page, cursor = db.list_audio_jobs(limit=2, cursor=cursor)
+    assert [job["id"] for job in page] == [ids[0]] and cursor is None
+
+    page, _ = db.list_audio_jobs(status="done", since=start + timedelta(hours=2))
+    assert [job["id"] for job in page] == [ids[3]]
+    with pytest.raises(ValueError):
+        db.list_audio_jobs(cursor="nonsense")
+
+
+def test_purge_expired_archives_rows_and_removes_mp3s(db, tmp_path):
+    now = datetime(2024, 6, 1)
+    old = [_add_job(db, now - timedelta(days=30 + day), "done") for day in range(3)]
+    stale = _add_job(db, now - timedelta(days=2), "downloading")
+    running = _add_job(db, now - timedelta(hours=1), "converting")
+    recent = _add_job(db, now - timedelta(days=1), "done")
+    mp3 = tmp_path / "kept-elsewhere.mp3"
+    mp3.write_bytes(b"ID3")
+    db.update_audio_job(old[0], filepath_mp3=str(mp3))
+
+    assert db.purge_expired(now) == 4
+
+    assert not mp3.exists()
+    remaining = {job["id"] for job in db.list_audio_jobs()[0]}
+    assert remaining == {running, recent}
+    archived = [json.loads(line)["id"] for line in (tmp_path / "archive.jsonl").read_text().splitlines()]
+    assert sorted(archived) == sorted(old + [stale])
+
+
+def test_stage_stats_averages_finished_jobs_per_group(db):
+    def finished(extractor, probe, download, convert, size, status="done"):
+        audio_id = _add_job(db, datetime(2024, 1, 1), status)
+        timings = {"probe": {"duration_s": probe}, "download": {"duration_s": download}}
+        db.update_audio_job(
+            audio_id,
+            extractor=extractor,
+            bytes_downloaded=size,
+            stage_timings=json.dumps(timings),
+            probe_s=probe,
+            download_s=download,
+            convert_s=convert,
+        )
+
+    finished("Youtube", 1.0, 4.0, 10.0, 4000)
+    finished("Youtube", 3.0, 6.0, 20.0, 6000)
+    finished("Vimeo", 0.5, 2.0, 1.0, 1000)
+    finished("Vimeo", 9.0, 9.0, 9.0, 9, status="error")
+
+    youtube, vimeo = db.stage_stats()
+    assert youtube == {
+        "extractor": "Youtube",
+        "jobs": 2,
+        "probe_s": 2.0,
+        "download_s": 5.0,
+        "convert_s": 15.0,
+        "avg_bytes_downloaded": 5000.0,
+        "download_bytes_per_s": 1000.0,
+    }
+    assert vimeo["jobs"] == 1 and vimeo["convert_s"] == 1.0
+    with pytest.raises(ValueError):
+        db.stage_stats("title")
+
+
+def test_stage_durations_are_saved_when_each_stage_ends(db, monkeypatch):
+    from app import audio_pipeline
+
+    monkeypatch.setattr(audio_pipeline, "update_audio_job", db.update_audio_job)
+    audio_id = db.create_audio_job("https://example.com/a")
+    timings = {}
+
+    with audio_pipeline._stage(audio_id, "probe", timings):
+        pass
+    saved = db.get_audio_job(audio_id)
+    assert saved["probe_s"] is not None and saved["download_s"] is None
+    assert list(saved["stage_timings"]) == ["probe"]
+
+    with pytest.raises(RuntimeError):
+        with audio_pipeline._stage(audio_id, "download", timings):
+            raise RuntimeError("connection reset")
+    assert db.get_audio_job(audio_id)["download_s"] is not None
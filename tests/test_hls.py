@@ -0,0 +1,54 @@
+import importlib
+import os
+import sys
+import time
+
+import pytest
+
+
+@pytest.fixture
+def hls(monkeypatch):
+    monkeypatch.setenv("HLS_CODEC", "mp3")
+    monkeypatch.setenv("HLS_SEGMENT_SECONDS", "4")
+    sys.modules.pop("app.hls", None)
+    yield importlib.import_module("app.hls")
+    sys.modules.pop("app.hls", None)
+
+
+def test_rendition_is_served_only_once_published(hls, tmp_path):
+    mp3 = tmp_path / "job.mp3"
+    playlist = hls.prepare(mp3)
+    args = hls.output_args(playlist)
+    assert args[:4] == ["-map", "0:a:0", "-c:a", "copy"]
+    assert args[args.index("-hls_time") + 1] == "4" and args[-1] == str(playlist)
+
+    playlist.write_text("#EXTM3U\nseg00000.ts\n")
+    playlist.with_name("seg00000.ts").write_bytes(b"G")
+    assert hls.file_for(mp3, hls.PLAYLIST) is None
+
+    hls.publish(mp3)
+    assert hls.file_for(mp3, hls.PLAYLIST) == tmp_path / "job.hls" / "index.m3u8"
+    assert hls.media_type("seg00000.ts") == "video/mp2t"
+    assert hls.file_for(mp3, "seg00001.ts") is None
+    assert hls.file_for(mp3, "../job.mp3") is None
+
+    hls.discard(mp3)
+    assert not (tmp_path / "job.hls").exists()
+
+
+def test_stale_staging_directories_are_purged(hls, tmp_path):
+    crashed = hls.prepare(tmp_path / "crashed.mp3").parent
+    (crashed / "seg00000.ts").write_bytes(b"G")
+    running = hls.prepare(tmp_path / "nested" / "running.mp3").parent
+    day_ago = time.time() - 25 * 60 * 60
+    os.utime(crashed, (day_ago, day_ago))
+
+    assert hls.purge_staging(tmp_path, 24 * 60 * 60) == 1
+    assert not crashed.exists() and running.is_dir()
+
+def test_unknown_codec_is_rejected(monkeypatch):
+    monkeypatch.setenv("HLS_CODEC", "opus")
+    sys.modules.pop("app.hls", None)
+    with pytest.raises(ValueError):
+        importlib.import_module("app.hls")
+    sys.modules.pop("app.hls", None)
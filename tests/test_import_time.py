@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ("yt_dlp", "ffmpeg", "mutagen", "imageio_ffmpeg", "numpy")
+# Generous enough for a slow CI runner; eager media imports alone cost more.
+IMPORT_BUDGET_S = float(os.getenv("IMPORT_BUDGET_S", "1.5"))
+
+SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy, "files": sorted(os.listdir("."))}}))
+"""
+
+
+@pytest.mark.parametrize("module", ["backend.server", "backend.main", "app.main"])
+def test_entrypoint_import_is_lazy_and_fast(module, tmp_path):
+    """Importing an entrypoint must not load media libraries or touch the disk."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT), DATA_DIR=str(tmp_path / "data"))
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    report = json.loads(result.stdout)
+    assert report["heavy"] == []
+    assert report["files"] == []
+    assert report["elapsed"] < IMPORT_BUDGET_S
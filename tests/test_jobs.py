@@ -0,0 +1,238 @@
+import asyncio
+import subprocess
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+import pytest
+
+from backend import downloader, jobs, main
+
+
+@pytest.fixture
+def job(monkeypatch):
+    monkeypatch.setattr(jobs, "_jobs", {})
+    info = {"id": "abc", "title": "Titre", "duration": 120, "formats": [{"format_id": "251"}] * 100}
+    job = jobs.Job(id="job-1", url="https://example.com/a", created_at=datetime.utcnow(), bitrate=192, info=info)
+    jobs._jobs[job.id] = job
+    return job
+
+
+def test_job_keeps_only_probe_fields(job):
+    assert job.info == {"id": "abc", "title": "Titre", "duration": 120}
+    assert not hasattr(job, "__dict__")
+
+
+def test_snapshot_is_not_affected_by_later_stages(job):
+    jobs.enter_stage(job.id, "download")
+    before = jobs.snapshot(job.id, touch=True)
+    jobs.enter_stage(job.id, "convert")
+    after = jobs.snapshot(job.id)
+
+    assert list(before.timings) == ["download"]
+    assert "duration_s" not in before.timings["download"]
+    assert list(after.timings) == ["download", "convert"]
+    assert "duration_s" in after.timings["download"]
+    assert jobs.snapshot("missing") is None
+
+
+def test_delete_removes_a_queued_job(job, monkeypatch):
+    monkeypatch.setattr(jobs, "_pending", deque([job.id]))
+    assert asyncio.run(main.cancel_job(job.id)) == {"job_id": job.id, "status": "cancelled"}
+    assert not jobs._pending
+
+
+def test_abandoned_running_job_is_cancelled_and_its_process_killed(job, monkeypatch):
+    monkeypatch.setattr(jobs, "IDLE_CANCEL_MINUTES", 1)
+    job.status = "downloading"
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    with jobs.track_process(job.id, process):
+        jobs._reap_idle(time.monotonic() + 61)
+        assert process.wait(5) != 0
+
+    assert jobs.snapshot(job.id).status == "cancelled"
+    with pytest.raises(jobs.JobCancelled):
+        jobs.raise_if_cancelled(job.id)
+    jobs._cancelled.pop(job.id, None)
+
+
+@pytest.fixture
+def slot(job, monkeypatch):
+    """Put ``job`` on a worker slot; replacement slots are recorded, not started."""
+    spawned = []
+    slot = jobs._Slot(index=1, job_id=job.id)
+    monkeypatch.setattr(jobs, "_slots", {slot.index: slot})
+    monkeypatch.setattr(jobs, "_spawn_worker", lambda: spawned.append(True))
+    job.status = "downloading"
+    yield slot, spawned
+    jobs._cancelled.pop(job.id, None)
+
+
+def test_stalled_download_is_failed_and_its_slot_replaced(job, slot):
+    slot, spawned = slot
+    now = time.monotonic()
+    job.stage, job.stage_started = "download", now
+    job.last_progress = now - jobs.STALL_TIMEOUT - 1
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    with jobs.track_process(job.id, process):
+        jobs._check_slots(now)
+        assert process.wait(5) != 0
+
+    assert job.status == "error" and "Aucune progression" in job.message
+    assert slot.index in jobs._slots and not spawned
+
+    # The worker never came back from the stalled call.
+    jobs._check_slots(now + 1)
+    jobs._check_slots(now + jobs._WATCHDOG_GRACE + 2)
+    assert slot.retired and slot.index not in jobs._slots
+    assert spawned == [True]
+
+
+def test_stage_deadline_fails_the_job(job, slot):
+    now = time.monotonic()
+    job.stage, job.last_progress = "convert", now
+    job.stage_started = now - jobs.stage_deadline("convert", job.info["duration"]) - 1
+
+    jobs._check_slots(now)
+
+    assert job.status == "error" and "Délai dépassé" in job.message
+
+
+def test_probe_gives_up_at_its_deadline(monkeypatch):
+    monkeypatch.setitem(downloader.STAGE_TIMEOUTS, "probe", -1)
+    with pytest.raises(TimeoutError):
+        downloader.probe_media("https://example.com/a")
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """An autoscaled pool of ``busy`` running and ``idle`` free slots, without threads."""
+    ids = iter(range(100, 200))
+
+    def spawn():
+        slot = jobs._Slot(index=next(ids))
+        jobs._slots[slot.index] = slot
+        return slot
+
+    def fill(busy, idle, pending=0, low=1, high=8):
+        slots = [jobs._Slot(index=i, job_id=f"job-{i}" if i < busy else None) for i in range(busy + idle)]
+        monkeypatch.setattr(jobs, "_slots", {slot.index: slot for slot in slots})
+        monkeypatch.setattr(jobs, "_pending", deque(f"queued-{i}" for i in range(pending)))
+        monkeypatch.setattr(jobs, "_pool_limits", {"min": low, "max": high})
+
+    monkeypatch.setattr(jobs, "_spawn_worker", spawn)
+    monkeypatch.setattr(jobs, "_pool_load", dict(jobs._pool_load))
+    return fill
+
+
+def test_autoscale_grows_under_backlog(pool):
+    pool(busy=2, idle=0, pending=4)
+    jobs._autoscale(cpu=0.2, network_wait=0.0)
+    assert jobs.pool_size() == 3
+
+    # Download-bound jobs leave the CPU idle: add a worker per queued job.
+    jobs._autoscale(cpu=0.2, network_wait=0.9)
+    assert jobs.pool_size() == 7
+    jobs._autoscale(cpu=0.2, network_wait=0.9)
+    assert jobs.pool_size() == 8
+
+    pool(busy=2, idle=0, pending=4)
+    jobs._autoscale(cpu=jobs._CPU_HIGH, network_wait=0.0)
+    assert jobs.pool_size() == 2
+
+
+def test_autoscale_shrinks_when_idle(pool):
+    pool(busy=1, idle=2, low=2)
+    jobs._autoscale(cpu=0.1, network_wait=0.0)
+    assert jobs.pool_size() == 2
+    jobs._autoscale(cpu=0.1, network_wait=0.0)
+    assert jobs.pool_size() == 2
+    assert any(slot.job_id for slot in jobs._slots.values())
+
+
+def test_pool_limits_are_validated_and_applied(pool):
+    pool(busy=1, idle=4)
+    for low, high in ((0, 4), (3, 2)):
+        with pytest.raises(ValueError):
+            jobs.set_pool_limits(low, high)
+    assert jobs._pool_limits == {"min": 1, "max": 8}
+
+    assert jobs.set_pool_limits(max_workers=2)["workers"] == 2
+    assert jobs.set_pool_limits(min_workers=2, max_workers=6)["workers"] == 2
+    assert jobs.set_pool_limits(min_workers=4)["workers"] == 4
+
+    with pytest.raises(main.HTTPException) as caught:
+        asyncio.run(main.update_pool(main.PoolLimits(min_workers=5, max_workers=1)))
+    assert caught.value.status_code == 400
+
+
+def test_stage_summary_averages_finished_jobs_per_group(monkeypatch):
+    def finished(job_id, codec, download, convert, size, status="done"):
+        job = jobs.Job(id=job_id, url="https://example.com/a", created_at=datetime.utcnow(), bitrate=192)
+        job.status, job.source_codec, job.bytes_downloaded = status, codec, size
+        job.timings = {"download": {"duration_s": download}, "convert": {"duration_s": convert}, "probe": {}}
+        return job
+
+    monkeypatch.setattr(jobs, "_jobs", {
+        job.id: job
+        for job in (
+            finished("a", "opus", 2.0, 1.0, 3000),
+            finished("b", "opus", 4.0, 3.0, 9000),
+            finished("c", "aac", 20.0, 10.0, 1000),
+            finished("d", "aac", 99.0, 99.0, 99, status="error"),
+        )
+    })
+
+    aac, opus = jobs.stage_summary("source_codec")
+    assert aac == {
+        "source_codec": "aac",
+        "jobs": 1,
+        "avg_bytes_downloaded": 1000,
+        "avg_duration_s": {"download": 20.0, "convert": 10.0},
+        "download_bytes_per_s": 50,
+    }
+    assert opus["avg_duration_s"] == {"download": 3.0, "convert": 2.0}
+    assert opus["download_bytes_per_s"] == 2000
+    with pytest.raises(ValueError):
+        jobs.stage_summary("title")
+
+
+def test_profiled_job_leaves_a_cprofile_dump(job, monkeypatch, tmp_path):
+    import pstats
+
+    def convert(job, progress_cb):
+        return tmp_path / "result.mp3"
+
+    monkeypatch.setattr(jobs, "_processor", convert)
+    monkeypatch.setattr(jobs, "PROFILE_DIR", tmp_path / "profiles")
+
+    assert jobs._run_processor(job, lambda *args: None) == tmp_path / "result.mp3"
+    assert job.profile_path is None
+
+    job.profile = True
+    jobs._run_processor(job, lambda *args: None)
+    assert job.profile_path == tmp_path / "profiles" / f"{job.id}.prof"
+    functions = {name for _, _, name in pstats.Stats(str(job.profile_path)).stats}
+    assert "convert" in functions
+
+
+def test_job_without_processor_fails_and_frees_its_slot(job, slot, monkeypatch):
+    slot, spawned = slot
+    job.status = "queued"
+    monkeypatch.setattr(jobs, "_processor", None)
+    monkeypatch.setattr(jobs, "_pending", deque([job.id]))
+
+    def next_job(slot):
+        if not jobs._pending:
+            slot.retired = True
+            return None
+        job_id = jobs._pending.popleft()
+        slot.job_id = job_id
+        return jobs.get(job_id)
+
+    monkeypatch.setattr(jobs, "_next_job", next_job)
+    jobs._worker_loop(slot)
+
+    assert job.status == "error"
+    assert slot.job_id is None
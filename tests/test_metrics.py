@@ -0,0 +1,56 @@
+import pytest
+
+from app import metrics
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Register the metrics of each test in an empty registry."""
+    monkeypatch.setattr(metrics, "_registry", [])
+
+
+def test_each_metric_has_help_and_type_lines():
+    metrics.Counter("test_requests_total", "Requests served.", ("route",)).inc(route="/a")
+    gauge = metrics.Gauge("test_depth", "Queue depth.")
+    gauge.set(3)
+
+    assert metrics.render() == (
+        "# HELP test_requests_total Requests served.\n"
+        "# TYPE test_requests_total counter\n"
+        'test_requests_total{route="/a"} 1\n'
+        "# HELP test_depth Queue depth.\n"
+        "# TYPE test_depth gauge\n"
+        "test_depth 3\n"
+    )
+
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("test_errors_total", "Errors.", ("message",))
+    counter.inc(message='say "hi"\\\nbye')
+
+    assert 'test_errors_total{message="say \\"hi\\"\\\\\\nbye"} 1' in metrics.render().splitlines()
+
+
+def test_gauge_callbacks_are_read_at_scrape_time():
+    gauge = metrics.Gauge("test_workers", "Workers.", ("pool",))
+    size = {"value": 2}
+    gauge.add_callback(lambda: {("backend",): size["value"]})
+    size["value"] = 5
+
+    assert 'test_workers{pool="backend"} 5' in metrics.render().splitlines()
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    histogram = metrics.Histogram("test_seconds", "Durations.", ("stage",), buckets=(1, 5))
+    for value in (0.5, 1, 3, 7.25):
+        histogram.observe(value, stage="convert")
+
+    assert metrics.render().splitlines() == [
+        "# HELP test_seconds Durations.",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="convert",le="1"} 2',
+        'test_seconds_bucket{stage="convert",le="5"} 3',
+        'test_seconds_bucket{stage="convert",le="+Inf"} 4',
+        'test_seconds_sum{stage="convert"} 11.75',
+        'test_seconds_count{stage="convert"} 4',
+    ]
@@ -0,0 +1,85 @@
+import functools
+import http.server
+import os
+import re
+import threading
+
+import pytest
+
+from app import parallel_download, ydl_pool
+
+
+class _RangeHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):  # noqa: A002 - stdlib signature
+        pass
+
+    def do_GET(self):
+        body = self.server.body
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range", ""))
+        if not self.server.ranges or not match:
+            self.send_response(200)
+            start, end = 0, len(body) - 1
+        else:
+            start, end = int(match[1]), min(int(match[2]), len(body) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.wfile.write(body[start:end + 1])
+
+
+@pytest.fixture
+def origin(tmp_path):
+    handler = functools.partial(_RangeHandler, directory=str(tmp_path))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.body = os.urandom(3 * 1024 * 1024 + 123)
+    server.ranges = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _download(origin, tmp_path):
+    events = []
+    info = {
+        "id": "track",
+        "title": "Track",
+        "ext": "bin",
+        "url": f"http://127.0.0.1:{origin.server_port}/media.bin",
+        "protocol": "http",
+        "filesize": len(origin.body),
+        "extractor": "generic",
+        "extractor_key": "Generic",
+        "webpage_url": f"http://127.0.0.1:{origin.server_port}/",
+    }
+    outtmpl = str(tmp_path / "out" / "%(id)s.%(ext)s")
+    with ydl_pool.session({"quiet": True}, outtmpl=outtmpl, progress_hook=events.append) as ydl:
+        parallel_download.download(ydl, info, events.append)
+    return events
+
+
+@pytest.mark.parametrize("ranges", [True, False])
+def test_download_matches_origin(origin, tmp_path, monkeypatch, ranges):
+    """Ranged downloads and the fallback for origins ignoring Range give identical files."""
+    monkeypatch.setattr(parallel_download, "CHUNK_SIZE", 256 * 1024)
+    origin.ranges = ranges
+    events = _download(origin, tmp_path)
+    path = tmp_path / "out" / "track.bin"
+    assert path.read_bytes() == origin.body
+    finished = [event["filename"] for event in events if event["status"] == "finished"]
+    assert finished and all(os.path.basename(filename) == path.name for filename in finished)
+    assert parallel_download._hosts.snapshot()[0] == {}
+
+
+def test_fragmented_downloads_run_on_a_tuned_variant(monkeypatch):
+    monkeypatch.setattr(parallel_download, "PARALLEL_DOWNLOADS", True)
+    with ydl_pool.session({"quiet": True}) as ydl:
+        with parallel_download._host_connections(ydl, "cdn.example.com", fragmented=True) as downloader:
+            assert downloader is not ydl
+            granted = downloader.params["concurrent_fragment_downloads"]
+            assert granted >= 1
+        with parallel_download._host_connections(ydl, "cdn.example.com", fragmented=False) as downloader:
+            assert downloader is ydl
+    assert "concurrent_fragment_downloads" not in ydl.params
+    assert parallel_download._hosts.level("cdn.example.com") == granted + 1
@@ -0,0 +1,67 @@
+import importlib
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import admin, profiler
+
+
+def _wait_in_profiled_code(release):
+    release.wait(5)
+
+
+@pytest.fixture
+def worker():
+    """A thread named ``profiled-worker`` blocked in ``_wait_in_profiled_code``."""
+    release = threading.Event()
+    thread = threading.Thread(target=_wait_in_profiled_code, args=(release,), name="profiled-worker")
+    thread.start()
+    yield thread
+    release.set()
+    thread.join()
+
+
+def test_sample_stacks_returns_collapsed_stacks(worker):
+    output = profiler.sample_stacks(0.05, interval=0.005, thread_prefix="profiled")
+
+    lines = output.splitlines()
+    assert len(lines) == 1
+    stack, count = lines[0].rsplit(" ", 1)
+    frames = stack.split(";")
+    assert frames[0] == "profiled-worker"
+    assert any(frame.startswith("_wait_in_profiled_code (tests/test_profiler.py:") for frame in frames)
+    assert frames[-1].startswith("wait (")
+    assert int(count) >= 2
+
+
+def test_overlapping_profiles_are_refused():
+    running = threading.Thread(target=profiler.sample_stacks, args=(0.5,))
+    running.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not profiler._lock.locked():
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+        with pytest.raises(profiler.ProfilerBusyError):
+            profiler.sample_stacks(0.01)
+    finally:
+        running.join()
+    assert profiler.sample_stacks(0.01) is not None
+
+
+@pytest.mark.parametrize("module", ["app.main", "backend.main", "backend.server"])
+def test_profile_endpoint_is_admin_only(module, monkeypatch):
+    client = TestClient(importlib.import_module(module).app)
+    url = "/api/admin/profile?seconds=0.02&interval_ms=5"
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "")
+    assert client.get(url, headers={"X-Admin-Token": "secret"}).status_code == 404
+
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get(url, headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="profile.collapsed"'
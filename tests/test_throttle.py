@@ -0,0 +1,66 @@
+import pytest
+
+from app import throttle
+
+
+class _Throttled(Exception):
+    status = 429
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(throttle, "_BASE_DELAY", 0.01)
+    monkeypatch.setattr(throttle, "_DELAY_STEP", 0.01)
+    monkeypatch.setattr(throttle, "_domains", {})
+
+
+def test_is_throttled_looks_through_wrapped_errors():
+    from yt_dlp.utils import DownloadError, ExtractorError
+
+    wrapped = DownloadError("ERROR: unable to download", (ExtractorError, _Throttled(), None))
+    assert throttle.is_throttled(wrapped)
+    assert throttle.is_throttled(ExtractorError("Sign in to confirm you're not a bot"))
+    assert not throttle.is_throttled(ExtractorError("Video unavailable"))
+
+
+def test_call_backs_off_and_recovers():
+    """Throttling halves the domain's limit and adds a gap; successes win them back."""
+    outcomes = iter([_Throttled(), _Throttled(), "ok", "ok", "ok"])
+
+    def fetch():
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    url = "https://www.youtube.com/watch?v=abc"
+    assert throttle.call(url, fetch) == "ok"
+    state = throttle._domains["youtube.com"]
+    assert state.limit == pytest.approx(throttle.THROTTLE_INITIAL_CONCURRENCY / 4 + 1)
+    assert state.delay == pytest.approx(0.01)
+
+    throttle.call(url, fetch)
+    throttle.call(url, fetch)
+    assert state.delay == 0.0
+
+
+def test_call_gives_up_after_attempts():
+    def fetch():
+        raise _Throttled()
+
+    with pytest.raises(throttle.ThrottledError) as excinfo:
+        throttle.call("https://example.com/a", fetch, attempts=2)
+    assert excinfo.value.domain == "example.com"
+
+
+def test_other_errors_are_not_retried():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        throttle.call("https://example.com/a", fetch)
+    assert len(calls) == 1
+    assert throttle._domains["example.com"].limit == throttle.THROTTLE_INITIAL_CONCURRENCY
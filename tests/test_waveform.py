@@ -0,0 +1,27 @@
+import json
+
+import numpy as np
+
+from app import waveform
+
+
+def test_peaks_reduce_pcm_fed_in_uneven_chunks(tmp_path):
+    samples = np.zeros(waveform.SAMPLE_RATE * 60, dtype="<i2")
+    samples[10] = 32767
+    samples[-1] = -32768
+    data = samples.tobytes()
+    peaks = waveform.Peaks()
+    for start in range(0, len(data), 4097):
+        peaks.feed(data[start:start + 4097])
+
+    path = waveform.path_for(tmp_path / "job.mp3")
+    waveform.write(path, peaks)
+    result = json.loads(path.read_text())
+
+    assert path.name == "job.peaks.json"
+    assert result["bits"] == 8 and result["sample_rate"] == waveform.SAMPLE_RATE
+    assert 0 < result["length"] <= waveform.WAVEFORM_PEAKS
+    assert len(result["data"]) == 2 * result["length"]
+    assert result["length"] * result["samples_per_pixel"] >= samples.size
+    assert result["data"][:2] == [0, 127]
+    assert result["data"][-2:] == [-128, 0]
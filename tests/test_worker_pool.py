@@ -0,0 +1,77 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from app.worker_pool import WorkerPool
+
+
+@pytest.fixture
+def gated():
+    """A job target that blocks until ``release`` is set; ``started`` lists the jobs run."""
+    release = threading.Event()
+    started = []
+    lock = threading.Lock()
+
+    def run(job_id):
+        with lock:
+            started.append(job_id)
+        release.wait(5)
+
+    yield run, release, started
+    release.set()
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_runs_at_most_size_jobs_at_once(gated):
+    run, release, started = gated
+    pool = WorkerPool(run, 2)
+    for job_id in "abcde":
+        pool.submit(job_id)
+
+    _wait_for(lambda: pool.busy == 2)
+    time.sleep(0.05)
+    assert sorted(started) == ["a", "b"]
+    assert pool.depth() == 3
+
+    release.set()
+    _wait_for(lambda: len(started) == 5 and pool.busy == 0)
+    pool.shutdown()
+
+
+def test_rejects_submissions_beyond_max_depth(gated):
+    run, release, started = gated
+    pool = WorkerPool(run, 1, max_depth=2)
+    pool.submit("running")
+    _wait_for(lambda: pool.busy == 1)
+
+    assert pool.submit("first") == 0
+    assert pool.submit("second") == 1
+    with pytest.raises(queue.Full):
+        pool.submit("third")
+
+    assert pool.remove("first")
+    assert pool.submit("third") == 1
+
+
+def test_shutdown_returns_queued_jobs_and_lets_running_ones_finish(gated):
+    run, release, started = gated
+    pool = WorkerPool(run, 1)
+    for job_id in ("running", "queued-1", "queued-2"):
+        pool.submit(job_id)
+    _wait_for(lambda: pool.busy == 1)
+
+    assert pool.shutdown(wait=False) == ["queued-1", "queued-2"]
+    release.set()
+    assert pool.shutdown() == []
+    assert started == ["running"]
+    assert pool.busy == 0
+    with pytest.raises(RuntimeError):
+        pool.submit("late")
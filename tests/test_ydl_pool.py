@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+
+import pytest
+
+from app import ydl_pool
+
+INFO = {"id": "track", "ext": "m4a", "title": "Track"}
+
+
+@pytest.fixture(autouse=True)
+def pool(monkeypatch):
+    """Start each test with an empty pool and close what it leaves behind."""
+    monkeypatch.setattr(ydl_pool, "_idle", OrderedDict())
+    monkeypatch.setattr(ydl_pool, "_leased", {})
+    monkeypatch.setattr(ydl_pool, "_live", 0)
+    yield
+    for idle in ydl_pool._idle.values():
+        idle.close()
+
+
+def _ydl(params, **kwargs):
+    with ydl_pool.session(params, **kwargs) as ydl:
+        return ydl
+
+
+def test_instances_are_reused_per_option_set(tmp_path):
+    first = _ydl({"quiet": True})
+    assert _ydl({"quiet": True}) is first
+    assert _ydl({"quiet": True, "retries": 3}) is not first
+    assert _ydl({"quiet": True}, outtmpl=str(tmp_path / "%(id)s.%(ext)s")) is not first
+
+    # Only the file name is part of the key; the directory varies per call.
+    named = _ydl({"quiet": True}, outtmpl=str(tmp_path / "a" / "%(id)s.%(ext)s"))
+    assert _ydl({"quiet": True}, outtmpl=str(tmp_path / "b" / "%(id)s.%(ext)s")) is named
+
+
+def test_busy_instances_are_not_shared():
+    with ydl_pool.session({"quiet": True}) as first:
+        with ydl_pool.session({"quiet": True}) as second:
+            assert second is not first
+    assert ydl_pool._live == 2
+
+
+def test_instances_are_retired_after_max_uses_or_an_error(monkeypatch):
+    monkeypatch.setattr(ydl_pool, "YDL_MAX_USES", 2)
+    first = _ydl({"quiet": True})
+    assert _ydl({"quiet": True}) is first
+    second = _ydl({"quiet": True})
+    assert second is not first
+
+    with pytest.raises(RuntimeError):
+        with ydl_pool.session({"quiet": True}) as ydl:
+            assert ydl is second
+            raise RuntimeError("extraction failed")
+    assert _ydl({"quiet": True}) is not second
+    assert ydl_pool._live == 1
+
+
+def test_warm_instances_are_capped(monkeypatch):
+    monkeypatch.setattr(ydl_pool, "YDL_MAX_INSTANCES", 2)
+    oldest = _ydl({"retries": 1})
+    _ydl({"retries": 2})
+    _ydl({"retries": 3})
+    assert ydl_pool._live == 2
+    assert _ydl({"retries": 1}) is not oldest
+
+
+def test_each_call_gets_its_own_hook_and_output_directory(tmp_path):
+    options = {"quiet": True}
+    events = {"a": [], "b": []}
+
+    def call(name):
+        target = tmp_path / name
+        outtmpl = str(target / "%(id)s.%(ext)s")
+        with ydl_pool.session(options, outtmpl=outtmpl, progress_hook=events[name].append) as ydl:
+            path = ydl.prepare_filename(INFO)
+            with open(path, "w") as handle:
+                handle.write(name)
+            for hook in ydl.params["progress_hooks"]:
+                hook({"status": "finished", "filename": path})
+        return ydl
+
+    assert call("a") is call("b")
+    assert (tmp_path / "a" / "track.m4a").read_text() == "a"
+    assert (tmp_path / "b" / "track.m4a").read_text() == "b"
+    assert [len(events["a"]), len(events["b"])] == [1, 1]
+    assert events["a"][0]["filename"] != str(tmp_path / "a" / "track.m4a")
+
+
+def test_concurrent_calls_use_distinct_instances():
+    barrier = threading.Barrier(4)
+    used = []
+
+    def call():
+        with ydl_pool.session({"quiet": True}) as ydl:
+            barrier.wait(5)
+            used.append(ydl)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(ydl) for ydl in used}) == 4
+
+
+def test_variants_serve_the_same_call_without_touching_the_instance(tmp_path):
+    events = []
+    outtmpl = str(tmp_path / "out" / "%(id)s.%(ext)s")
+    with ydl_pool.session({"quiet": True}, outtmpl=outtmpl, progress_hook=events.append) as ydl:
+        extra = []
+        with ydl_pool.progress_hook(ydl, extra.append):
+            with ydl_pool.with_options(ydl, concurrent_fragment_downloads=4) as variant:
+                assert variant is not ydl
+                assert variant.params["concurrent_fragment_downloads"] == 4
+                path = variant.prepare_filename(INFO)
+                with open(path, "w") as handle:
+                    handle.write("fragments")
+                for hook in variant.params["progress_hooks"]:
+                    hook({"status": "finished", "filename": path})
+        for hook in ydl.params["progress_hooks"]:
+            hook({"status": "downloading"})
+    assert "concurrent_fragment_downloads" not in ydl.params
+
+    assert (tmp_path / "out" / "track.m4a").read_text() == "fragments"
+    assert [event["status"] for event in events] == ["finished", "downloading"]
+    assert [event["status"] for event in extra] == ["finished"]
+
+    with ydl_pool.session({"quiet": True}, outtmpl=outtmpl) as again:
+        assert again is ydl
+        with ydl_pool.with_options(again, concurrent_fragment_downloads=4) as reused:
+            assert reused is variant
+
+
+def test_only_leased_instances_take_extra_hooks():
+    ydl = _ydl({"quiet": True})
+    with pytest.raises(ValueError):
+        with ydl_pool.progress_hook(ydl, print):
+            pass